@@ -34,7 +34,7 @@ argparser.add_argument(
 argparser.add_argument(
     "--compile-extension",
     action="store_true",
-    help="Compile generated C code into an extension module",
+    help="Compile generated C code (or Python code, with --mypyc) into an extension module",
 )
 argparser.add_argument(
     "-o",
@@ -42,6 +42,46 @@ argparser.add_argument(
     metavar="OUT",
     help="Where to write the generated parser (default parse.py or parse.c)",
 )
+argparser.add_argument(
+    "--selective-memo",
+    action="store_true",
+    help="Only memoize left-recursive rules and rules marked (memo)",
+)
+argparser.add_argument(
+    "--untraced",
+    action="store_true",
+    help="Generate an untraced Python parser, with a traced subclass for -v",
+)
+argparser.add_argument(
+    "--lexer",
+    action="store_true",
+    help="Tokenize with a lexer generated from the grammar, for non-Python grammars",
+)
+argparser.add_argument(
+    "--vm",
+    action="store_true",
+    help="Generate a Python parser that runs the grammar as tables (see pegen.vm)",
+)
+argparser.add_argument(
+    "--nodes",
+    choices=["list", "slots", "tuple"],
+    default="list",
+    help="Return nodes of __slots__ classes or tuples, not lists, from alternatives "
+    "without an action (see pegen.nodes)",
+)
+argparser.add_argument(
+    "--inline-size",
+    type=int,
+    default=3,
+    metavar="N",
+    help="Match groups of up to N items in their caller instead of in a helper rule "
+    "(0 to never do so; default %(default)s)",
+)
+argparser.add_argument(
+    "--mypyc",
+    action="store_true",
+    help="Generate a Python parser that mypyc can compile (needs mypy)",
+)
 argparser.add_argument("filename", help="Grammar description")
 argparser.add_argument(
     "--optimized", action="store_true", help="Compile the extension in optimized mode"
@@ -71,6 +111,13 @@ def main() -> None:
             verbose_parser,
             args.verbose,
             keep_asserts_in_extension=False if args.optimized else True,
+            selective_memo=args.selective_memo,
+            untraced=args.untraced,
+            lexer=args.lexer,
+            vm=args.vm,
+            nodes=args.nodes,
+            inline_size=args.inline_size,
+            mypyc=args.mypyc,
         )
     except Exception as err:
         if args.verbose:
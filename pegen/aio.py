@@ -0,0 +1,228 @@
+"""Parse from asyncio code without blocking the event loop."""
+
+import asyncio
+import concurrent.futures
+import os
+import tempfile
+import threading
+import tokenize
+
+from types import ModuleType
+from typing import Any, Callable, Dict, IO, Optional, Type, Union
+
+from pegen.parser import Parser
+from pegen.tokenizer import Tokenizer
+
+Source = Union[str, "os.PathLike[str]", asyncio.StreamReader]
+
+# How much of a stream is copied for a C parser at a time.
+CHUNK_SIZE = 65536
+
+
+class _Lines:
+    """The readline() of a file, for a tokenizer in a worker thread.
+
+    It raises CancelledError once cancel() has been called, which
+    stops the parse at the next line it asks for.
+    """
+
+    def __init__(self) -> None:
+        self.file: Optional[IO[str]] = None  # Opened by the worker thread
+        self._cancelled = threading.Event()
+
+    def readline(self) -> str:
+        if self._cancelled.is_set():
+            raise asyncio.CancelledError()
+        assert self.file is not None
+        return self.file.readline()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+
+class _StreamLines(_Lines):
+    """The same for an asyncio.StreamReader, read in the event loop."""
+
+    def __init__(self, reader: asyncio.StreamReader, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self._reader = reader
+        self._loop = loop
+        self._pending: Optional["concurrent.futures.Future[bytes]"] = None
+
+    def readline(self) -> str:
+        if self._cancelled.is_set():
+            raise asyncio.CancelledError()
+        self._pending = asyncio.run_coroutine_threadsafe(self._reader.readline(), self._loop)
+        if self._cancelled.is_set():
+            self._pending.cancel()
+        try:
+            line = self._pending.result()
+        except concurrent.futures.CancelledError:
+            raise asyncio.CancelledError()
+        finally:
+            self._pending = None
+        return line.decode("utf-8")
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        pending = self._pending
+        if pending is not None:
+            pending.cancel()
+
+
+async def _spool(reader: asyncio.StreamReader) -> str:
+    # The C tokenizer holds the GIL while it waits for input, so it cannot be
+    # fed from the event loop; copy the stream to a temporary file instead.
+    fd, path = tempfile.mkstemp(suffix=".py")
+    try:
+        with open(fd, "wb") as file:
+            while True:
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                file.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+class AsyncParser:
+    """Run a parser on files or streams from asyncio code.
+
+    *parser* is a generated Python parser class or a C extension
+    module.  Parses run in *executor*, which should be thread-based (by
+    default, the event loop's default executor), at most
+    *max_concurrency* at a time if given; each thread reuses one parser
+    instance.  *options* are keyword arguments for the Python parser
+    class (e.g. evict=True), or for the C extension's parse_file() (e.g.
+    two_phase=True).
+    """
+
+    def __init__(
+        self,
+        parser: Union[Type[Parser], ModuleType],
+        *,
+        executor: Optional[concurrent.futures.Executor] = None,
+        max_concurrency: Optional[int] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ):
+        self._parser = parser
+        self._executor = executor
+        self._max_concurrency = max_concurrency
+        # Made on first use, so that it belongs to the running event loop.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._options = options or {}
+        self._local = threading.local()
+
+    async def parse(self, source: Source, filename: Optional[str] = None) -> Any:
+        """Parse *source*, a file path or an asyncio.StreamReader.
+
+        The input is never loaded as a whole: a Python parser reads it
+        line by line as it needs it, and a stream for a C parser is first
+        copied to a temporary file.  *filename* is used in syntax errors.
+        Cancelling the task stops a Python parser at the next line it
+        reads.  A C parser cannot be stopped once it has started, so it
+        finishes in the background before its slot is freed.
+        """
+        if filename is None:
+            filename = "<stream>" if isinstance(source, asyncio.StreamReader) else str(source)
+        semaphore = None
+        if self._max_concurrency is not None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            semaphore = self._semaphore
+            await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        lines: Optional[_Lines] = None
+        future: Optional["asyncio.Future[Any]"] = None
+        try:
+            if isinstance(self._parser, ModuleType):
+                if isinstance(source, asyncio.StreamReader):
+                    work = self._c_work(await _spool(source), filename, temporary=True)
+                else:
+                    work = self._c_work(os.fspath(source), filename)
+            else:
+                if isinstance(source, asyncio.StreamReader):
+                    lines = _StreamLines(source, loop)
+                else:
+                    lines = _Lines()
+                work = self._python_work(source, filename, lines)
+            future = loop.run_in_executor(self._executor, work)
+            # Shielded, so that the future reports when the thread is done.
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if lines is not None:
+                lines.cancel()
+            raise
+        finally:
+            if future is None:
+                if semaphore is not None:
+                    semaphore.release()
+            elif not future.done() or semaphore is not None:
+                future.add_done_callback(lambda f: _done(f, semaphore))
+
+    def _python_work(self, source: Source, filename: str, lines: _Lines) -> Callable[[], Any]:
+        parser_class = self._parser
+        assert isinstance(parser_class, type)
+        # A parser generated with a lexer tokenizes with that.
+        generate_tokens = getattr(parser_class, "generate_tokens", tokenize.generate_tokens)
+
+        def work() -> Any:
+            parser = getattr(self._local, "parser", None)
+            if parser is None:
+                parser = self._local.parser = parser_class(Tokenizer(iter(())), **self._options)
+            if isinstance(source, asyncio.StreamReader):
+                return run(parser)
+            with tokenize.open(source) as lines.file:
+                return run(parser)
+
+        def run(parser: Parser) -> Any:
+            parser.restart(generate_tokens(lines.readline))
+            tree = parser.start()
+            if tree is None:
+                raise parser.make_syntax_error(filename)
+            return tree
+
+        return work
+
+    def _c_work(self, path: str, filename: str, temporary: bool = False) -> Callable[[], Any]:
+        module: Any = self._parser
+
+        def work() -> Any:
+            parser = getattr(self._local, "parser", None)
+            if parser is None and hasattr(module, "new_parser"):
+                parser = self._local.parser = module.new_parser()
+            kwargs = dict(self._options)
+            if parser is not None:
+                kwargs["parser"] = parser
+            try:
+                return module.parse_file(path, **kwargs)
+            except SyntaxError as err:
+                err.filename = filename
+                raise
+            finally:
+                if temporary:
+                    os.unlink(path)
+
+        return work
+
+
+def _done(future: "asyncio.Future[Any]", semaphore: Optional[asyncio.Semaphore]) -> None:
+    # Retrieve the result of a parse nobody may wait for any more.
+    if not future.cancelled():
+        future.exception()
+    if semaphore is not None:
+        semaphore.release()
+
+
+async def parse_async(
+    parser: Union[Type[Parser], ModuleType],
+    source: Source,
+    filename: Optional[str] = None,
+    *,
+    executor: Optional[concurrent.futures.Executor] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """Parse *source* once; see AsyncParser.parse()."""
+    return await AsyncParser(parser, executor=executor, options=options).parse(source, filename)
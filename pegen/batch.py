@@ -0,0 +1,232 @@
+"""Parse many files at once in a pool of worker processes."""
+
+import concurrent.futures
+import importlib.util
+import os
+import pickle
+import signal
+import time
+import tokenize
+
+from types import FrameType, ModuleType
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+from pegen.parser import Parser
+from pegen.tokenizer import Tokenizer
+
+# What parse_files() accepts as a parser: a generated Python parser class,
+# a C extension module, or the path of either (a .py file defining
+# GeneratedParser, or what pegen.build.compile_c_extension() returns).
+ParserSpec = Union[Type[Parser], ModuleType, str, "os.PathLike[str]"]
+
+
+class BatchResult(NamedTuple):
+    """The outcome of parsing one file in parse_files()."""
+
+    path: str
+    tree: Any  # None unless keep_trees was set, or on error
+    error: Optional[Exception]
+    time: float  # Seconds spent parsing, in the worker
+    size: int  # In bytes
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# The per-file parse function of the current worker, and the options it
+# was made with; see _init_worker().
+_parse: Optional[Callable[[str], Any]] = None
+_options: Dict[str, Any] = {}
+_timer_armed = False
+
+# A BatchResult as sent back by a worker, with the tree still pickled.
+_ChunkResult = Tuple[str, Optional[bytes], Optional[Exception], float, int]
+
+
+def _load_parser(spec: Any) -> Callable[[str], Any]:
+    if isinstance(spec, str):
+        name = os.path.basename(spec).split(".")[0]
+        module_spec = cast(Any, importlib.util.spec_from_file_location(name, spec))
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+        spec = module.GeneratedParser if spec.endswith(".py") else module
+    if isinstance(spec, ModuleType):
+        return _c_parse_function(spec)
+    return _python_parse_function(spec)
+
+
+def _c_parse_function(module: Any) -> Callable[[str], Any]:
+    kwargs = dict(_options)
+    if hasattr(module, "new_parser"):
+        kwargs["parser"] = module.new_parser()
+
+    def parse(path: str) -> Any:
+        return module.parse_file(path, **kwargs)
+
+    return parse
+
+
+def _python_parse_function(parser_class: Type[Parser]) -> Callable[[str], Any]:
+    # One parser, restarted for each file.
+    parser = parser_class(Tokenizer(iter(())), **_options)
+    # A parser generated with a lexer tokenizes with that.
+    generate_tokens = getattr(parser_class, "generate_tokens", tokenize.generate_tokens)
+
+    def parse(path: str) -> Any:
+        with tokenize.open(path) as file:
+            parser.restart(generate_tokens(file.readline))
+            tree = parser.start()
+            if tree is None:
+                raise parser.make_syntax_error(path)
+        return tree
+
+    return parse
+
+
+def _init_worker(spec: Any, options: Dict[str, Any]) -> None:
+    global _parse
+    _options.update(options)
+    _parse = _load_parser(spec)
+
+
+def _on_timeout(signum: int, frame: Optional[FrameType]) -> None:
+    if _timer_armed:
+        raise TimeoutError("parsing took too long")
+
+
+def _parse_chunk(
+    paths: Sequence[str], timeout: Optional[float], keep_trees: bool
+) -> List[_ChunkResult]:
+    global _timer_armed
+    assert _parse is not None
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, _on_timeout)
+    results: List[_ChunkResult] = []
+    for path in paths:
+        tree = error = None
+        t0 = time.perf_counter()
+        try:
+            if timeout is not None:
+                _timer_armed = True
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                tree = _parse(path)
+            finally:
+                _timer_armed = False
+                if timeout is not None:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except Exception as err:
+            error = err
+        dt = time.perf_counter() - t0
+        # Pickle here, so that a tree or error that cannot be sent back
+        # fails only its own file rather than the whole chunk.
+        data = None
+        try:
+            if error is not None:
+                pickle.dumps(error)
+            elif keep_trees:
+                data = pickle.dumps(tree)
+        except Exception as err:
+            error = error or err
+            error = RuntimeError(f"{error.__class__.__name__}: {error}")
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        results.append((path, data, error, dt, size))
+    return results
+
+
+def parse_files(
+    parser: ParserSpec,
+    paths: Iterable[str],
+    *,
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+    largest_first: bool = True,
+    timeout: Optional[float] = None,
+    ordered: bool = False,
+    keep_trees: bool = False,
+    options: Optional[Dict[str, Any]] = None,
+) -> Iterator[BatchResult]:
+    """Parse each file in *paths*, yielding a BatchResult for each.
+
+    The files are parsed by *workers* processes (by default, one per
+    CPU), each loading *parser* once and reusing it for every file it is
+    handed.  A Python parser class must be importable by the workers,
+    unless they are forked.  *options* are keyword arguments for the C
+    extension's parse_file() (e.g. two_phase=True), or for the Python
+    parser class (e.g. evict=True).
+
+    Files are handed out *chunksize* at a time, the largest ones first
+    unless *largest_first* is false, so that one big file does not keep
+    a worker busy after the others have finished.  Results are yielded
+    as they come in, or in the order of *paths* if *ordered* is set.
+    Trees are only sent back if *keep_trees* is set.
+
+    A file that takes more than *timeout* seconds fails with a
+    TimeoutError.  This uses SIGALRM, so it is not available on
+    Windows; and since the C parser cannot be interrupted, such a file
+    is still parsed to the end before it is reported.
+    """
+    paths = [os.fspath(path) for path in paths]
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if timeout is not None and not hasattr(signal, "setitimer"):
+        raise ValueError("timeouts are not supported on this platform")
+
+    spec: Any = parser
+    if isinstance(parser, ModuleType):
+        spec = parser.__file__
+    elif not isinstance(parser, type):
+        spec = os.fspath(parser)
+
+    order = list(range(len(paths)))
+    if largest_first:
+        sizes = []
+        for path in paths:
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(0)
+        order.sort(key=lambda i: -sizes[i])
+    chunks = [order[i : i + chunksize] for i in range(0, len(order), chunksize)]
+
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(spec, options or {})
+    ) as executor:
+        futures = {
+            executor.submit(_parse_chunk, [paths[i] for i in chunk], timeout, keep_trees): chunk
+            for chunk in chunks
+        }
+        try:
+            done: Dict[int, BatchResult] = {}
+            next_index = 0
+            for future in concurrent.futures.as_completed(futures):
+                for i, (path, data, error, dt, size) in zip(futures[future], future.result()):
+                    tree = None if data is None else pickle.loads(data)
+                    done[i] = BatchResult(path, tree, error, dt, size)
+                if not ordered:
+                    yield from done.values()
+                    done.clear()
+                while next_index in done:
+                    yield done.pop(next_index)
+                    next_index += 1
+        finally:
+            for future in futures:
+                future.cancel()
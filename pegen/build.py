@@ -2,10 +2,10 @@ import pathlib
 import shutil
 import tokenize
 
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
+import distutils.core
 import distutils.log
-from distutils.core import Distribution, Extension
 from distutils.command.clean import clean  # type: ignore
 from distutils.command.build_ext import build_ext  # type: ignore
 
@@ -16,6 +16,7 @@ from pegen.parser import Parser
 from pegen.parser_generator import ParserGenerator
 from pegen.python_generator import PythonParserGenerator
 from pegen.tokenizer import Tokenizer
+from pegen.vm_generator import VMParserGenerator
 
 MOD_DIR = pathlib.Path(__file__)
 
@@ -36,23 +37,98 @@ def compile_c_extension(
     If *build_dir* is provided, that path will be used as the temporary build directory
     of distutils (this is useful in case you want to use a temporary directory).
     """
-    if verbose:
-        distutils.log.set_verbosity(distutils.log.DEBUG)
+    return _build_extension(
+        pathlib.Path(generated_source_path),
+        [str(MOD_DIR.parent / "pegen.c"), generated_source_path],
+        build_dir,
+        verbose,
+        keep_asserts,
+    )
+
+
+def compile_tokenizer_extension(build_dir: Optional[str] = None, verbose: bool = False) -> str:
+    """Compile CPython's tokenizer into the pegen.ctokenizer extension module.
+
+    Python parsers can then use it in place of the tokenize module; see
+    pegen.tokenizer.generate_tokens_c().  The extension is generated next to
+    its source, pegen/ctokenizer.c, and its path is returned.
+    """
+    source_file_path = MOD_DIR.parent / "ctokenizer.c"
+    return _build_extension(
+        source_file_path, [str(source_file_path)], build_dir, verbose, keep_asserts=False
+    )
+
+
+def compile_mypyc_extension(
+    generated_source_path: str,
+    build_dir: Optional[str] = None,
+    verbose: bool = False,
+    keep_asserts: bool = True,
+) -> str:
+    """Compile a Python parser generated with mypyc=True into an extension module.
+
+    This needs mypyc, which comes with mypy, instead of the C runtime that
+    compile_c_extension() builds with each parser.  mypyc type checks the
+    module first, actions included, and only compiles it if there are no
+    errors; pegen itself must be importable from the current directory or
+    installed.  Like compile_c_extension(), the extension is generated next
+    to the source, with the same basename, and its path is returned; the C
+    source that mypyc writes goes to *build_dir* too.
+    """
+    from mypyc.build import mypycify  # type: ignore
 
     source_file_path = pathlib.Path(generated_source_path)
+    target_dir = build_dir or "build"
+    extensions = mypycify(
+        [
+            generated_source_path,
+            # Only report errors in the parser, not in pegen.
+            "--follow-imports=silent",
+            f"--cache-dir={pathlib.Path(target_dir) / '.mypy_cache'}",
+        ],
+        verbose=verbose,
+        strip_asserts=not keep_asserts,
+        target_dir=target_dir,
+    )
+    return _run_build_ext(source_file_path, extensions, build_dir, verbose)
+
+
+def _build_extension(
+    source_file_path: pathlib.Path,
+    sources: List[str],
+    build_dir: Optional[str],
+    verbose: bool,
+    keep_asserts: bool,
+) -> str:
     extension_name = source_file_path.stem
     extra_compile_args = []
     if keep_asserts:
         extra_compile_args.append("-UNDEBUG")
     extension = [
-        Extension(
+        distutils.core.Extension(
             extension_name,
-            sources=[str(MOD_DIR.parent / "pegen.c"), generated_source_path],
+            sources=sources,
             include_dirs=[str(MOD_DIR.parent)],
             extra_compile_args=extra_compile_args,
         )
     ]
-    dist = Distribution({"name": extension_name, "ext_modules": extension})
+    return _run_build_ext(source_file_path, extension, build_dir, verbose)
+
+
+def _run_build_ext(
+    source_file_path: pathlib.Path,
+    extension: List[distutils.core.Extension],
+    build_dir: Optional[str],
+    verbose: bool,
+) -> str:
+    if verbose:
+        distutils.log.set_verbosity(distutils.log.DEBUG)
+
+    extension_name = source_file_path.stem
+    # Extension and Distribution are looked up when used: importing mypyc
+    # patches distutils (through setuptools), after which build_ext only
+    # accepts the new classes.
+    dist = distutils.core.Distribution({"name": extension_name, "ext_modules": extension})
     cmd = build_ext(dist)
     cmd.inplace = True
     if build_dir:
@@ -92,13 +168,37 @@ def build_generator(
     compile_extension: bool = False,
     verbose_c_extension: bool = False,
     keep_asserts_in_extension: bool = True,
+    selective_memo: bool = False,
+    untraced: bool = False,
+    lexer: bool = False,
+    vm: bool = False,
+    nodes: str = "list",
+    inline_size: int = 3,
+    mypyc: bool = False,
 ) -> ParserGenerator:
+    if nodes != "list" and (vm or not output_file.endswith(".py")):
+        raise ValueError("only Python parsers without --vm can make nodes")
+    if mypyc and (vm or not output_file.endswith(".py")):
+        raise ValueError("only Python parsers without --vm can be compiled with mypyc")
     with open(output_file, "w") as file:
         gen: ParserGenerator
         if output_file.endswith(".c"):
-            gen = CParserGenerator(grammar, file)
+            gen = CParserGenerator(
+                grammar, file, selective_memo=selective_memo, lexer=lexer, inline_size=inline_size
+            )
+        elif output_file.endswith(".py") and vm:
+            gen = VMParserGenerator(grammar, file, selective_memo=selective_memo, lexer=lexer)
         elif output_file.endswith(".py"):
-            gen = PythonParserGenerator(grammar, file)
+            gen = PythonParserGenerator(
+                grammar,
+                file,
+                selective_memo=selective_memo,
+                untraced=untraced,
+                lexer=lexer,
+                nodes=nodes,
+                inline_size=inline_size,
+                mypyc=mypyc,
+            )
         else:
             raise Exception("Your output file must either be a .c or .py file")
         gen.generate(grammar_file)
@@ -107,6 +207,10 @@ def build_generator(
         compile_c_extension(
             output_file, verbose=verbose_c_extension, keep_asserts=keep_asserts_in_extension
         )
+    elif compile_extension and mypyc:
+        compile_mypyc_extension(
+            output_file, verbose=verbose_c_extension, keep_asserts=keep_asserts_in_extension
+        )
 
     return gen
 
@@ -119,14 +223,21 @@ def build_parser_and_generator(
     verbose_parser: bool = False,
     verbose_c_extension: bool = False,
     keep_asserts_in_extension: bool = True,
+    selective_memo: bool = False,
+    untraced: bool = False,
+    lexer: bool = False,
+    vm: bool = False,
+    nodes: str = "list",
+    inline_size: int = 3,
+    mypyc: bool = False,
 ) -> Tuple[Grammar, Parser, Tokenizer, ParserGenerator]:
     """Generate rules, parser, tokenizer, parser generator for a given grammar
 
     Args:
         grammar_file (string): Path for the grammar file
         output_file (string): Path for the output file
-        compile_extension (bool, optional): Whether to compile the C extension.
-          Defaults to False.
+        compile_extension (bool, optional): Whether to compile the C extension,
+          or with mypyc, the Python parser. Defaults to False.
         verbose_tokenizer (bool, optional): Whether to display additional output
           when generating the tokenizer. Defaults to False.
         verbose_parser (bool, optional): Whether to display additional output
@@ -135,6 +246,24 @@ def build_parser_and_generator(
           output when compiling the C extension . Defaults to False.
         keep_asserts_in_extension (bool, optional): Whether to keep the assert statements
           when compiling the extension module. Defaults to True.
+        selective_memo (bool, optional): Whether to memoize only left-recursive
+          rules and rules marked (memo). Defaults to False.
+        untraced (bool, optional): Whether to generate an untraced Python parser
+          plus a traced subclass for verbose runs. Defaults to False.
+        lexer (bool, optional): Whether the parser should tokenize with a lexer
+          generated from the grammar, instead of Python's tokenizer. Defaults
+          to False.
+        vm (bool, optional): Whether to generate a Python parser that runs the
+          grammar as tables on pegen.vm, instead of a method per rule. Defaults
+          to False.
+        nodes (str, optional): What a Python parser returns from alternatives
+          without an action: "list" for a list of the values, "slots" or
+          "tuple" for a node (see pegen.nodes). Defaults to "list".
+        inline_size (int, optional): The most items a group may have to be
+          matched in its caller instead of by a helper rule; 0 keeps every
+          helper rule. Not used with vm. Defaults to 3.
+        mypyc (bool, optional): Whether to generate a Python parser for mypyc
+          to compile (see compile_mypyc_extension()). Defaults to False.
     """
     grammar, parser, tokenizer = build_parser(grammar_file, verbose_tokenizer, verbose_parser)
     gen = build_generator(
@@ -145,6 +274,13 @@ def build_parser_and_generator(
         compile_extension,
         verbose_c_extension,
         keep_asserts_in_extension,
+        selective_memo,
+        untraced,
+        lexer,
+        vm,
+        nodes,
+        inline_size,
+        mypyc,
     )
 
     return grammar, parser, tokenizer, gen
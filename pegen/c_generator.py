@@ -4,6 +4,7 @@ from typing import Any, cast, Dict, IO, Optional, List, Text, Tuple
 
 from pegen.grammar import (
     Cut,
+    GrammarError,
     GrammarVisitor,
     Rhs,
     Alt,
@@ -21,36 +22,120 @@ from pegen.grammar import (
     Rule,
 )
 from pegen import grammar
+from pegen.lexer_generator import c_lexer
 from pegen.parser_generator import dedupe, ParserGenerator
 from pegen.tokenizer import exact_token_types
 
+# How run_parser_iter_*() turns a result of the stream rule into statements.
+STREAM_KINDS = {"stmt_ty": "STREAM_STMT", "asdl_seq*": "STREAM_SEQ", "mod_ty": "STREAM_MOD"}
+
 EXTENSION_PREFIX = """\
 #include "pegen.h"
 """
 EXTENSION_SUFFIX = """
 static PyObject *
-parse_file(PyObject *self, PyObject *args)
+parse_file(PyObject *self, PyObject *args, PyObject *kwds)
 {
+    static char *keywords[] = {"file", "evict", "two_phase", "parser", "mmap", NULL};
     const char *filename;
+    int evict = 0;
+    int two_phase = 0;
+    PyObject *parser = Py_None;
+    int mmap = 0;
 
-    if (!PyArg_ParseTuple(args, "s", &filename))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|ppOp", keywords, &filename, &evict, &two_phase,
+                                     &parser, &mmap))
         return NULL;
-    return run_parser_from_file(filename, (void *)start_rule, %(mode)s);
+    if (mmap)
+        return run_parser_from_mapped_file(filename, (void *)start_rule, %(mode)s, evict,
+                                           two_phase, parser);
+    if (two_phase)
+        return run_parser_two_phase_from_file(filename, (void *)start_rule, %(mode)s, parser);
+    return run_parser_from_file(filename, (void *)start_rule, %(mode)s, evict, parser);
 }
 
 static PyObject *
-parse_string(PyObject *self, PyObject *args)
+parse_string(PyObject *self, PyObject *args, PyObject *kwds)
 {
+    static char *keywords[] = {"str", "evict", "two_phase", "parser", NULL};
     const char *the_string;
+    int evict = 0;
+    int two_phase = 0;
+    PyObject *parser = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|ppO", keywords, &the_string, &evict,
+                                     &two_phase, &parser))
+        return NULL;
+    if (two_phase)
+        return run_parser_two_phase_from_string(the_string, (void *)start_rule, %(mode)s, parser);
+    return run_parser_from_string(the_string, (void *)start_rule, %(mode)s, evict, parser);
+}
 
-    if (!PyArg_ParseTuple(args, "s", &the_string))
+static PyObject *
+parse_buffer(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"buffer", "evict", "two_phase", "parser", NULL};
+    PyObject *buffer;
+    int evict = 0;
+    int two_phase = 0;
+    PyObject *parser = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|ppO", keywords, &buffer, &evict, &two_phase,
+                                     &parser))
         return NULL;
-    return run_parser_from_string(the_string, (void *)start_rule, %(mode)s);
+    return run_parser_from_buffer(buffer, (void *)start_rule, %(mode)s, evict, two_phase, parser);
+}
+
+static PyObject *
+parse_file_iter(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"file", "callback", NULL};
+    const char *filename;
+    PyObject *callback;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "sO", keywords, &filename, &callback))
+        return NULL;
+    if (!PyCallable_Check(callback)) {
+        PyErr_SetString(PyExc_TypeError, "callback must be callable");
+        return NULL;
+    }
+    return run_parser_iter_from_file(filename, (void *)%(stream_rule)s_rule, %(stream_kind)s, callback);
+}
+
+static PyObject *
+parse_string_iter(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"str", "callback", NULL};
+    const char *the_string;
+    PyObject *callback;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "sO", keywords, &the_string, &callback))
+        return NULL;
+    if (!PyCallable_Check(callback)) {
+        PyErr_SetString(PyExc_TypeError, "callback must be callable");
+        return NULL;
+    }
+    return run_parser_iter_from_string(the_string, (void *)%(stream_rule)s_rule, %(stream_kind)s, callback);
+}
+
+static PyObject *
+new_parser(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+    return new_parser_capsule();
 }
 
 static PyMethodDef ParseMethods[] = {
-    {"parse_file",  parse_file, METH_VARARGS, "Parse a file."},
-    {"parse_string",  parse_string, METH_VARARGS, "Parse a string."},
+    {"parse_file", (PyCFunction)(void(*)(void))parse_file, METH_VARARGS|METH_KEYWORDS,
+     "Parse a file, reading it a line at a time or, with mmap=True, mapping it into memory."},
+    {"parse_string", (PyCFunction)(void(*)(void))parse_string, METH_VARARGS|METH_KEYWORDS, "Parse a string."},
+    {"parse_buffer", (PyCFunction)(void(*)(void))parse_buffer, METH_VARARGS|METH_KEYWORDS,
+     "Parse UTF-8 source code (or with a coding declaration) from a bytes-like object."},
+    {"parse_file_iter", (PyCFunction)(void(*)(void))parse_file_iter, METH_VARARGS|METH_KEYWORDS,
+     "Parse a file, calling callback with each statement as soon as it is parsed."},
+    {"parse_string_iter", (PyCFunction)(void(*)(void))parse_string_iter, METH_VARARGS|METH_KEYWORDS,
+     "Parse a string, calling callback with each statement as soon as it is parsed."},
+    {"new_parser", new_parser, METH_NOARGS,
+     "Make a parser to pass to parse_file(), parse_string() and parse_buffer() for many inputs."},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -67,7 +152,7 @@ PyInit_%(modulename)s(void)
     PyObject *m = PyModule_Create(&parsemodule);
     if (m == NULL)
         return NULL;
-
+%(init)s
     return m;
 }
 
@@ -162,15 +247,29 @@ class CCallMakerVisitor(GrammarVisitor):
         return self.visit(node.rhs)
 
     def visit_Cut(self, node: Cut) -> Tuple[str, str]:
-        return "cut_var", "1"
+        return "cut_var", "cut(p)"
 
 
 class CParserGenerator(ParserGenerator, GrammarVisitor):
-    def __init__(self, grammar: grammar.Grammar, file: Optional[IO[Text]], debug: bool = False):
-        super().__init__(grammar, file)
+    def __init__(
+        self,
+        grammar: grammar.Grammar,
+        file: Optional[IO[Text]],
+        debug: bool = False,
+        *,
+        selective_memo: bool = False,
+        lexer: bool = False,
+        inline_size: int = 3,
+    ):
+        super().__init__(grammar, file, selective_memo=selective_memo, inline_size=inline_size)
+        if self.reserved_keywords:
+            raise GrammarError("C parsers do not support @keywords reserved")
         self.callmakervisitor = CCallMakerVisitor(self)
         self._varname_counter = 0
         self.debug = debug
+        # With lexer, the extension tokenizes with a lexer for the grammar's
+        # tokens (see pegen.lexer_generator) instead of CPython's tokenizer.
+        self.lexer = lexer
 
     def unique_varname(self, name: str = "tmpvar") -> str:
         new_var = name + "_" + str(self._varname_counter)
@@ -237,11 +336,27 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
                 del self.todo[rulename]
                 self.print()
                 self.visit(rule)
+        init = ""
+        if self.lexer:
+            self.print()
+            self.printblock(c_lexer(self.grammar))
+            init = "    lexer_spec = &lexer;\n"
         mode = int(self.rules["start"].type == "mod_ty")
+        stream_type = (self.rules[self.stream_rule].type or "").replace(" ", "")
+        stream_kind = STREAM_KINDS.get(stream_type, "STREAM_NONE")
         modulename = self.grammar.metas.get("modulename", "parse")
         trailer = self.grammar.metas.get("trailer", EXTENSION_SUFFIX)
         if trailer:
-            self.print(trailer.rstrip("\n") % dict(mode=mode, modulename=modulename))
+            self.print(
+                trailer.rstrip("\n")
+                % dict(
+                    mode=mode,
+                    modulename=modulename,
+                    stream_rule=self.stream_rule,
+                    stream_kind=stream_kind,
+                    init=init,
+                )
+            )
 
     def _set_up_token_start_metadata_extraction(self) -> None:
         self.print("if (p->mark == p->fill && fill_token(p) < 0) {")
@@ -293,7 +408,8 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
         self.print(f"{node.name}_raw(Parser *p)")
 
     def _handle_default_rule_body(self, node: Rule, rhs: Rhs, result_type: str) -> None:
-        memoize = not node.left_recursive
+        # A leader's memo is handled by its wrapper, not by the _raw function.
+        memoize = not node.left_recursive and self.should_memoize(node)
 
         with self.indent():
             self.print(f"{result_type} res = NULL;")
@@ -316,10 +432,47 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
         with self.indent():
             if memoize:
                 self.print(f"insert_memo(p, mark, {node.name}_type, res);")
+            if node.name in self.sync_rules:
+                self.print("if (res != NULL && p->evict) {")
+                with self.indent():
+                    self.print("commit(p);")
+                self.print("}")
+            self.print("return res;")
+
+    def _handle_left_rec_loop_body(self, node: Rule, result_type: str) -> None:
+        loop = self.left_rec_loops[node.name]
+        memoize = self.should_memoize(node)
+
+        with self.indent():
+            self.print(f"{result_type} res = NULL;")
+            if memoize:
+                self.print(f"if (is_memoized(p, {node.name}_type, &res))")
+                with self.indent():
+                    self.print("return res;")
+            self.print("int mark = p->mark;")
+            self._set_up_token_start_metadata_extraction()
+            if memoize:
+                self.print("int start_mark = mark;")
+            self.print(f"{result_type} lastres = NULL;")
+            self.print(f"res = {loop.seed}_rule(p);")
+            # Like the seed growing loop, stop at the first step that fails
+            # and return the previous result.
+            self.print("while (res != NULL) {")
+            with self.indent():
+                self.print("lastres = res;")
+                self.print("mark = p->mark;")
+                for alt in loop.alts:
+                    self.visit(alt, is_loop=False, is_gather=False, rulename=None, left_rec=True)
+                self.print("break;")
+            self.print("}")
+            self.print("p->mark = mark;")
+            self.print("res = lastres;")
+            if memoize:
+                self.print(f"insert_memo(p, start_mark, {node.name}_type, res);")
             self.print("return res;")
 
     def _handle_loop_rule_body(self, node: Rule, rhs: Rhs) -> None:
-        memoize = not node.left_recursive
+        memoize = not node.left_recursive and self.should_memoize(node)
         is_repeat1 = node.name.startswith("_loop1")
 
         with self.indent():
@@ -349,7 +502,7 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
             self.out_of_memory_return(f"!seq", "NULL", message=f"asdl_seq_new {node.name}")
             self.print("for (int i = 0; i < n; i++) asdl_seq_SET(seq, i, children[i]);")
             self.print("PyMem_Free(children);")
-            if node.name:
+            if memoize:
                 self.print(f"insert_memo(p, mark, {node.name}_type, seq);")
             self.print("return seq;")
 
@@ -366,29 +519,74 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
 
         for line in str(node).splitlines():
             self.print(f"// {line}")
-        if node.left_recursive and node.leader:
+        if self.grows_seed(node):
             self.print(f"static {result_type} {node.name}_raw(Parser *);")
 
         self.print(f"static {result_type}")
         self.print(f"{node.name}_rule(Parser *p)")
 
-        if node.left_recursive and node.leader:
+        if self.grows_seed(node):
             self._set_up_rule_memoization(node, result_type)
 
         self.print("{")
         if is_loop:
             self._handle_loop_rule_body(node, rhs)
+        elif node.name in self.left_rec_loops:
+            self._handle_left_rec_loop_body(node, result_type)
         else:
             self._handle_default_rule_body(node, rhs, result_type)
         self.print("}")
 
-    def visit_NamedItem(self, node: NamedItem, names: List[str]) -> None:
+    def visit_NamedItem(
+        self, node: NamedItem, names: List[str], value: Optional[str] = None, prefix: str = ""
+    ) -> None:
         name, call = self.callmakervisitor.visit(node)
+        group = None
+        if value is not None:
+            # Bind the name to an already matched value.
+            call = value
+        else:
+            group = self.inline_group(node.item)
         if not name:
             self.print(call)
         else:
-            name = dedupe(name, names)
-            self.print(f"({name} = {call})")
+            name = prefix + dedupe(name, names)
+            if group is not None:
+                self.print_inline_group(name, *group)
+            else:
+                self.print(f"({name} = {call})")
+
+    def print_inline_group(self, name: str, helper: str, node: Alt, optional: bool) -> None:
+        # Match the items of the group's helper rule, into variables prefixed
+        # with the helper's name (see collect_vars()), and set name to what
+        # the helper would return.
+        prefix = f"{helper}_"
+        names: List[str] = []
+        for item in node.items:
+            self.add_var(item, names)
+        names = [prefix + name for name in names]
+        if node.action:
+            value = prefix + node.action.strip()
+        elif len(names) > 1:
+            value = f"CONSTRUCTOR(p, {', '.join(names)})"
+        else:
+            value = names[0]
+        names = []
+        if not optional:
+            for item in node.items:
+                self.visit(item, names=names, prefix=prefix)
+                self.print("&&")
+            self.print(f"({name} = {value})")
+            return
+        # Without a match, go back to where the group started.
+        mark = f"{helper}_mark"
+        self.print(f"({mark} = p->mark, ({name} = (")
+        with self.indent():
+            for i, item in enumerate(node.items):
+                if i:
+                    self.print("&&")
+                self.visit(item, names=names, prefix=prefix)
+        self.print(f") ? {value} : (p->mark = {mark}, NULL)), 1)")
 
     def visit_Rhs(
         self, node: Rhs, is_loop: bool, is_gather: bool, rulename: Optional[str]
@@ -399,7 +597,12 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
             self.visit(alt, is_loop=is_loop, is_gather=is_gather, rulename=rulename)
 
     def visit_Alt(
-        self, node: Alt, is_loop: bool, is_gather: bool, rulename: Optional[str]
+        self,
+        node: Alt,
+        is_loop: bool,
+        is_gather: bool,
+        rulename: Optional[str],
+        left_rec: bool = False,
     ) -> None:
         self.print(f"{{ // {node}")
         with self.indent():
@@ -422,6 +625,9 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
                 for item in node.items:
                     if first:
                         first = False
+                        if left_rec:
+                            self.visit(item, names=names, value="lastres")
+                            continue
                     else:
                         self.print("&&")
                     self.visit(item, names=names)
@@ -457,20 +663,32 @@ class CParserGenerator(ParserGenerator, GrammarVisitor):
                     self.out_of_memory_return(f"!children", "NULL", message=f"realloc {rulename}")
                     self.print(f"children[n++] = res;")
                     self.print("mark = p->mark;")
+                elif left_rec:
+                    self.print("continue;")
                 else:
                     self.print(f"goto done;")
             self.print("}")
             self.print("p->mark = mark;")
             if "cut_var" in names:
-                self.print("if (cut_var) return NULL;")
+                if left_rec:
+                    self.print("if (cut_var) break;")
+                else:
+                    self.print("if (cut_var) return NULL;")
         self.print("}")
 
-    def collect_vars(self, node: Alt) -> Dict[str, Optional[str]]:
+    def collect_vars(self, node: Alt, prefix: str = "") -> Dict[str, Optional[str]]:
         names: List[str] = []
         types = {}
         for item in node.items:
             name, type = self.add_var(item, names)
-            types[name] = type
+            types[prefix + name if name else name] = type
+            group = self.inline_group(item.item)
+            if group is not None:
+                # The variables of an inlined group, see print_inline_group().
+                helper, alt, optional = group
+                types.update(self.collect_vars(alt, f"{helper}_"))
+                if optional:
+                    types[f"{helper}_mark"] = "int"
         return types
 
     def add_var(self, node: NamedItem, names: List[str]) -> Tuple[str, Optional[str]]:
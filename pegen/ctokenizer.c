@@ -0,0 +1,304 @@
+// CPython's tokenizer (see v38tokenizer.h), as a token source for parsers
+// generated by the Python backend; see pegen.tokenizer.generate_tokens_c().
+
+#include <Python.h>
+#include <errcode.h>
+#include <token.h>
+#include "v38tokenizer.h"
+
+// The number of characters in the UTF-8 bytes from start to end.
+static Py_ssize_t
+char_count(const char *start, const char *end)
+{
+    Py_ssize_t n = 0;
+    for (const char *c = start; c < end; c++) {
+        if ((*c & 0xC0) != 0x80) {  // Not a continuation byte
+            n++;
+        }
+    }
+    return n;
+}
+
+// A (row, column) tuple, with the column counted in characters.
+static PyObject *
+position(int lineno, const char *line_start, const char *p, int ascii)
+{
+    Py_ssize_t col = ascii ? p - line_start : char_count(line_start, p);
+    PyObject *row = PyLong_FromLong(lineno);
+    PyObject *column = PyLong_FromSsize_t(col);
+    PyObject *pos = PyTuple_New(2);
+    if (row == NULL || column == NULL || pos == NULL) {
+        Py_XDECREF(row);
+        Py_XDECREF(column);
+        Py_XDECREF(pos);
+        return NULL;
+    }
+    PyTuple_SET_ITEM(pos, 0, row);
+    PyTuple_SET_ITEM(pos, 1, column);
+    return pos;
+}
+
+// A TokenInfo, made the way tuple.__new__(token_type, items) would.  The
+// references to the items are stolen, even on failure.
+static PyObject *
+new_token(PyTypeObject *token_type, int type, PyObject *string, PyObject *start,
+          PyObject *end, PyObject *line)
+{
+    PyObject *items[] = {PyLong_FromLong(type), string, start, end, line};
+    PyObject *token = token_type->tp_alloc(token_type, 5);
+    for (int i = 0; i < 5; i++) {
+        if (token == NULL || items[i] == NULL) {
+            for (int j = 0; j < 5; j++) {
+                Py_XDECREF(items[j]);
+            }
+            Py_XDECREF(token);
+            return NULL;
+        }
+    }
+    for (int i = 0; i < 5; i++) {
+        PyTuple_SET_ITEM(token, i, items[i]);
+    }
+    return token;
+}
+
+// The exception for an ERRORTOKEN, to be returned rather than raised.
+static PyObject *
+tokenizer_error(struct tok_state *tok, PyObject *filename)
+{
+    if (PyErr_Occurred()) {
+        // E_NOMEM, E_DECODE and the like leave their own exception behind.
+        PyObject *type, *value, *tb;
+        PyErr_Fetch(&type, &value, &tb);
+        PyErr_NormalizeException(&type, &value, &tb);
+        if (tb != NULL) {
+            PyException_SetTraceback(value, tb);
+        }
+        Py_XDECREF(type);
+        Py_XDECREF(tb);
+        return value;
+    }
+
+    // The same messages as CPython's own parser.
+    PyObject *type = PyExc_SyntaxError;
+    const char *msg;
+    switch (tok->done) {
+        case E_EOF:
+            msg = "unexpected EOF while parsing";
+            break;
+        case E_EOFS:
+            msg = "EOF while scanning triple-quoted string literal";
+            break;
+        case E_EOLS:
+            msg = "EOL while scanning string literal";
+            break;
+        case E_DEDENT:
+            type = PyExc_IndentationError;
+            msg = "unindent does not match any outer indentation level";
+            break;
+        case E_TABSPACE:
+            type = PyExc_TabError;
+            msg = "inconsistent use of tabs and spaces in indentation";
+            break;
+        case E_TOODEEP:
+            type = PyExc_IndentationError;
+            msg = "too many levels of indentation";
+            break;
+        case E_LINECONT:
+            msg = "unexpected character after line continuation character";
+            break;
+        case E_IDENTIFIER:
+            msg = "invalid character in identifier";
+            break;
+        default:
+            msg = "invalid token";
+    }
+
+    const char *line_end = strchr(tok->line_start, '\n');
+    line_end = line_end == NULL ? tok->line_start + strlen(tok->line_start) : line_end + 1;
+    const char *cur = tok->cur < line_end ? tok->cur : line_end;
+    PyObject *text = PyUnicode_DecodeUTF8(tok->line_start, line_end - tok->line_start, "replace");
+    if (text == NULL) {
+        return NULL;
+    }
+    PyObject *args = Py_BuildValue("(s(OinN))", msg, filename, tok->lineno,
+                                   char_count(tok->line_start, cur), text);
+    if (args == NULL) {
+        return NULL;
+    }
+    PyObject *error = PyObject_Call(type, args, NULL);
+    Py_DECREF(args);
+    return error;
+}
+
+// Whether the tokenizer is past the last line, where tokenize puts the
+// remaining DEDENT tokens and the ENDMARKER.
+#define AT_EOF(tok) ((tok)->done == E_EOF)
+
+static PyObject *
+tokenize_source(struct tok_state *tok, PyTypeObject *token_type, PyObject *filename,
+                int added_line)
+{
+    PyObject *error = NULL;
+    // The current line (or lines, for a multi-line string), shared by the
+    // tokens on it.
+    PyObject *line = NULL;
+    const char *line_start = NULL, *line_end = NULL;
+    int ascii = 1;
+    PyObject *tokens = PyList_New(0);
+    PyObject *empty = PyUnicode_New(0, 0);
+    if (tokens == NULL || empty == NULL) {
+        goto error;
+    }
+
+    for (;;) {
+        char *start, *end;
+        int type = PyTokenizer_Get(tok, &start, &end);
+        if (type == ERRORTOKEN) {
+            error = tokenizer_error(tok, filename);
+            if (error == NULL) {
+                goto error;
+            }
+            break;
+        }
+
+        int lineno = type == STRING ? tok->first_lineno : tok->lineno;
+        const char *first_line = type == STRING ? tok->multi_line_start : tok->line_start;
+        PyObject *string, *start_pos, *end_pos;
+        if (AT_EOF(tok)) {
+            Py_INCREF(empty);
+            Py_INCREF(empty);
+            Py_XSETREF(line, empty);
+            line_start = line_end = NULL;
+            string = empty;
+            start_pos = position(tok->lineno + 1 - added_line, NULL, NULL, 1);
+            Py_XINCREF(start_pos);
+            end_pos = start_pos;
+        }
+        else {
+            if (first_line != line_start || tok->inp != line_end) {
+                line_start = first_line;
+                line_end = tok->inp;
+                Py_XSETREF(line, PyUnicode_DecodeUTF8(line_start, line_end - line_start, NULL));
+                if (line == NULL) {
+                    goto error;
+                }
+                ascii = PyUnicode_IS_ASCII(line);
+            }
+            if (start == NULL) {
+                // INDENT and DEDENT: tokenize has them span the indentation.
+                start = (char *)tok->line_start;
+                end = type == INDENT ? tok->cur : start;
+                if (type == DEDENT) {
+                    start = end = tok->cur;
+                }
+            }
+            else if (type == NEWLINE) {
+                // The tokenizer has it span any comment before it, and leaves
+                // out the newline itself.
+                start = tok->cur - 1;
+                end = tok->cur;
+            }
+            string = PyUnicode_DecodeUTF8(start, end - start, NULL);
+            start_pos = position(lineno, first_line, start, ascii);
+            end_pos = position(tok->lineno, tok->line_start, end, ascii);
+        }
+
+        // Like tokenize, report operators as OP, and async and await as names.
+        // A plain OP from the tokenizer is a character it does not know.
+        if (type == OP) {
+            type = ERRORTOKEN;
+        }
+        else if (type > DEDENT && type < OP) {
+            type = OP;
+        }
+        else if (type == ASYNC || type == AWAIT) {
+            type = NAME;
+        }
+        Py_INCREF(line);
+        PyObject *token = new_token(token_type, type, string, start_pos, end_pos, line);
+        if (token == NULL || PyList_Append(tokens, token) < 0) {
+            Py_XDECREF(token);
+            goto error;
+        }
+        Py_DECREF(token);
+        if (type == ENDMARKER) {
+            break;
+        }
+    }
+
+    Py_XDECREF(line);
+    Py_DECREF(empty);
+    if (error == NULL) {
+        Py_INCREF(Py_None);
+        error = Py_None;
+    }
+    return Py_BuildValue("(NN)", tokens, error);
+
+error:
+    Py_XDECREF(tokens);
+    Py_XDECREF(empty);
+    Py_XDECREF(line);
+    return NULL;
+}
+
+static PyObject *
+tokenize(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"source", "token_type", "filename", NULL};
+    const char *source;
+    PyTypeObject *token_type;
+    PyObject *filename = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "sO!|U", keywords, &source, &PyType_Type,
+                                     &token_type, &filename)) {
+        return NULL;
+    }
+    if (!PyType_IsSubtype(token_type, &PyTuple_Type)) {
+        PyErr_SetString(PyExc_TypeError, "token_type must be a subclass of tuple");
+        return NULL;
+    }
+
+    struct tok_state *tok = PyTokenizer_FromUTF8(source, 1);
+    if (tok == NULL) {
+        return NULL;
+    }
+    if (filename == NULL) {
+        filename = PyUnicode_FromString("<string>");
+        if (filename == NULL) {
+            PyTokenizer_Free(tok);
+            return NULL;
+        }
+    }
+    else {
+        Py_INCREF(filename);
+    }
+    // The tokenizer keeps the filename for its own error messages.
+    tok->filename = filename;
+
+    // The tokenizer adds a newline to the end of the input, making an extra
+    // line out of an empty one.
+    int added_line = *source == '\0';
+    PyObject *result = tokenize_source(tok, token_type, filename, added_line);
+    PyTokenizer_Free(tok);  // Also releases the filename
+    return result;
+}
+
+static PyMethodDef TokenizerMethods[] = {
+    {"tokenize", (PyCFunction)(void(*)(void))tokenize, METH_VARARGS|METH_KEYWORDS,
+     "Tokenize a string, returning (tokens, error).\n\n"
+     "The tokens are token_type instances, like tokenize.TokenInfo; error is\n"
+     "the exception that stopped the tokenizer early, or None."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static struct PyModuleDef tokenizermodule = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "ctokenizer",
+    .m_doc = "CPython's tokenizer.",
+    .m_methods = TokenizerMethods,
+};
+
+PyMODINIT_FUNC
+PyInit_ctokenizer(void)
+{
+    return PyModule_Create(&tokenizermodule);
+}
@@ -71,10 +71,12 @@ SIMPLE_STR = True
 
 
 class Rule:
-    def __init__(self, name: str, type: Optional[str], rhs: Rhs):
+    def __init__(self, name: str, type: Optional[str], rhs: Rhs, memo: Optional[str] = None):
         self.name = name
         self.type = type
         self.rhs = rhs
+        # True for (memo), False for (nomemo), None to use the generator's default.
+        self.memo = None if memo is None else memo == "memo"
         self.visited = False
         self.nullable = False
         self.left_recursive = False
@@ -88,9 +90,9 @@ class Rule:
 
     def __str__(self) -> str:
         if SIMPLE_STR or self.type is None:
-            res = f"{self.name}: {self.rhs}"
+            res = f"{self.name}{self.memo_flag()}: {self.rhs}"
         else:
-            res = f"{self.name}[{self.type}]: {self.rhs}"
+            res = f"{self.name}[{self.type}]{self.memo_flag()}: {self.rhs}"
         if len(res) < 88:
             return res
         lines = [res.split(":")[0] + ":"]
@@ -98,7 +100,15 @@ class Rule:
         return "\n".join(lines)
 
     def __repr__(self) -> str:
-        return f"Rule({self.name!r}, {self.type!r}, {self.rhs!r})"
+        if self.memo is None:
+            return f"Rule({self.name!r}, {self.type!r}, {self.rhs!r})"
+        memo = "memo" if self.memo else "nomemo"
+        return f"Rule({self.name!r}, {self.type!r}, {self.rhs!r}, memo={memo!r})"
+
+    def memo_flag(self) -> str:
+        if self.memo is None:
+            return ""
+        return " (memo)" if self.memo else " (nomemo)"
 
     def __iter__(self) -> Iterator[Rhs]:
         yield self.rhs
@@ -5,9 +5,13 @@ import ast
 import sys
 import tokenize
 
+from inspect import unwrap
 from typing import Any, Optional
 
 from pegen.parser import memoize, memoize_left_rec, logger, Parser
+from pegen.parser import memoize_rule, memoize_left_rec_rule, sync_rule
+from pegen.parser import untraced_memoize_rule, untraced_memoize_left_rec_rule
+from pegen.parser import UntracedParser, TracedParserMixin
 from ast import literal_eval
 
 from pegen.grammar import (
@@ -38,614 +42,695 @@ from pegen.grammar import (
 )
 
 class GeneratedParser(Parser):
+    KEYWORDS = frozenset({'memo', 'nomemo'})
 
-    @memoize
+    @memoize_rule(0)
     def start(self) -> Optional[Grammar]:
         # start: grammar $
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
         if (
             (grammar := self.grammar())
             and
-            (endmarker := self.expect('ENDMARKER'))
+            (endmarker := self.expect_type(0))
         ):
             return grammar
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(1)
     def grammar(self) -> Optional[Grammar]:
         # grammar: metas rules | rules
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            _next_token.string == "@"
+            and
             (metas := self.metas())
             and
             (rules := self.rules())
         ):
             return Grammar ( rules , metas )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 1
+            and
             (rules := self.rules())
         ):
             return Grammar ( rules , [ ] )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(2)
     def metas(self) -> Optional[MetaList]:
         # metas: meta metas | meta
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            _next_token.string == "@"
+            and
             (meta := self.meta())
             and
             (metas := self.metas())
         ):
             return [ meta ] + metas
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.string == "@"
+            and
             (meta := self.meta())
         ):
             return [ meta ]
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(3)
     def meta(self) -> Optional[MetaTuple]:
         # meta: "@" NAME NEWLINE | "@" NAME NAME NEWLINE | "@" NAME STRING NEWLINE
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
-            (literal := self.expect("@"))
+            _next_token.string == "@"
+            and
+            (literal := self.expect_string("@"))
             and
             (name := self.name())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
         ):
             return ( name . string , None )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
-            (literal := self.expect("@"))
+            _next_token.string == "@"
+            and
+            (literal := self.expect_string("@"))
             and
             (a := self.name())
             and
             (b := self.name())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
         ):
             return ( a . string , b . string )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
-            (literal := self.expect("@"))
+            _next_token.string == "@"
+            and
+            (literal := self.expect_string("@"))
             and
             (name := self.name())
             and
             (string := self.string())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
         ):
             return ( name . string , literal_eval ( string . string ) )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(4)
     def rules(self) -> Optional[RuleList]:
         # rules: rule rules | rule
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            _next_token.type == 1
+            and
             (rule := self.rule())
             and
             (rules := self.rules())
         ):
             return [ rule ] + rules
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 1
+            and
             (rule := self.rule())
         ):
             return [ rule ]
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(5)
     def rule(self) -> Optional[Rule]:
-        # rule: rulename ":" alts NEWLINE INDENT more_alts DEDENT | rulename ":" NEWLINE INDENT more_alts DEDENT | rulename ":" alts NEWLINE
-        mark = self.mark()
-        cut = False
+        # rule: rulename memoflag? ":" alts NEWLINE INDENT more_alts DEDENT | rulename memoflag? ":" NEWLINE INDENT more_alts DEDENT | rulename memoflag? ":" alts NEWLINE
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            _next_token.type == 1
+            and
             (rulename := self.rulename())
             and
-            (literal := self.expect(":"))
+            (opt := self.memoflag(),)
+            and
+            (literal := self.expect_string(":"))
             and
             (alts := self.alts())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
             and
-            (indent := self.expect('INDENT'))
+            (indent := self.expect_type(5))
             and
             (more_alts := self.more_alts())
             and
-            (dedent := self.expect('DEDENT'))
+            (dedent := self.expect_type(6))
         ):
-            return Rule ( rulename [ 0 ] , rulename [ 1 ] , Rhs ( alts . alts + more_alts . alts ) )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+            return Rule ( rulename [ 0 ] , rulename [ 1 ] , Rhs ( alts . alts + more_alts . alts ) , memo = opt )
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 1
+            and
             (rulename := self.rulename())
             and
-            (literal := self.expect(":"))
+            (opt := self.memoflag(),)
+            and
+            (literal := self.expect_string(":"))
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
             and
-            (indent := self.expect('INDENT'))
+            (indent := self.expect_type(5))
             and
             (more_alts := self.more_alts())
             and
-            (dedent := self.expect('DEDENT'))
+            (dedent := self.expect_type(6))
         ):
-            return Rule ( rulename [ 0 ] , rulename [ 1 ] , more_alts )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+            return Rule ( rulename [ 0 ] , rulename [ 1 ] , more_alts , memo = opt )
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 1
+            and
             (rulename := self.rulename())
             and
-            (literal := self.expect(":"))
+            (opt := self.memoflag(),)
+            and
+            (literal := self.expect_string(":"))
             and
             (alts := self.alts())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
         ):
-            return Rule ( rulename [ 0 ] , rulename [ 1 ] , alts )
-        self.reset(mark)
-        if cut: return None
+            return Rule ( rulename [ 0 ] , rulename [ 1 ] , alts , memo = opt )
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(6)
     def rulename(self) -> Optional[RuleName]:
         # rulename: NAME '[' NAME '*' ']' | NAME '[' NAME ']' | NAME
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            _next_token.type == 1
+            and
             (name := self.name())
             and
-            (literal := self.expect('['))
+            (literal := self.expect_string('['))
             and
             (type := self.name())
             and
-            (literal_1 := self.expect('*'))
+            (literal_1 := self.expect_string('*'))
             and
-            (literal_2 := self.expect(']'))
+            (literal_2 := self.expect_string(']'))
         ):
             return ( name . string , type . string + "*" )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 1
+            and
             (name := self.name())
             and
-            (literal := self.expect('['))
+            (literal := self.expect_string('['))
             and
             (type := self.name())
             and
-            (literal_1 := self.expect(']'))
+            (literal_1 := self.expect_string(']'))
         ):
             return ( name . string , type . string )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 1
+            and
             (name := self.name())
         ):
             return ( name . string , None )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
+        return None
+
+    @memoize_rule(7)
+    def memoflag(self) -> Optional[str]:
+        # memoflag: '(' "memo" ')' | '(' "nomemo" ')'
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
+        if (
+            _next_token.string == '('
+            and
+            (literal := self.expect_string('('))
+            and
+            (literal_1 := self.expect_string("memo"))
+            and
+            (literal_2 := self.expect_string(')'))
+        ):
+            return "memo"
+        if _tokenizer._index != _mark: self.reset(_mark)
+        if (
+            _next_token.string == '('
+            and
+            (literal := self.expect_string('('))
+            and
+            (literal_1 := self.expect_string("nomemo"))
+            and
+            (literal_2 := self.expect_string(')'))
+        ):
+            return "nomemo"
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(8)
     def alts(self) -> Optional[Rhs]:
         # alts: alt "|" alts | alt
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (alt := self.alt())
             and
-            (literal := self.expect("|"))
+            (literal := self.expect_string("|"))
             and
             (alts := self.alts())
         ):
             return Rhs ( [ alt ] + alts . alts )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (alt := self.alt())
         ):
             return Rhs ( [ alt ] )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(9)
     def more_alts(self) -> Optional[Rhs]:
         # more_alts: "|" alts NEWLINE more_alts | "|" alts NEWLINE
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
-            (literal := self.expect("|"))
+            _next_token.string == "|"
+            and
+            (literal := self.expect_string("|"))
             and
             (alts := self.alts())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
             and
             (more_alts := self.more_alts())
         ):
             return Rhs ( alts . alts + more_alts . alts )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
-            (literal := self.expect("|"))
+            _next_token.string == "|"
+            and
+            (literal := self.expect_string("|"))
             and
             (alts := self.alts())
             and
-            (newline := self.expect('NEWLINE'))
+            (newline := self.expect_type(4))
         ):
             return Rhs ( alts . alts )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(10)
     def alt(self) -> Optional[Alt]:
         # alt: items '$' action | items '$' | items action | items
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (items := self.items())
             and
-            (literal := self.expect('$'))
+            (literal := self.expect_string('$'))
             and
             (action := self.action())
         ):
             return Alt ( items + [ NamedItem ( None , NameLeaf ( 'ENDMARKER' ) ) ] , action = action )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (items := self.items())
             and
-            (literal := self.expect('$'))
+            (literal := self.expect_string('$'))
         ):
             return Alt ( items + [ NamedItem ( None , NameLeaf ( 'ENDMARKER' ) ) ] , action = None )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (items := self.items())
             and
             (action := self.action())
         ):
             return Alt ( items , action = action )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (items := self.items())
         ):
             return Alt ( items , action = None )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(11)
     def items(self) -> Optional[NamedItemList]:
         # items: named_item items | named_item
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (named_item := self.named_item())
             and
             (items := self.items())
         ):
             return [ named_item ] + items
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'!', '&', '(', '[', '~'})
+            and
             (named_item := self.named_item())
         ):
             return [ named_item ]
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(12)
     def named_item(self) -> Optional[NamedItem]:
         # named_item: NAME '=' ~ item | item | lookahead
-        mark = self.mark()
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         cut = False
         if (
+            _next_token.type == 1
+            and
             (name := self.name())
             and
-            (literal := self.expect('='))
+            (literal := self.expect_string('='))
             and
-            (cut := True)
+            (cut := self.cut())
             and
             (item := self.item())
         ):
             return NamedItem ( name . string , item )
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
-        cut = False
         if (
+            (_next_token.type in {1, 3} or _next_token.string in {'(', '['})
+            and
             (item := self.item())
         ):
             return NamedItem ( None , item )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.string in {'!', '&', '~'}
+            and
             (it := self.lookahead())
         ):
             return NamedItem ( None , it )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(13)
     def lookahead(self) -> Optional[LookaheadOrCut]:
         # lookahead: '&' ~ atom | '!' ~ atom | '~'
-        mark = self.mark()
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         cut = False
         if (
-            (literal := self.expect('&'))
+            _next_token.string == '&'
+            and
+            (literal := self.expect_string('&'))
             and
-            (cut := True)
+            (cut := self.cut())
             and
             (atom := self.atom())
         ):
             return PositiveLookahead ( atom )
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
         cut = False
         if (
-            (literal := self.expect('!'))
+            _next_token.string == '!'
             and
-            (cut := True)
+            (literal := self.expect_string('!'))
+            and
+            (cut := self.cut())
             and
             (atom := self.atom())
         ):
             return NegativeLookahead ( atom )
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
-        cut = False
         if (
-            (literal := self.expect('~'))
+            _next_token.string == '~'
+            and
+            (literal := self.expect_string('~'))
         ):
             return Cut ( )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(14)
     def item(self) -> Optional[Item]:
         # item: '[' ~ alts ']' | atom '?' | atom '*' | atom '+' | atom '.' atom '+' | atom
-        mark = self.mark()
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         cut = False
         if (
-            (literal := self.expect('['))
+            _next_token.string == '['
+            and
+            (literal := self.expect_string('['))
             and
-            (cut := True)
+            (cut := self.cut())
             and
             (alts := self.alts())
             and
-            (literal_1 := self.expect(']'))
+            (literal_1 := self.expect_string(']'))
         ):
             return Opt ( alts )
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
-        cut = False
         if (
+            (_next_token.type in {1, 3} or _next_token.string == '(')
+            and
             (atom := self.atom())
             and
-            (literal := self.expect('?'))
+            (literal := self.expect_string('?'))
         ):
             return Opt ( atom )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string == '(')
+            and
             (atom := self.atom())
             and
-            (literal := self.expect('*'))
+            (literal := self.expect_string('*'))
         ):
             return Repeat0 ( atom )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string == '(')
+            and
             (atom := self.atom())
             and
-            (literal := self.expect('+'))
+            (literal := self.expect_string('+'))
         ):
             return Repeat1 ( atom )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string == '(')
+            and
             (sep := self.atom())
             and
-            (literal := self.expect('.'))
+            (literal := self.expect_string('.'))
             and
             (node := self.atom())
             and
-            (literal_1 := self.expect('+'))
+            (literal_1 := self.expect_string('+'))
         ):
             return Gather ( sep , node )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 3} or _next_token.string == '(')
+            and
             (atom := self.atom())
         ):
             return atom
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(15)
     def atom(self) -> Optional[Plain]:
         # atom: '(' ~ alts ')' | NAME | STRING
-        mark = self.mark()
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         cut = False
         if (
-            (literal := self.expect('('))
+            _next_token.string == '('
+            and
+            (literal := self.expect_string('('))
             and
-            (cut := True)
+            (cut := self.cut())
             and
             (alts := self.alts())
             and
-            (literal_1 := self.expect(')'))
+            (literal_1 := self.expect_string(')'))
         ):
             return Group ( alts )
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
-        cut = False
         if (
+            _next_token.type == 1
+            and
             (name := self.name())
         ):
             return NameLeaf ( name . string )
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 3
+            and
             (string := self.string())
         ):
             return StringLeaf ( string . string )
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(16)
     def action(self) -> Optional[str]:
         # action: "{" ~ target_atoms "}"
-        mark = self.mark()
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
         cut = False
         if (
-            (literal := self.expect("{"))
+            (literal := self.expect_string("{"))
             and
-            (cut := True)
+            (cut := self.cut())
             and
             (target_atoms := self.target_atoms())
             and
-            (literal_1 := self.expect("}"))
+            (literal_1 := self.expect_string("}"))
         ):
             return target_atoms
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
         return None
 
-    @memoize
+    @memoize_rule(17)
     def target_atoms(self) -> Optional[str]:
         # target_atoms: target_atom target_atoms | target_atom
-        mark = self.mark()
-        cut = False
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         if (
+            (_next_token.type in {1, 2, 3, 54} or _next_token.string == "?")
+            and
             (target_atom := self.target_atom())
             and
             (target_atoms := self.target_atoms())
         ):
             return target_atom + " " + target_atoms
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            (_next_token.type in {1, 2, 3, 54} or _next_token.string == "?")
+            and
             (target_atom := self.target_atom())
         ):
             return target_atom
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
-    @memoize
+    @memoize_rule(18)
     def target_atom(self) -> Optional[str]:
         # target_atom: "{" ~ target_atoms "}" | NAME | NUMBER | STRING | "?" | ":" | !"}" OP
-        mark = self.mark()
+        _tokenizer = self._tokenizer
+        _mark = _tokenizer._index
+        _next_token = _tokenizer.peek()
         cut = False
         if (
-            (literal := self.expect("{"))
+            _next_token.string == "{"
             and
-            (cut := True)
+            (literal := self.expect_string("{"))
+            and
+            (cut := self.cut())
             and
             (target_atoms := self.target_atoms())
             and
-            (literal_1 := self.expect("}"))
+            (literal_1 := self.expect_string("}"))
         ):
             return "{" + target_atoms + "}"
-        self.reset(mark)
+        if _tokenizer._index != _mark: self.reset(_mark)
         if cut: return None
-        cut = False
         if (
+            _next_token.type == 1
+            and
             (name := self.name())
         ):
             return name . string
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 2
+            and
             (number := self.number())
         ):
             return number . string
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
+            _next_token.type == 3
+            and
             (string := self.string())
         ):
             return string . string
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
-            (literal := self.expect("?"))
+            _next_token.string == "?"
+            and
+            (literal := self.expect_string("?"))
         ):
             return "?"
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
-            (literal := self.expect(":"))
+            _next_token.string == ":"
+            and
+            (literal := self.expect_string(":"))
         ):
             return ":"
-        self.reset(mark)
-        if cut: return None
-        cut = False
+        if _tokenizer._index != _mark: self.reset(_mark)
         if (
-            self.negative_lookahead(self.expect, "}")
+            _next_token.type == 54
+            and
+            self.negative_lookahead(self.expect_string, "}")
             and
             (op := self.op())
         ):
             return op . string
-        self.reset(mark)
-        if cut: return None
+        if _tokenizer._index != _mark: self.reset(_mark)
         return None
 
 
@@ -0,0 +1,192 @@
+"""Tokenize with a lexer generated from a grammar (see pegen.lexer_generator).
+
+Such a lexer knows only the tokens its grammar uses, and finds them all
+with one regular expression, instead of going through Python's tokenize.
+"""
+
+import functools
+import re
+import token
+import tokenize
+from tokenize import TokenInfo
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+# The kinds of Lexer groups that do not make tokens of their own.
+SKIP = -1  # Blanks, comments and line continuations
+LINEBREAK = -2  # Ends a NEWLINE token, if the grammar has them
+
+_new_token = functools.partial(tuple.__new__, TokenInfo)
+
+_BRACKETS = {"(": 1, "[": 1, "{": 1, ")": -1, "]": -1, "}": -1}
+
+
+def _uncapture(pattern: str) -> str:
+    return re.sub(r"(?<!\\)\((?!\?)", "(?:", pattern)
+
+
+# The token classes of Python, as in tokenize, but without capturing groups.
+# Strings can span lines, in triple quotes or after a backslash.
+NAME_PATTERN = r"[^\W\d]\w*"
+NUMBER_PATTERN = _uncapture(tokenize.Number)
+STRING_PATTERN = _uncapture(
+    tokenize.group(
+        tokenize.StringPrefix + "'''" + tokenize.Single3,
+        tokenize.StringPrefix + '"""' + tokenize.Double3,
+        tokenize.StringPrefix + r"'[^\n'\\]*(?:\\.[^\n'\\]*)*'",
+        tokenize.StringPrefix + r'"[^\n"\\]*(?:\\.[^\n"\\]*)*"',
+    )
+)
+
+
+def _indentation(prefix: str) -> int:
+    # The column of the first token after *prefix*, as tokenize counts it.
+    column = 0
+    for char in prefix:
+        if char == "\t":
+            column = (column // tokenize.tabsize + 1) * tokenize.tabsize
+        elif char == "\f":
+            column = 0
+        else:
+            column += 1
+    return column
+
+
+class Lexer:
+    """A tokenizer made from one regular expression.
+
+    *groups* are (pattern, kind) pairs, tried in order: the tokens of a
+    kind (a token type, SKIP or LINEBREAK) are what its pattern matches.
+    The patterns must not have capturing groups of their own, and
+    between them must match every character.
+
+    The tokens are those tokenize would make for a parser: there are no
+    NL or COMMENT tokens, and NEWLINE tokens only if *newlines* is set,
+    which also stops lines from ending in parentheses, brackets and
+    braces.  INDENT and DEDENT tokens are only made if *indents* is set.
+    """
+
+    def __init__(
+        self, groups: Sequence[Tuple[str, int]], *, newlines: bool = False, indents: bool = False,
+    ):
+        pattern = "|".join(f"({pattern})" for pattern, _ in groups)
+        self._finditer = re.compile(pattern, re.DOTALL).finditer
+        # Indexed by Match.lastindex, which counts from 1.
+        self._kinds = (0,) + tuple(kind for _, kind in groups)
+        self._newlines = newlines
+        self._indents = indents
+
+    def generate_tokens(self, readline: Callable[[], str]) -> Iterator[TokenInfo]:
+        """Tokenize the lines *readline* returns, like tokenize.generate_tokens()."""
+        return self.tokenize("".join(iter(readline, "")))
+
+    def tokenize(self, source: str) -> Iterator[TokenInfo]:
+        """Tokenize the whole of *source*."""
+        kinds = self._kinds
+        newlines = self._newlines
+        indents: List[int] = [0] if self._indents else []
+        new_token = _new_token
+        lineno = 1
+        line_start = 0
+        line_for = -1  # Where the line in line starts
+        line = ""
+        depth = 0  # Of brackets
+        at_bol = True  # No token on this line yet
+        for match in self._finditer(source):
+            kind = kinds[match.lastindex]  # type: ignore
+            if kind == SKIP:
+                if match.group()[0] == "\\":  # A line continuation
+                    lineno += 1
+                    line_start = match.end()
+                continue
+            start = match.start()
+            if kind == LINEBREAK:
+                if newlines and not at_bol and not depth:
+                    col = start - line_start
+                    if line_for != line_start:
+                        line = source[line_start : match.end()]
+                        line_for = line_start
+                    yield new_token(
+                        (token.NEWLINE, match.group(), (lineno, col), (lineno, col + 1), line)
+                    )
+                    at_bol = True
+                lineno += 1
+                line_start = match.end()
+                continue
+
+            if line_for != line_start:
+                end = source.find("\n", line_start)
+                line = source[line_start : end + 1] if end >= 0 else source[line_start:]
+                line_for = line_start
+            col = start - line_start
+            if at_bol:
+                at_bol = False
+                if indents and not depth:
+                    prefix = source[line_start:start]
+                    if len(prefix) != indents[-1] or "\t" in prefix or "\f" in prefix:
+                        yield from self._indent(indents, prefix, lineno, line)
+            string = match.group()
+            if kind == token.OP and string in _BRACKETS and newlines:
+                depth = max(0, depth + _BRACKETS[string])
+            elif kind == token.STRING and "\n" in string:
+                first_lineno = lineno
+                lineno += string.count("\n")
+                line_start = start + string.rindex("\n") + 1
+                end = source.find("\n", line_start)
+                line = source[start - col : end + 1] if end >= 0 else source[start - col :]
+                yield new_token(
+                    (kind, string, (first_lineno, col), (lineno, match.end() - line_start), line)
+                )
+                continue
+            yield new_token((kind, string, (lineno, col), (lineno, col + len(string)), line))
+
+        if not at_bol and newlines:
+            col = len(source) - line_start
+            yield new_token((token.NEWLINE, "", (lineno, col), (lineno, col + 1), ""))
+        if line_start < len(source):
+            lineno += 1
+        for _ in indents[1:]:
+            yield new_token((token.DEDENT, "", (lineno, 0), (lineno, 0), ""))
+        yield new_token((token.ENDMARKER, "", (lineno, 0), (lineno, 0), ""))
+
+    @staticmethod
+    def _indent(indents: List[int], prefix: str, lineno: int, line: str) -> Iterator[TokenInfo]:
+        column = _indentation(prefix)
+        if column > indents[-1]:
+            indents.append(column)
+            yield _new_token((token.INDENT, prefix, (lineno, 0), (lineno, len(prefix)), line))
+            return
+        while column < indents[-1]:
+            indents.pop()
+            if column > indents[-1]:
+                raise IndentationError(
+                    "unindent does not match any outer indentation level",
+                    ("<tokenize>", lineno, len(prefix), line),
+                )
+            pos = (lineno, len(prefix))
+            yield _new_token((token.DEDENT, "", pos, pos, line))
+
+
+def token_groups(literals: Sequence[str], token_types: Sequence[int]) -> List[Tuple[str, int]]:
+    """The groups of a Lexer for these literals and token types.
+
+    Literals that look like names (keywords) are left to the NAME group,
+    which is there if there are any.  The other literals are OP tokens,
+    and the longest one that matches wins.
+    """
+    operators = sorted(
+        (literal for literal in literals if not literal.isidentifier()), key=len, reverse=True
+    )
+    skip = r"[ \t\f]+|\\\r?\n"
+    if "#" not in operators:
+        skip += r"|#[^\r\n]*"
+    groups = [(r"\r?\n", LINEBREAK), (skip, SKIP)]
+    if token.STRING in token_types:
+        groups.append((STRING_PATTERN, token.STRING))
+    if token.NUMBER in token_types:
+        groups.append((NUMBER_PATTERN, token.NUMBER))
+    if token.NAME in token_types or len(operators) < len(literals):
+        groups.append((NAME_PATTERN, token.NAME))
+    if operators:
+        groups.append(("|".join(map(re.escape, operators)), token.OP))
+    groups.append((".", token.ERRORTOKEN))
+    return groups
@@ -0,0 +1,156 @@
+"""Generate lexers for the tokens a grammar uses (see pegen.lexer).
+
+A Python lexer is a pegen.lexer.Lexer, with one regular expression for
+all the grammar's tokens.  A C lexer is a LexerSpec for run_lexer() in
+pegen.c, which scans the token classes itself and the literals with a
+generated match_literal() function.
+"""
+
+import ast
+import io
+import token
+
+from typing import Dict, IO, List, Set, Text
+
+from pegen import lexer
+from pegen.grammar import Grammar, GrammarVisitor, NameLeaf, StringLeaf
+from pegen.tokenizer import exact_token_types
+
+# The token classes a lexer can make.  ENDMARKER tokens are always made, and
+# ASYNC and AWAIT tokens only by C lexers (tokenize makes them names).
+TOKEN_CLASSES = ("NAME", "NUMBER", "STRING", "NEWLINE", "INDENT", "DEDENT", "ASYNC", "AWAIT")
+
+# The names generated Python lexers use for the patterns in pegen.lexer.
+PATTERN_NAMES = {
+    lexer.NAME_PATTERN: "NAME_PATTERN",
+    lexer.NUMBER_PATTERN: "NUMBER_PATTERN",
+    lexer.STRING_PATTERN: "STRING_PATTERN",
+}
+
+PYTHON_LEXER_PREFIX = """\
+# @generated by pegen from {filename}
+
+"""
+
+
+class TokenCollectingVisitor(GrammarVisitor):
+    """Collect the literals and token classes a grammar uses."""
+
+    def __init__(self) -> None:
+        self.literals: Set[str] = set()
+        self.token_types: Set[int] = set()
+
+    def visit_NameLeaf(self, node: NameLeaf) -> None:
+        if node.value in TOKEN_CLASSES:
+            self.token_types.add(getattr(token, node.value))
+
+    def visit_StringLeaf(self, node: StringLeaf) -> None:
+        self.literals.add(ast.literal_eval(node.value))
+
+
+def collect_tokens(grammar: Grammar) -> TokenCollectingVisitor:
+    visitor = TokenCollectingVisitor()
+    for rule in grammar.rules.values():
+        visitor.visit(rule)
+    return visitor
+
+
+def python_lexer(grammar: Grammar) -> str:
+    """The source of a Python lexer for *grammar*.
+
+    It defines a Lexer called lexer, and generate_tokens(), its method of
+    the same name.
+    """
+    tokens = collect_tokens(grammar)
+    types = tokens.token_types
+    groups = lexer.token_groups(sorted(tokens.literals), sorted(types))
+    out = io.StringIO()
+    print("import token", file=out)
+    print(file=out)
+    print("from pegen.lexer import Lexer, LINEBREAK, SKIP", file=out)
+    names = [PATTERN_NAMES[pattern] for pattern, _ in groups if pattern in PATTERN_NAMES]
+    if names:
+        print(f"from pegen.lexer import {', '.join(names)}", file=out)
+    print(file=out)
+    print("lexer = Lexer(", file=out)
+    print("    [", file=out)
+    for pattern, kind in groups:
+        kind_name = {lexer.SKIP: "SKIP", lexer.LINEBREAK: "LINEBREAK"}.get(kind)
+        print(
+            f"        ({PATTERN_NAMES.get(pattern, repr(pattern))}, "
+            f"{kind_name or 'token.' + token.tok_name[kind]}),",
+            file=out,
+        )
+    print("    ],", file=out)
+    print(f"    newlines={token.NEWLINE in types},", file=out)
+    print(f"    indents={token.INDENT in types or token.DEDENT in types},", file=out)
+    print(")", file=out)
+    print("generate_tokens = lexer.generate_tokens", file=out)
+    return out.getvalue()
+
+
+def generate_python_lexer(grammar: Grammar, file: IO[Text], filename: str) -> None:
+    """Write a Python module with the lexer for *grammar* to *file*."""
+    file.write(PYTHON_LEXER_PREFIX.format(filename=filename))
+    file.write(python_lexer(grammar))
+
+
+def c_lexer(grammar: Grammar) -> str:
+    """The C source of the lexer for *grammar*: a LexerSpec called lexer.
+
+    Literals that look like names are left to keyword_token(); the others
+    must be tokens of Python.
+    """
+    tokens = collect_tokens(grammar)
+    operators: Dict[str, int] = {}
+    for literal in tokens.literals:
+        if not literal.isidentifier():
+            assert literal in exact_token_types, f"{literal!r} is not a known literal"
+            operators[literal] = exact_token_types[literal]
+    types = tokens.token_types
+    flags = []
+    if types & {token.NAME, token.ASYNC, token.AWAIT} or len(operators) < len(tokens.literals):
+        flags.append("LEX_NAMES")
+    if token.NUMBER in types:
+        flags.append("LEX_NUMBERS")
+    if token.STRING in types:
+        flags.append("LEX_STRINGS")
+    if token.NEWLINE in types:
+        flags.append("LEX_NEWLINES")
+    if token.INDENT in types or token.DEDENT in types:
+        flags.append("LEX_INDENTS")
+    if token.ASYNC in types or token.AWAIT in types:
+        flags.append("LEX_ASYNC")
+    lines = ["static int", "match_literal(const char *c, int *type)", "{"]
+    _match_literal(operators, "", lines, 1)
+    lines.append("    return 0;")
+    lines.append("}")
+    lines.append("")
+    lines.append("static const LexerSpec lexer = {")
+    lines.append(f"    {' | '.join(flags) or '0'},")
+    lines.append("    match_literal,")
+    lines.append("};")
+    return "\n".join(lines) + "\n"
+
+
+def _match_literal(operators: Dict[str, int], prefix: str, lines: List[str], level: int) -> None:
+    # A switch on the next character for the operators that start with
+    # prefix, then the token for prefix itself, if it is one.
+    indent = "    " * level
+    depth = len(prefix)
+    chars = sorted({op[depth] for op in operators if op.startswith(prefix) and len(op) > depth})
+    if chars:
+        lines.append(f"{indent}switch (c[{depth}]) {{")
+        for char in chars:
+            lines.append(f"{indent}    case {_c_char(char)}:")
+            _match_literal(operators, prefix + char, lines, level + 2)
+        lines.append(f"{indent}}}")
+    if prefix in operators:
+        lines.append(f"{indent}*type = {token.tok_name[operators[prefix]]};  // {prefix}")
+        lines.append(f"{indent}return {depth};")
+    elif prefix:
+        lines.append(f"{indent}break;")
+
+
+def _c_char(char: str) -> str:
+    return "'\\''" if char == "'" else "'\\\\'" if char == "\\" else f"'{char}'"
@@ -0,0 +1,56 @@
+"""Base classes for the nodes of parse trees made by generated parsers.
+
+A Python parser generated with nodes="slots" or nodes="tuple" (--nodes on
+the command line) has a node class for each alternative that has no action
+and matches more than one item, and returns an instance of it instead of a
+list of the values.  The class is named after the rule, as rule_node, or
+rule_node2 for the second alternative of a rule that has several.  Its
+fields are the values, named as they would be in an action, and every node
+also has the token span it matched: start and end are tokenizer positions
+(see Parser.mark()), end being the first token after the node.
+"""
+
+import operator
+
+from typing import Any, Tuple
+
+
+class Node:
+    """Base class of node classes with a slot for each field."""
+
+    __slots__ = ("start", "end")
+
+    # The names of the fields, in order.
+    _fields: Tuple[str, ...] = ()
+
+    start: int
+    end: int
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class TupleNode(Tuple[Any, ...]):
+    """Base class of node classes that are tuples: the fields, then the span.
+
+    These are quicker to make than Node subclasses, since they have no
+    __init__() to call, but take a little more memory; like other tuples
+    they are immutable, and compare and unpack by value.
+    """
+
+    __slots__ = ()
+
+    _fields: Tuple[str, ...] = ()
+
+    start = property(operator.itemgetter(-2))
+    end = property(operator.itemgetter(-1))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self._fields, self))
+        return f"{type(self).__name__}({fields})"
+
+
+def field(index: int) -> Any:
+    """Return a property for the field at *index* of a TupleNode."""
+    return property(operator.itemgetter(index))
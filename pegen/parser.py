@@ -1,4 +1,5 @@
 import argparse
+import io
 import sys
 import time
 import token
@@ -6,10 +7,29 @@ import tokenize
 import traceback
 
 from abc import abstractmethod
-from typing import Any, Callable, cast, Dict, Optional, Tuple, Type, TypeVar
+from inspect import unwrap
+from typing import (
+    Any,
+    Callable,
+    cast,
+    ClassVar,
+    Dict,
+    FrozenSet,
+    IO,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from pegen.tokenizer import exact_token_types
+from pegen.tokenizer import EVICTED_MEMO
+from pegen.tokenizer import IncrementalTokenizer
 from pegen.tokenizer import Mark
+from pegen.tokenizer import TextEdit
 from pegen.tokenizer import Tokenizer
 
 T = TypeVar("T")
@@ -20,20 +40,30 @@ F = TypeVar("F", bound=Callable[..., Any])
 def logger(method: F) -> F:
     """For non-memoized functions that we want to be logged.
 
-    (In practice this is only non-leader left-recursive functions.)
+    (In practice these are the token matchers, non-leader left-recursive
+    functions and rules that are not memoized.)
     """
     method_name = method.__name__
 
     def logger_wrapper(self: P, *args: object) -> T:
-        if not self._verbose:
+        if not self._logging:
             return method(self, *args)
+        verbose = self._verbose
+        profile = self._profile
         argsr = ",".join(repr(arg) for arg in args)
         fill = "  " * self._level
-        print(f"{fill}{method_name}({argsr}) .... (looking at {self.showpeek()})")
+        if verbose:
+            print(f"{fill}{method_name}({argsr}) .... (looking at {self.showpeek()})")
+        if profile is not None:
+            profile.enter(f"{method_name}({argsr})" if args else method_name)
+        mark = self.mark()
         self._level += 1
         tree = method(self, *args)
         self._level -= 1
-        print(f"{fill}... {method_name}({argsr}) --> {tree!s:.200}")
+        if profile is not None:
+            profile.leave(tree, self.mark() - mark, memoized=False)
+        if verbose:
+            print(f"{fill}... {method_name}({argsr}) --> {tree!s:.200}")
         return tree
 
     logger_wrapper.__wrapped__ = method  # type: ignore
@@ -47,27 +77,45 @@ def memoize(method: F) -> F:
     def memoize_wrapper(self: P, *args: object) -> T:
         mark = self.mark()
         key = mark, method_name, args
-        # Fast path: cache hit, and not verbose.
-        if key in self._cache and not self._verbose:
+        # Fast path: cache hit, and not verbose or profiling.
+        if key in self._cache and not self._tracing:
             tree, endmark = self._cache[key]
             self.reset(endmark)
             return tree
-        # Slow path: no cache hit, or verbose.
+        # Slow path: no cache hit, or verbose, profiling or incremental.
+        tokenizer = self._tokenizer
+        reaches = tokenizer._reaches
         verbose = self._verbose
+        profile = self._profile
         argsr = ",".join(repr(arg) for arg in args)
         fill = "  " * self._level
         if key not in self._cache:
             if verbose:
                 print(f"{fill}{method_name}({argsr}) ... (looking at {self.showpeek()})")
+            if profile is not None:
+                profile.enter(f"{method_name}({argsr})" if args else method_name)
+            if reaches is not None:
+                outer_reach, tokenizer._reach = tokenizer._reach, mark
             self._level += 1
             tree = method(self, *args)
             self._level -= 1
+            endmark = self.mark()
+            if reaches is not None:
+                reaches[key] = tokenizer._reach
+                tokenizer._reach = max(outer_reach, tokenizer._reach)
+            if profile is not None:
+                profile.leave(tree, endmark - mark, memoized=True)
             if verbose:
                 print(f"{fill}... {method_name}({argsr}) -> {tree!s:.200}")
-            endmark = self.mark()
             self._cache[key] = tree, endmark
         else:
             tree, endmark = self._cache[key]
+            if reaches is not None:
+                tokenizer._reach = max(tokenizer._reach, reaches.get(key, endmark))
+            if profile is not None:
+                profile.hit(
+                    f"{method_name}({argsr})" if args else method_name, tree, endmark - mark
+                )
             if verbose:
                 print(f"{fill}{method_name}({argsr}) -> {tree!s:.200}")
             self.reset(endmark)
@@ -84,17 +132,24 @@ def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Option
     def memoize_left_rec_wrapper(self: P) -> Optional[T]:
         mark = self.mark()
         key = mark, method_name, ()
-        # Fast path: cache hit, and not verbose.
-        if key in self._cache and not self._verbose:
+        # Fast path: cache hit, and not verbose or profiling.
+        if key in self._cache and not self._tracing:
             tree, endmark = self._cache[key]
             self.reset(endmark)
             return tree
-        # Slow path: no cache hit, or verbose.
+        # Slow path: no cache hit, or verbose, profiling or incremental.
+        tokenizer = self._tokenizer
+        reaches = tokenizer._reaches
         verbose = self._verbose
+        profile = self._profile
         fill = "  " * self._level
         if key not in self._cache:
             if verbose:
                 print(f"{fill}{method_name} ... (looking at {self.showpeek()})")
+            if profile is not None:
+                profile.enter(method_name)
+            if reaches is not None:
+                outer_reach, tokenizer._reach = tokenizer._reach, mark
             self._level += 1
 
             # For left-recursive rules we manipulate the cache and
@@ -142,9 +197,18 @@ def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Option
             else:
                 endmark = mark
                 self.reset(endmark)
+            if profile is not None:
+                profile.leave(tree, endmark - mark, memoized=True)
+            if reaches is not None:
+                reaches[key] = tokenizer._reach
+                tokenizer._reach = max(outer_reach, tokenizer._reach)
             self._cache[key] = tree, endmark
         else:
             tree, endmark = self._cache[key]
+            if reaches is not None:
+                tokenizer._reach = max(tokenizer._reach, reaches.get(key, endmark))
+            if profile is not None:
+                profile.hit(method_name, tree, endmark - mark)
             if verbose:
                 print(f"{fill}{method_name}() -> {tree!s:.200} [fresh]")
             if tree:
@@ -155,12 +219,371 @@ def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Option
     return memoize_left_rec_wrapper
 
 
+def memoize_rule(
+    rule_id: int,
+) -> Callable[[Callable[[P], Optional[T]]], Callable[[P], Optional[T]]]:
+    """Memoize a symbol method in the tokenizer's per-position memo table.
+
+    This is what generated parsers use by default instead of @memoize.
+    The generator gives each rule a dense integer id, and the result is
+    stored under that id in the memo slot of the starting position, so
+    no key tuple has to be built on each call.
+    """
+
+    def decorator(method: Callable[[P], Optional[T]]) -> Callable[[P], Optional[T]]:
+        method_name = method.__name__
+
+        def memoize_rule_wrapper(self: P) -> Optional[T]:
+            tokenizer = self._tokenizer
+            mark = tokenizer._index
+            memo = tokenizer._memo[mark]
+            # Fast path: not verbose or profiling.
+            if not self._tracing:
+                if rule_id in memo:
+                    tree, endmark = memo[rule_id]
+                    self.reset(endmark)
+                    return tree
+                tree = method(self)
+                memo[rule_id] = tree, tokenizer._index
+                return tree
+            # Slow path: verbose, profiling or incremental.
+            reaches = tokenizer._reaches
+            verbose = self._verbose
+            profile = self._profile
+            fill = "  " * self._level
+            if rule_id not in memo:
+                if verbose:
+                    print(f"{fill}{method_name}() ... (looking at {self.showpeek()})")
+                if profile is not None:
+                    profile.enter(method_name)
+                if reaches is not None:
+                    outer_reach, tokenizer._reach = tokenizer._reach, mark
+                self._level += 1
+                tree = method(self)
+                self._level -= 1
+                endmark = tokenizer._index
+                if reaches is not None:
+                    reaches[mark, rule_id] = tokenizer._reach
+                    tokenizer._reach = max(outer_reach, tokenizer._reach)
+                if profile is not None:
+                    profile.leave(tree, endmark - mark, memoized=True)
+                if verbose:
+                    print(f"{fill}... {method_name}() -> {tree!s:.200}")
+                memo[rule_id] = tree, endmark
+            else:
+                tree, endmark = memo[rule_id]
+                if reaches is not None:
+                    tokenizer._reach = max(tokenizer._reach, reaches.get((mark, rule_id), endmark))
+                if profile is not None:
+                    profile.hit(method_name, tree, endmark - mark)
+                if verbose:
+                    print(f"{fill}{method_name}() -> {tree!s:.200}")
+                self.reset(endmark)
+            return tree
+
+        memoize_rule_wrapper.__wrapped__ = method  # type: ignore
+        return memoize_rule_wrapper
+
+    return decorator
+
+
+def memoize_left_rec_rule(
+    rule_id: int,
+) -> Callable[[Callable[[P], Optional[T]]], Callable[[P], Optional[T]]]:
+    """Memoize a left-recursive symbol method in the per-position memo table.
+
+    See memoize_left_rec() for the algorithm and memoize_rule() for the
+    memo table.
+    """
+
+    def decorator(method: Callable[[P], Optional[T]]) -> Callable[[P], Optional[T]]:
+        method_name = method.__name__
+
+        def memoize_left_rec_rule_wrapper(self: P) -> Optional[T]:
+            tokenizer = self._tokenizer
+            mark = tokenizer._index
+            memo = tokenizer._memo[mark]
+            if memo is EVICTED_MEMO:
+                # Backtracked behind a commit point; growing the seed here
+                # would recurse forever since the memo slot drops writes.
+                return None
+            # Fast path: cache hit, and not verbose or profiling.
+            if rule_id in memo and not self._tracing:
+                tree, endmark = memo[rule_id]
+                self.reset(endmark)
+                return tree
+            # Slow path: no cache hit, or verbose, profiling or incremental.
+            reaches = tokenizer._reaches
+            verbose = self._verbose
+            profile = self._profile
+            fill = "  " * self._level
+            if rule_id not in memo:
+                if verbose:
+                    print(f"{fill}{method_name} ... (looking at {self.showpeek()})")
+                if profile is not None:
+                    profile.enter(method_name)
+                if reaches is not None:
+                    outer_reach, tokenizer._reach = tokenizer._reach, mark
+                self._level += 1
+
+                # Prime the cache with a failure and grow the seed.
+                memo[rule_id] = None, mark
+                lastresult, lastmark = None, mark
+                depth = 0
+                if verbose:
+                    print(f"{fill}Recursive {method_name} at {mark} depth {depth}")
+
+                while True:
+                    self.reset(mark)
+                    result = method(self)
+                    endmark = tokenizer._index
+                    depth += 1
+                    if verbose:
+                        print(
+                            f"{fill}Recursive {method_name} at {mark} depth {depth}: {result!s:.200} to {endmark}"
+                        )
+                    if not result:
+                        if verbose:
+                            print(f"{fill}Fail with {lastresult!s:.200} to {lastmark}")
+                        break
+                    if endmark <= lastmark:
+                        if verbose:
+                            print(f"{fill}Bailing with {lastresult!s:.200} to {lastmark}")
+                        break
+                    memo[rule_id] = lastresult, lastmark = result, endmark
+
+                self.reset(lastmark)
+                tree = lastresult
+
+                self._level -= 1
+                if verbose:
+                    print(f"{fill}{method_name}() -> {tree!s:.200} [cached]")
+                if tree:
+                    endmark = tokenizer._index
+                else:
+                    endmark = mark
+                    self.reset(endmark)
+                if profile is not None:
+                    profile.leave(tree, endmark - mark, memoized=True)
+                if reaches is not None:
+                    reaches[mark, rule_id] = tokenizer._reach
+                    tokenizer._reach = max(outer_reach, tokenizer._reach)
+                memo[rule_id] = tree, endmark
+            else:
+                tree, endmark = memo[rule_id]
+                if reaches is not None:
+                    tokenizer._reach = max(tokenizer._reach, reaches.get((mark, rule_id), endmark))
+                if profile is not None:
+                    profile.hit(method_name, tree, endmark - mark)
+                if verbose:
+                    print(f"{fill}{method_name}() -> {tree!s:.200} [fresh]")
+                if tree:
+                    self.reset(endmark)
+            return tree
+
+        memoize_left_rec_rule_wrapper.__wrapped__ = method  # type: ignore
+        return memoize_left_rec_rule_wrapper
+
+    return decorator
+
+
+def untraced_memoize_rule(
+    rule_id: int,
+) -> Callable[[Callable[[P], Optional[T]]], Callable[[P], Optional[T]]]:
+    """Like memoize_rule(), for untraced parsers.
+
+    There are no verbose checks, and the tokenizer's position is set
+    directly, so neither the parser nor the tokenizer is ever traced.
+    """
+
+    def decorator(method: Callable[[P], Optional[T]]) -> Callable[[P], Optional[T]]:
+        def untraced_memoize_rule_wrapper(self: P) -> Optional[T]:
+            tokenizer = self._tokenizer
+            memo = tokenizer._memo[tokenizer._index]
+            if rule_id in memo:
+                tree, tokenizer._index = memo[rule_id]
+                return tree
+            tree = method(self)
+            memo[rule_id] = tree, tokenizer._index
+            return tree
+
+        untraced_memoize_rule_wrapper.__wrapped__ = method  # type: ignore
+        return untraced_memoize_rule_wrapper
+
+    return decorator
+
+
+def untraced_memoize_left_rec_rule(
+    rule_id: int,
+) -> Callable[[Callable[[P], Optional[T]]], Callable[[P], Optional[T]]]:
+    """Like memoize_left_rec_rule(), for untraced parsers."""
+
+    def decorator(method: Callable[[P], Optional[T]]) -> Callable[[P], Optional[T]]:
+        def untraced_memoize_left_rec_rule_wrapper(self: P) -> Optional[T]:
+            tokenizer = self._tokenizer
+            mark = tokenizer._index
+            memo = tokenizer._memo[mark]
+            if rule_id in memo:
+                tree, tokenizer._index = memo[rule_id]
+                return tree
+            if memo is EVICTED_MEMO:
+                return None
+
+            # Prime the cache with a failure and grow the seed.
+            memo[rule_id] = lastresult, lastmark = None, mark
+            while True:
+                tokenizer._index = mark
+                result = method(self)
+                endmark = tokenizer._index
+                if not result or endmark <= lastmark:
+                    break
+                memo[rule_id] = lastresult, lastmark = result, endmark
+
+            tokenizer._index = lastmark
+            memo[rule_id] = lastresult, lastmark
+            return lastresult
+
+        untraced_memoize_left_rec_rule_wrapper.__wrapped__ = method  # type: ignore
+        return untraced_memoize_left_rec_rule_wrapper
+
+    return decorator
+
+
+def sync_rule(method: Callable[[P], Optional[T]]) -> Callable[[P], Optional[T]]:
+    """For rules declared with the @sync meta.
+
+    When the parser evicts (see Parser.commit()), every successful
+    match of such a rule is a commit point.
+    """
+
+    def sync_rule_wrapper(self: P) -> Optional[T]:
+        tree = method(self)
+        if tree is not None and self._evict:
+            self.commit()
+        return tree
+
+    sync_rule_wrapper.__wrapped__ = method  # type: ignore
+    return sync_rule_wrapper
+
+
+class RuleStats:
+    """Counters for one rule (or token matcher) of a profiled parser."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.successes = 0
+        self.failures = 0
+        self.tokens = 0  # Consumed by successful calls, memo hits included
+        self.cumulative_time = 0.0
+        self.self_time = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"RuleStats({self.name!r}, calls={self.calls}, memo_hits={self.memo_hits}, "
+            f"memo_misses={self.memo_misses}, successes={self.successes}, "
+            f"failures={self.failures}, tokens={self.tokens})"
+        )
+
+
+class ParserProfile:
+    """Per-rule counters collected by a parser created with profile=True.
+
+    Memo hits are not timed.  Cumulative time counts only the outermost
+    active call of a recursive rule, as in cProfile.
+    """
+
+    def __init__(self) -> None:
+        self.rules: Dict[str, RuleStats] = {}
+        # One [stats, start time, time spent in callees] per active call.
+        self._stack: List[List[Any]] = []
+        self._active: Dict[str, int] = {}
+
+    def __getitem__(self, name: str) -> RuleStats:
+        return self.rules[name]
+
+    def _stats(self, name: str) -> RuleStats:
+        stats = self.rules.get(name)
+        if stats is None:
+            stats = self.rules[name] = RuleStats(name)
+        return stats
+
+    def _count(self, stats: RuleStats, tree: object, tokens: int) -> None:
+        stats.calls += 1
+        if tree is None:
+            stats.failures += 1
+        else:
+            stats.successes += 1
+            stats.tokens += tokens
+
+    def hit(self, name: str, tree: object, tokens: int) -> None:
+        stats = self._stats(name)
+        stats.memo_hits += 1
+        self._count(stats, tree, tokens)
+
+    def enter(self, name: str) -> None:
+        self._active[name] = self._active.get(name, 0) + 1
+        self._stack.append([self._stats(name), time.perf_counter(), 0.0])
+
+    def leave(self, tree: object, tokens: int, memoized: bool) -> None:
+        stats, start, callees = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        stats.self_time += elapsed - callees
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        self._active[stats.name] -= 1
+        if not self._active[stats.name]:
+            stats.cumulative_time += elapsed
+        if memoized:
+            stats.memo_misses += 1
+        self._count(stats, tree, tokens)
+
+    def report(self, file: Optional[IO[str]] = None, limit: Optional[int] = None) -> None:
+        """Print the counters, rules with the most self time first."""
+        print(
+            f"{'rule':>24} {'calls':>8} {'hits':>8} {'misses':>8} {'ok':>8} {'fail':>8}"
+            f" {'tokens':>8} {'cumtime':>8} {'selftime':>8}",
+            file=file,
+        )
+        rules = sorted(self.rules.values(), key=lambda stats: stats.self_time, reverse=True)
+        for stats in rules[:limit]:
+            print(
+                f"{stats.name:>24.24} {stats.calls:8} {stats.memo_hits:8} {stats.memo_misses:8}"
+                f" {stats.successes:8} {stats.failures:8} {stats.tokens:8}"
+                f" {stats.cumulative_time:8.3f} {stats.self_time:8.3f}",
+                file=file,
+            )
+
+
 class Parser:
     """Parsing base class."""
 
-    def __init__(self, tokenizer: Tokenizer, *, verbose: bool = False):
+    # The rule parse_iter() matches repeatedly; see the @stream meta.
+    _stream_rule: ClassVar[str] = "start"
+    # The grammar's keywords, and those that name() doesn't match; see the
+    # @keywords meta.
+    KEYWORDS: ClassVar[FrozenSet[str]] = frozenset()
+    _reserved: ClassVar[FrozenSet[str]] = frozenset()
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        *,
+        verbose: bool = False,
+        evict: bool = False,
+        profile: bool = False,
+    ):
         self._tokenizer = tokenizer
         self._verbose = verbose
+        self._profile = ParserProfile() if profile else None
+        # Whether the logger must leave its fast path.
+        self._logging = verbose or profile
+        # Whether the memo decorators must, which they also do to record
+        # how far each call looked for an IncrementalTokenizer.
+        self._tracing = self._logging or tokenizer._reaches is not None
+        self._evict = evict
         self._level = 0
         self._cache: Dict[Tuple[Mark, str, Tuple[Any, ...]], Tuple[Any, Mark]] = {}
         # Pass through common tokenizer methods.
@@ -172,40 +595,124 @@ class Parser:
     def start(self) -> Any:
         pass
 
+    def cut(self) -> bool:
+        """Called by generated code when it passes a cut (~).
+
+        When the parser evicts, a cut is a commit point.
+        """
+        if self._evict:
+            self.commit()
+        return True
+
+    def commit(self) -> None:
+        """Discard memo entries and tokens before the current position.
+
+        This is a promise that the parser will never backtrack behind
+        this point; it keeps memory flat on huge inputs.  With evict=True
+        it is called automatically at every cut and after every sync rule.
+        """
+        mark = self.mark()
+        self._tokenizer.evict(mark)
+        if self._cache:
+            self._cache = {key: value for key, value in self._cache.items() if key[0] >= mark}
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        """Get ready to parse the tokens from *tokengen* from the start.
+
+        This lets one parser (and its tokenizer) be reused for many
+        inputs, whether or not the previous parse succeeded.  A profile
+        keeps counting across inputs.
+        """
+        self._tokenizer.restart(tokengen)
+        self._cache.clear()
+        self._level = 0
+
+    def parse_iter(self, filename: str = "<unknown>") -> Iterator[Any]:
+        """Yield each match of the stream rule as soon as it is complete.
+
+        The rule is matched repeatedly until ENDMARKER.  Tokens and memo
+        entries behind each result are released before it is yielded, so
+        a caller can process a huge file statement by statement.  A match
+        that consumes no input is a syntax error too, since matching again
+        at the same position would never get to the end.
+        """
+        rule = getattr(self, self._stream_rule)
+        tokenizer = self._tokenizer
+        while not tokenizer.at_end():
+            mark = self.mark()
+            tree = rule()
+            if tree is None or self.mark() == mark:
+                raise self.make_syntax_error(filename)
+            self.commit()
+            yield tree
+
+    def reparse(self, edits: Sequence[TextEdit]) -> Any:
+        """Apply *edits* to the input and parse it again from the start.
+
+        This needs an IncrementalTokenizer.  Results memoized by the
+        previous parse are reused wherever the edits did not touch the
+        tokens they looked at, so only the damaged region is parsed again.
+        """
+        tokenizer = self._tokenizer
+        if not isinstance(tokenizer, IncrementalTokenizer):
+            raise TypeError("reparse() requires an IncrementalTokenizer")
+        tokenizer.edit(edits)
+        self._cache.clear()
+        return self.start()
+
     def showpeek(self) -> str:
         tok = self._tokenizer.peek()
         return f"{tok.start[0]}.{tok.start[1]}: {token.tok_name[tok.type]}:{tok.string!r}"
 
-    @memoize
+    @logger
     def name(self) -> Optional[tokenize.TokenInfo]:
         tok = self._tokenizer.peek()
-        if tok.type == token.NAME:
+        if tok.type == token.NAME and tok.string not in self._reserved:
             return self._tokenizer.getnext()
         return None
 
-    @memoize
+    @logger
     def number(self) -> Optional[tokenize.TokenInfo]:
         tok = self._tokenizer.peek()
         if tok.type == token.NUMBER:
             return self._tokenizer.getnext()
         return None
 
-    @memoize
+    @logger
     def string(self) -> Optional[tokenize.TokenInfo]:
         tok = self._tokenizer.peek()
         if tok.type == token.STRING:
             return self._tokenizer.getnext()
         return None
 
-    @memoize
+    @logger
     def op(self) -> Optional[tokenize.TokenInfo]:
         tok = self._tokenizer.peek()
         if tok.type == token.OP:
             return self._tokenizer.getnext()
         return None
 
+    @logger
+    def expect_type(self, type: int) -> Optional[tokenize.TokenInfo]:
+        tok = self._tokenizer.peek()
+        if tok.type == type:
+            return self._tokenizer.getnext()
+        return None
+
+    @logger
+    def expect_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+        tok = self._tokenizer.peek()
+        if tok.string == string:
+            return self._tokenizer.getnext()
+        return None
+
     @memoize
     def expect(self, type: str) -> Optional[tokenize.TokenInfo]:
+        """Match a token by string, exact operator type or token name.
+
+        Generated parsers resolve this up front and call expect_type() or
+        expect_string() instead; expect() remains for hand-written parsers.
+        """
         tok = self._tokenizer.peek()
         if tok.string == type:
             return self._tokenizer.getnext()
@@ -238,7 +745,65 @@ class Parser:
         )
 
 
-def simple_parser_main(parser_class: Type[Parser]) -> None:
+class UntracedParser(Parser):
+    """Base class for parsers generated with untraced=True.
+
+    The token matchers are the bare methods, without the logger.  The
+    generated traced subclass puts it back with TracedParserMixin.
+    """
+
+    name = unwrap(Parser.name)
+    number = unwrap(Parser.number)
+    string = unwrap(Parser.string)
+    op = unwrap(Parser.op)
+    expect_type = unwrap(Parser.expect_type)
+    expect_string = unwrap(Parser.expect_string)
+
+
+class TracedParserMixin:
+    """Logged token matchers, for the traced subclass of an untraced parser."""
+
+    name = Parser.name
+    number = Parser.number
+    string = Parser.string
+    op = Parser.op
+    expect_type = Parser.expect_type
+    expect_string = Parser.expect_string
+
+
+def parse_two_phase(
+    parser_class: Type[Parser],
+    source: str,
+    filename: str = "<unknown>",
+    *,
+    traced_parser_class: Optional[Type[Parser]] = None,
+) -> Any:
+    """Parse *source*, paying for error reporting only if it is invalid.
+
+    The first pass evicts at every commit point (see Parser.commit())
+    and makes no error.  Only if it fails is *source* parsed again,
+    keeping every token, by traced_parser_class (or parser_class) to
+    raise the error from make_syntax_error().  The second pass also
+    rescues input that only failed because the first one backtracked
+    behind a commit point.
+    """
+    # A parser generated with a lexer tokenizes with that.
+    generate_tokens = getattr(parser_class, "generate_tokens", tokenize.generate_tokens)
+    tokenizer = Tokenizer(generate_tokens(io.StringIO(source).readline))
+    tree = parser_class(tokenizer, evict=True).start()
+    if tree:
+        return tree
+    tokenizer = Tokenizer(generate_tokens(io.StringIO(source).readline))
+    parser = (traced_parser_class or parser_class)(tokenizer)
+    tree = parser.start()
+    if not tree:
+        raise parser.make_syntax_error(filename)
+    return tree
+
+
+def simple_parser_main(
+    parser_class: Type[Parser], traced_parser_class: Optional[Type[Parser]] = None
+) -> None:
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
         "-v",
@@ -250,6 +815,21 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
     argparser.add_argument(
         "-q", "--quiet", action="store_true", help="Don't print the parsed program"
     )
+    argparser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print per-rule counters and times (parsing is slower while profiling)",
+    )
+    argparser.add_argument(
+        "--evict",
+        action="store_true",
+        help="Discard memo entries and tokens behind cuts and sync rules",
+    )
+    argparser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print each match of the @stream rule as soon as it is parsed",
+    )
     argparser.add_argument("filename", help="Input file ('-' to use stdin)")
 
     args = argparser.parse_args()
@@ -266,10 +846,27 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
     else:
         file = open(args.filename)
     try:
-        tokengen = tokenize.generate_tokens(file.readline)
+        # A parser generated with a lexer tokenizes with that.
+        generate_tokens = getattr(parser_class, "generate_tokens", tokenize.generate_tokens)
+        tokengen = generate_tokens(file.readline)
         tokenizer = Tokenizer(tokengen, verbose=verbose_tokenizer)
-        parser = parser_class(tokenizer, verbose=verbose_parser)
-        tree = parser.start()
+        if (verbose or args.profile) and traced_parser_class is not None:
+            parser_class = traced_parser_class
+        elif args.profile and issubclass(parser_class, UntracedParser):
+            argparser.error("--profile needs a traced parser, and this one is untraced")
+        parser = parser_class(
+            tokenizer, verbose=verbose_parser, evict=args.evict, profile=args.profile
+        )
+        if args.stream:
+            try:
+                for tree in parser.parse_iter(filename):
+                    if not args.quiet:
+                        print(tree)
+            except SyntaxError as exc:
+                traceback.print_exception(exc.__class__, exc, None)
+                sys.exit(1)
+        else:
+            tree = parser.start()
         try:
             if file.isatty():
                 endpos = 0
@@ -283,13 +880,14 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
 
     t1 = time.time()
 
-    if not tree:
-        err = parser.make_syntax_error(filename)
-        traceback.print_exception(err.__class__, err, None)
-        sys.exit(1)
+    if not args.stream:
+        if not tree:
+            err = parser.make_syntax_error(filename)
+            traceback.print_exception(err.__class__, err, None)
+            sys.exit(1)
 
-    if not args.quiet:
-        print(tree)
+        if not args.quiet:
+            print(tree)
 
     if verbose:
         dt = t1 - t0
@@ -307,4 +905,12 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
         print("Caches sizes:")
         print(f"  token array : {len(tokenizer._tokens):10}")
         print(f"        cache : {len(parser._cache):10}")
+        print(f"   memo table : {sum(map(len, tokenizer._memo)):10}")
+        if args.evict:
+            print(f"  evicted tok : {tokenizer._evicted:10}")
+            print(f" evicted memo : {tokenizer._evicted_memo:10}")
         ## print_memstats()
+
+    if parser._profile is not None:
+        print("Rule profile:")
+        parser._profile.report(limit=None if verbose >= 2 else 25)
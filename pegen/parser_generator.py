@@ -1,8 +1,22 @@
+import ast
 import contextlib
 import token
 from abc import abstractmethod
 
-from typing import AbstractSet, Dict, IO, Iterator, List, Optional, Set, Text, Tuple
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    FrozenSet,
+    IO,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Text,
+    Tuple,
+)
 
 from pegen import sccutils
 from pegen.grammar import (
@@ -15,6 +29,12 @@ from pegen.grammar import (
     NameLeaf,
     StringLeaf,
     Gather,
+    Group,
+    Lookahead,
+    Opt,
+    Repeat0,
+    Repeat1,
+    Cut,
 )
 from pegen.grammar import GrammarError, GrammarVisitor
 
@@ -29,11 +49,177 @@ class RuleCheckingVisitor(GrammarVisitor):
             raise GrammarError(f"Dangling reference to rule {node.value!r}")
 
 
+class NameCollectingVisitor(GrammarVisitor):
+    """Collect the names of all rules and tokens referenced by a node."""
+
+    def __init__(self) -> None:
+        self.names: Set[str] = set()
+
+    def visit_NameLeaf(self, node: NameLeaf) -> None:
+        self.names.add(node.value)
+
+
+class KeywordCollectingVisitor(GrammarVisitor):
+    """Collect the keywords used by a node: the literals that are identifiers."""
+
+    def __init__(self) -> None:
+        self.keywords: Set[str] = set()
+
+    def visit_StringLeaf(self, node: StringLeaf) -> None:
+        value = ast.literal_eval(node.value)
+        if value.isidentifier():
+            self.keywords.add(value)
+
+
+class InlineGroupVisitor(GrammarVisitor):
+    """Find the groups whose helper rules can be expanded into their caller.
+
+    Every group of more than one item gets a helper rule (see name_node()),
+    called from one place and never recursive itself.  A group is expanded
+    in place of the call instead if it has one alternative of at most *size*
+    items, without a cut, whose action is none or the name of one of its
+    items; the generators then bind that value, or the default one, in the
+    caller.  Groups in a lookahead, or that are the element of a gather
+    (which two rules call), keep their helper rule.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.groups: Set[Rhs] = set()
+
+    def visit_Rhs(self, node: Rhs) -> None:
+        if len(node.alts) == 1 and self.inlinable(node.alts[0]):
+            self.groups.add(node)
+        self.generic_visit(node)
+
+    def inlinable(self, node: Alt) -> bool:
+        items = node.items
+        if not 2 <= len(items) <= self.size:
+            return False
+        names = {item.name for item in items if item.name}
+        # A generator names its variables after the helper, adding "_mark".
+        if "mark" in names or any(isinstance(item.item, Cut) for item in items):
+            return False
+        if all(isinstance(item.item, Lookahead) for item in items):
+            return False
+        return node.action is None or node.action.strip() in names
+
+    def visit_lookahead(self, node: Lookahead) -> None:
+        self.visit_uninlined(node.node)
+
+    def visit_PositiveLookahead(self, node: Lookahead) -> None:
+        self.visit_lookahead(node)
+
+    def visit_NegativeLookahead(self, node: Lookahead) -> None:
+        self.visit_lookahead(node)
+
+    def visit_Gather(self, node: Gather) -> None:
+        self.visit_uninlined(node.node)
+
+    def visit_uninlined(self, node: Any) -> None:
+        # Look inside a group that keeps its helper rule, but not at it.
+        self.generic_visit(node.rhs if isinstance(node, Group) else node)
+
+
+# Markers in FIRST sets, next to token names and quoted literals.
+EMPTY = ""  # The item can match without consuming a token.
+ANY = "?"  # The item can start with a token we know nothing about.
+
+
+class FirstSetCalculator(GrammarVisitor):
+    """Compute the set of terminals an item can start with.
+
+    A terminal is a token name (like NAME or NEWLINE) or a string literal
+    as written in the grammar (like 'if', including the quotes).  Rule
+    names are looked up in first_sets, which compute_first_sets() fills.
+    """
+
+    def __init__(self, rules: Dict[str, Rule]):
+        self.rules = rules
+        self.first_sets: Dict[str, FrozenSet[str]] = {name: frozenset() for name in rules}
+
+    def visit_Rule(self, node: Rule) -> Set[str]:
+        return self.visit(node.rhs)
+
+    def visit_Rhs(self, node: Rhs) -> Set[str]:
+        result: Set[str] = set()
+        for alt in node.alts:
+            result |= self.visit(alt)
+        return result
+
+    def visit_Alt(self, node: Alt) -> Set[str]:
+        result: Set[str] = set()
+        for item in node.items:
+            first = self.visit(item)
+            result |= first - {EMPTY}
+            if EMPTY not in first:
+                return result
+        result.add(EMPTY)
+        return result
+
+    def visit_NamedItem(self, node: NamedItem) -> Set[str]:
+        return self.visit(node.item)
+
+    def visit_NameLeaf(self, node: NameLeaf) -> Set[str]:
+        if node.value in self.first_sets:
+            return set(self.first_sets[node.value])
+        if node.value in token.tok_name.values():
+            return {node.value}
+        # A helper rule made up by the generator.
+        return {ANY}
+
+    def visit_StringLeaf(self, node: StringLeaf) -> Set[str]:
+        return {node.value}
+
+    def visit_Group(self, node: Group) -> Set[str]:
+        return self.visit(node.rhs)
+
+    def visit_Opt(self, node: Opt) -> Set[str]:
+        return self.visit(node.node) | {EMPTY}
+
+    def visit_Repeat0(self, node: Repeat0) -> Set[str]:
+        return self.visit(node.node) | {EMPTY}
+
+    def visit_Repeat1(self, node: Repeat1) -> Set[str]:
+        return self.visit(node.node)
+
+    def visit_Gather(self, node: Gather) -> Set[str]:
+        return self.visit(node.node)
+
+    def visit_PositiveLookahead(self, node: Lookahead) -> Set[str]:
+        return {EMPTY}
+
+    def visit_NegativeLookahead(self, node: Lookahead) -> Set[str]:
+        return {EMPTY}
+
+    def visit_Cut(self, node: Cut) -> Set[str]:
+        return {EMPTY}
+
+
+class LeftRecLoop(NamedTuple):
+    """How a directly left-recursive rule is generated as a loop.
+
+    The rule first calls the helper rule named by seed, which has its
+    other alternatives; then it keeps matching one of alts, with the result
+    so far standing in for their leading self-reference.
+    """
+
+    seed: str
+    alts: List[Alt]
+
+
 class ParserGenerator:
 
     callmakervisitor: GrammarVisitor
 
-    def __init__(self, grammar: Grammar, file: Optional[IO[Text]]):
+    def __init__(
+        self,
+        grammar: Grammar,
+        file: Optional[IO[Text]],
+        *,
+        selective_memo: bool = False,
+        inline_size: int = 0,
+    ):
         self.grammar = grammar
         self.rules = grammar.rules
         if "start" not in self.rules:
@@ -45,13 +231,76 @@ class ParserGenerator:
         self.level = 0
         compute_nullables(self.rules)
         self.first_graph, self.first_sccs = compute_left_recursives(self.rules)
+        self.first_set_calculator = compute_first_sets(self.rules)
+        self.sync_rules = compute_sync_rules(grammar)
+        self.stream_rule = compute_stream_rule(grammar)
+        self.keywords, self.reserved_keywords = compute_keywords(grammar)
+        # In selective mode only left-recursive and (memo) rules are memoized.
+        self.selective_memo = selective_memo
+        # The groups expanded into their callers, and their helper rules
+        # once named; those are not generated.  See InlineGroupVisitor.
+        self.inline_groups = compute_inline_groups(grammar, inline_size)
+        self.inlined: Dict[Rhs, Rule] = {}
         self.todo = self.rules.copy()  # Rules to generate
         self.counter = 0  # For name_rule()/name_loop()
+        self.left_rec_loops = self.make_left_rec_loops()
 
     @abstractmethod
     def generate(self, filename: str) -> None:
         raise NotImplementedError
 
+    def should_memoize(self, rule: Rule) -> bool:
+        """Whether the generated code for *rule* uses the memo.
+
+        Left-recursive leaders always need it to grow their seed, and
+        other rules in a cycle can never use it, whatever their flag says.
+        """
+        if rule.left_recursive:
+            return rule.leader
+        if rule.memo is not None:
+            return rule.memo
+        return not self.selective_memo
+
+    def grows_seed(self, rule: Rule) -> bool:
+        """Whether *rule* needs memoize_left_rec() (or the C equivalent)."""
+        return rule.left_recursive and rule.leader and rule.name not in self.left_rec_loops
+
+    def make_left_rec_loops(self) -> Dict[str, LeftRecLoop]:
+        """Rewrite directly left-recursive rules into a seed and a loop.
+
+        A rule like ``expr: expr '+' term | expr '-' term | term`` is
+        generated as a call to a helper rule with the non-recursive
+        alternatives (here just ``term``), followed by a loop over the
+        recursive ones (see LeftRecLoop).  This is what memoize_left_rec()
+        does when it grows the seed, except that it re-runs the whole rule
+        for every step.  It only works if all recursive alternatives come
+        first, and if neither a seed nor a step can match the empty string;
+        other rules, including indirectly left-recursive ones, still grow
+        their seed.
+        """
+        direct = {name for scc in self.first_sccs if len(scc) == 1 for name in scc}
+        loops = {}
+        for name, rule in self.rules.items():
+            if not rule.left_recursive or name not in direct:
+                continue
+            alts = rule.flatten().alts
+            count = 0
+            while count < len(alts) and starts_with(alts[count], name):
+                count += 1
+            recursive, base = alts[:count], alts[count:]
+            if not recursive or not base:
+                continue
+            if any(EMPTY in self.first_set(Alt(alt.items[1:])) for alt in recursive):
+                continue
+            if any(EMPTY in self.first_set(alt) or calls_at_start(alt, name) for alt in base):
+                continue
+            loops[name] = LeftRecLoop(self.name_seed(rule, base), recursive)
+        return loops
+
+    def first_set(self, node: Alt) -> Set[str]:
+        """Return the terminals *node* can start with (see FirstSetCalculator)."""
+        return self.first_set_calculator.visit(node)
+
     @contextlib.contextmanager
     def indent(self) -> Iterator[None]:
         self.level += 1
@@ -74,18 +323,47 @@ class ParserGenerator:
     def collect_todo(self) -> None:
         done: Set[str] = set()
         while True:
-            alltodo = set(self.todo)
+            # Inlined groups may still need helper rules for their items.
+            rules = {**self.todo, **{rule.name: rule for rule in self.inlined.values()}}
+            alltodo = set(rules)
             todo = alltodo - done
             if not todo:
                 break
             for rulename in todo:
-                self.todo[rulename].collect_todo(self)
+                rules[rulename].collect_todo(self)
             done = alltodo
 
     def name_node(self, rhs: Rhs) -> str:
         self.counter += 1
         name = f"_tmp_{self.counter}"  # TODO: Pick a nicer name.
-        self.todo[name] = Rule(name, None, rhs)
+        if rhs in self.inline_groups:
+            self.inlined[rhs] = Rule(name, None, rhs)
+        else:
+            self.todo[name] = Rule(name, None, rhs)
+        return name
+
+    def inline_group(self, item: Any) -> Optional[Tuple[str, Alt, bool]]:
+        """Return how to expand *item* if it is an inlined group, or None.
+
+        That is the name of its helper rule (which prefixes the names of the
+        variables it binds), its alternative, and whether it is optional.
+        The helper must have been named already, by the call maker.
+        """
+        optional = isinstance(item, Opt)
+        if optional:
+            item = item.node
+        if isinstance(item, Group):
+            item = item.rhs
+        rule = self.inlined.get(item) if isinstance(item, Rhs) else None
+        if rule is None:
+            return None
+        return rule.name, rule.rhs.alts[0], optional
+
+    def name_seed(self, rule: Rule, alts: List[Alt]) -> str:
+        self.counter += 1
+        name = f"_seed_{self.counter}"
+        # Only called by the left-recursive rule, which is memoized itself.
+        self.todo[name] = Rule(name, rule.type, Rhs(alts), memo="nomemo")
         return name
 
     def name_loop(self, node: Plain, is_repeat1: bool) -> str:
@@ -126,6 +404,26 @@ def dedupe(name: str, names: List[str]) -> str:
     return name
 
 
+def starts_with(alt: Alt, name: str) -> bool:
+    """Whether the first item of *alt* is a plain reference to *name*."""
+    if not alt.items:
+        return False
+    item = alt.items[0].item
+    return isinstance(item, NameLeaf) and item.value == name
+
+
+def calls_at_start(alt: Alt, name: str) -> bool:
+    """Whether *alt* may invoke *name*, even in a lookahead, before consuming a token."""
+    for item in alt.items:
+        visitor = NameCollectingVisitor()
+        visitor.visit(item)
+        if name in visitor.names:
+            return True
+        if not item.nullable:
+            break
+    return False
+
+
 def compute_nullables(rules: Dict[str, Rule]) -> None:
     """Compute which rules in a grammar are nullable.
 
@@ -135,6 +433,89 @@ def compute_nullables(rules: Dict[str, Rule]) -> None:
         rule.nullable_visit(rules)
 
 
+def compute_first_sets(rules: Dict[str, Rule]) -> FirstSetCalculator:
+    """Compute the FIRST set of every rule in a grammar.
+
+    The sets only grow, so this iterates until nothing changes; that
+    also takes care of left recursion.  The returned calculator has the
+    result in first_sets and can compute the FIRST set of any other node.
+    """
+    calculator = FirstSetCalculator(rules)
+    first_sets = calculator.first_sets
+    changed = True
+    while changed:
+        changed = False
+        for name, rule in rules.items():
+            first = frozenset(calculator.visit(rule))
+            if first != first_sets[name]:
+                first_sets[name] = first
+                changed = True
+    return calculator
+
+
+def compute_sync_rules(grammar: Grammar) -> Set[str]:
+    """Collect the rules named by the @sync meta.
+
+    A sync rule is a commit point: once it succeeds the parser promises
+    never to backtrack behind its end, so memo entries and tokens before
+    it can be discarded.
+    """
+    names = set((grammar.metas.get("sync") or "").split())
+    for name in names:
+        if name not in grammar.rules:
+            raise GrammarError(f"Dangling reference to sync rule {name!r}")
+        if grammar.rules[name].left_recursive:
+            raise GrammarError(f"Sync rule {name!r} cannot be left-recursive")
+    return names
+
+
+def compute_inline_groups(grammar: Grammar, size: int) -> Set[Rhs]:
+    """Collect the groups to expand into their callers (see InlineGroupVisitor).
+
+    None are if *size* is 0, nor any in the rules named by the @noinline
+    meta, whose helper rules thus show up in traces and profiles.
+    """
+    names = set((grammar.metas.get("noinline") or "").split())
+    for name in names:
+        if name not in grammar.rules:
+            raise GrammarError(f"Dangling reference to noinline rule {name!r}")
+    visitor = InlineGroupVisitor(size)
+    if size > 0:
+        for rule in grammar.rules.values():
+            if rule.name not in names:
+                for alt in rule.flatten().alts:
+                    visitor.visit(alt)
+    return visitor.groups
+
+
+def compute_keywords(grammar: Grammar) -> Tuple[FrozenSet[str], bool]:
+    """Collect the keywords of the grammar, and whether they are reserved.
+
+    With the ``@keywords reserved`` meta, NAME does not match keywords, as
+    in Python, so rules need not try keyword alternatives before NAME ones.
+    """
+    visitor = KeywordCollectingVisitor()
+    for rule in grammar.rules.values():
+        visitor.visit(rule)
+    if "keywords" not in grammar.metas:
+        return frozenset(visitor.keywords), False
+    if grammar.metas["keywords"] != "reserved":
+        raise GrammarError(f"Unknown @keywords value {grammar.metas['keywords']!r}")
+    return frozenset(visitor.keywords), True
+
+
+def compute_stream_rule(grammar: Grammar) -> str:
+    """Return the rule named by the @stream meta, or 'start'.
+
+    Streaming parsers match this rule repeatedly until ENDMARKER,
+    handing out each result as soon as it is complete.
+    """
+    name = grammar.metas.get("stream") or "start"
+    if name not in grammar.rules:
+        raise GrammarError(f"Dangling reference to stream rule {name!r}")
+    return name
+
+
 def compute_left_recursives(
     rules: Dict[str, Rule]
 ) -> Tuple[Dict[str, AbstractSet[str]], List[AbstractSet[str]]]:
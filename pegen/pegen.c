@@ -1,7 +1,15 @@
 #include <Python.h>
 #include "pegen.h"
+#include <errcode.h>
 #include "v38tokenizer.h"
 
+#ifdef HAVE_MMAP
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
 static inline PyObject *
 new_identifier(Parser *p, char* identifier) {
     PyObject *id = PyUnicode_FromString(identifier);
@@ -97,13 +105,50 @@ token_name(int type)
     return "<Huh?>";
 }
 
+// Get an unused memo entry: an evicted one, or else the next one in the
+// memo blocks, which are handed out in order (and kept when the Parser is
+// reused, see parser_finish()).
+static Memo *
+new_memo(Parser *p)
+{
+    Memo *m = p->free_memo;
+    if (m != NULL) {
+        p->free_memo = m->next;
+        return m;
+    }
+    if (p->memo_block == NULL || p->memo_used == MEMO_BLOCK_SIZE) {
+        MemoBlock *next = p->memo_block == NULL ? p->memo_blocks : p->memo_block->next;
+        if (next == NULL) {
+            next = PyMem_Malloc(sizeof(MemoBlock));
+            if (next == NULL) {
+                PyErr_NoMemory();
+                return NULL;
+            }
+            next->next = NULL;
+            if (p->memo_block == NULL) {
+                p->memo_blocks = next;
+            }
+            else {
+                p->memo_block->next = next;
+            }
+        }
+        p->memo_block = next;
+        p->memo_used = 0;
+    }
+    return &p->memo_block->memo[p->memo_used++];
+}
+
 // Here, mark is the start of the node, while p->mark is the end.
 // If node==NULL, they should be the same.
 int
 insert_memo(Parser *p, int mark, int type, void *node)
 {
+    if (mark < p->evicted) {
+        // Behind a commit point; nobody will look this up again.
+        return 0;
+    }
     // Insert in front
-    Memo *m = PyArena_Malloc(p->arena, sizeof(Memo));
+    Memo *m = new_memo(p);
     if (m == NULL) {
         return -1;
     }
@@ -131,6 +176,49 @@ update_memo(Parser *p, int mark, int type, void *node)
     return insert_memo(p, mark, type, node);
 }
 
+// Put the memo entries of token t back on the free list.
+static void
+release_memo(Parser *p, Token *t)
+{
+    Memo *m = t->memo;
+    while (m != NULL) {
+        Memo *next = m->next;
+        m->next = p->free_memo;
+        p->free_memo = m;
+        m = next;
+    }
+    t->memo = NULL;
+}
+
+// Discard memo entries and token bytes before p->mark.  This is a promise
+// that the parser will never backtrack behind this point; if it does anyway,
+// expect_token() fails on the evicted tokens.  The last token read is always
+// kept, for raise_syntax_error().  Token positions are kept as well, since
+// get_last_nonnwhitespace_token() may still look at them.
+void
+commit(Parser *p)
+{
+    int stop = p->mark < p->fill - 1 ? p->mark : p->fill - 1;
+    for (int i = p->evicted; i < stop; i++) {
+        Token *t = p->tokens[i];
+        release_memo(p, t);
+        Py_CLEAR(t->bytes);
+    }
+    if (stop > p->evicted) {
+        p->evicted = stop;
+    }
+}
+
+// Called when a cut (~) is passed; it is a commit point when evicting.
+int
+cut(Parser *p)
+{
+    if (p->evict) {
+        commit(p);
+    }
+    return 1;
+}
+
 // Return dummy NAME.
 void *
 CONSTRUCTOR(Parser *p, ...)
@@ -143,11 +231,355 @@ CONSTRUCTOR(Parser *p, ...)
     return Name(id, Load, 1, 0, 1, 0,p->arena);
 }
 
+const LexerSpec *lexer_spec = NULL;
+
+#define is_name_start(c) (((c) >= 'a' && (c) <= 'z') || ((c) >= 'A' && (c) <= 'Z') \
+                          || (c) == '_' || (unsigned char)(c) >= 128)
+#define is_name_char(c) (is_name_start(c) || ((c) >= '0' && (c) <= '9'))
+
+static int
+lexer_error(struct tok_state *tok, PyObject *type, const char *msg, const char *c)
+{
+    tok->done = E_ERROR;
+    PyErr_SetString(type, msg);
+    PyErr_SyntaxLocationObject(tok->filename, tok->lineno, (int)(c - tok->line_start) + 1);
+    return ERRORTOKEN;
+}
+
+// The lexer works on the whole input in memory, which a tokenizer for a
+// string has already; from a file, it is read in on the first call.  Either
+// way the input is taken to be UTF-8.
+static int
+lexer_read_file(struct tok_state *tok)
+{
+    size_t size = 0, allocated = 8192;
+    char *data = PyMem_Malloc(allocated);
+    if (data == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (;;) {
+        size_t n = fread(data + size, 1, allocated - size - 1, tok->fp);
+        size += n;
+        if (n == 0) {
+            break;
+        }
+        if (size == allocated - 1) {
+            char *bigger = PyMem_Realloc(data, allocated * 2);
+            if (bigger == NULL) {
+                PyMem_Free(data);
+                PyErr_NoMemory();
+                return -1;
+            }
+            data = bigger;
+            allocated *= 2;
+        }
+    }
+    if (ferror(tok->fp)) {
+        PyMem_Free(data);
+        PyErr_SetFromErrno(PyExc_OSError);
+        return -1;
+    }
+    data[size] = '\0';
+    if (memchr(data, '\0', size) != NULL) {
+        PyMem_Free(data);
+        PyErr_SetString(PyExc_ValueError, "source code cannot contain null bytes");
+        return -1;
+    }
+    tok->input = data;  // Freed by PyTokenizer_Free()
+    tok->cur = tok->inp = size >= 3 && memcmp(data, "\xEF\xBB\xBF", 3) == 0 ? data + 3 : data;
+    return 0;
+}
+
+// Move on to the line at tok->cur; tok->inp is kept at the end of the line,
+// as the tokenizer does.
+static void
+lexer_next_line(struct tok_state *tok)
+{
+    char *end = strchr(tok->cur, '\n');
+    tok->inp = end != NULL ? end + 1 : tok->cur + strlen(tok->cur);
+    tok->line_start = tok->cur;
+    if (tok->fp == NULL) {
+        tok->buf = tok->cur;  // For raise_syntax_error()
+    }
+    tok->lineno++;
+}
+
+// The length of the string prefix (like rb or f) at c, if a quote follows it;
+// else -1.
+static int
+string_prefix_length(const char *c)
+{
+    int b = 0, r = 0, u = 0, f = 0;
+    for (int n = 0;; n++) {
+        switch (c[n]) {
+            case '\'':
+            case '"':
+                return n;
+            case 'b':
+            case 'B':
+                if (b || u || f) {
+                    return -1;
+                }
+                b = 1;
+                break;
+            case 'r':
+            case 'R':
+                if (r || u) {
+                    return -1;
+                }
+                r = 1;
+                break;
+            case 'u':
+            case 'U':
+                if (b || r || u || f) {
+                    return -1;
+                }
+                u = 1;
+                break;
+            case 'f':
+            case 'F':
+                if (b || u || f) {
+                    return -1;
+                }
+                f = 1;
+                break;
+            default:
+                return -1;
+        }
+    }
+}
+
+// The end of the string whose opening quote is at c, or NULL on error.
+static const char *
+lexer_string(struct tok_state *tok, const char *c)
+{
+    char quote = *c;
+    int triple = c[1] == quote && c[2] == quote;
+    for (c += triple ? 3 : 1;; c++) {
+        if (*c == quote && (!triple || (c[1] == quote && c[2] == quote))) {
+            return c + (triple ? 3 : 1);
+        }
+        if (*c == '\\' && c[1] != '\0') {
+            c++;
+        }
+        else if (*c == '\0' || (*c == '\n' && !triple)) {
+            lexer_error(tok, PyExc_SyntaxError,
+                        triple ? "EOF while scanning triple-quoted string literal"
+                               : "EOL while scanning string literal",
+                        c);
+            return NULL;
+        }
+        if (*c == '\n') {
+            tok->cur = (char *)c + 1;
+            lexer_next_line(tok);
+        }
+    }
+}
+
+// The end of the number at c.  This is looser than the tokenizer, leaving
+// malformed numbers to number_token().
+static const char *
+lexer_number(const char *c)
+{
+    if (c[0] == '0' && c[1] != '\0' && strchr("xXoObB", c[1]) != NULL) {
+        for (c += 2; Py_ISXDIGIT(*c) || *c == '_'; c++) {
+        }
+        return c;
+    }
+    while (Py_ISDIGIT(*c) || *c == '_') {
+        c++;
+    }
+    if (*c == '.') {
+        for (c++; Py_ISDIGIT(*c) || *c == '_'; c++) {
+        }
+    }
+    if ((*c == 'e' || *c == 'E')
+            && (Py_ISDIGIT(c[1]) || ((c[1] == '+' || c[1] == '-') && Py_ISDIGIT(c[2])))) {
+        for (c += 2; Py_ISDIGIT(*c) || *c == '_'; c++) {
+        }
+    }
+    if (*c == 'j' || *c == 'J') {
+        c++;
+    }
+    return c;
+}
+
+// The NEWLINE, DEDENT and ENDMARKER tokens at the end of the input.
+static int
+lexer_end(struct tok_state *tok, const LexerSpec *spec, char **p_start, char **p_end)
+{
+    if (!tok->atbol && (spec->flags & LEX_NEWLINES)) {
+        // The last line has no newline of its own.
+        tok->atbol = 1;
+        *p_start = *p_end = tok->cur;
+        return NEWLINE;
+    }
+    if (tok->indent > 0) {
+        tok->indent--;
+        return DEDENT;
+    }
+    tok->done = E_EOF;
+    return ENDMARKER;
+}
+
+// The lexer follows the tokenizer's conventions, and keeps its state in the
+// same fields, which fill_token() reads.  There are no tokens for blank lines
+// and comments, and NEWLINE, INDENT and DEDENT tokens only if the grammar has
+// them.  Characters that are no token of the grammar come back as OP tokens,
+// which no rule matches.
+int
+run_lexer(struct tok_state *tok, const LexerSpec *spec, char **p_start, char **p_end)
+{
+    if (tok->done != E_OK && tok->done != E_EOF) {
+        return ERRORTOKEN;  // Again, like the tokenizer
+    }
+    if (tok->fp != NULL && tok->input == NULL && lexer_read_file(tok) < 0) {
+        tok->done = E_ERROR;
+        return ERRORTOKEN;
+    }
+    *p_start = *p_end = NULL;
+    if (tok->pendin < 0) {
+        tok->pendin++;
+        return DEDENT;
+    }
+
+    // Skip to the start of the next token.  tok->atbol is set from the end
+    // of a line outside of brackets until the first token after it.
+    char *c = tok->cur;
+    for (;;) {
+        if (c == tok->inp) {
+            tok->cur = c;
+            if (*c == '\0') {
+                return lexer_end(tok, spec, p_start, p_end);
+            }
+            lexer_next_line(tok);
+        }
+        switch (*c) {
+            case ' ':
+            case '\t':
+            case '\014':
+            case '\r':
+                c++;
+                continue;
+            case '#':
+                while (*c != '\n' && *c != '\0') {
+                    c++;
+                }
+                continue;
+            case '\\':
+                if (c[1] == '\n' || (c[1] == '\r' && c[2] == '\n')) {
+                    c += c[1] == '\n' ? 2 : 3;
+                    continue;
+                }
+                break;
+            case '\n':
+                c++;
+                if (tok->level > 0) {
+                    continue;
+                }
+                if (!tok->atbol && (spec->flags & LEX_NEWLINES)) {
+                    tok->atbol = 1;
+                    tok->cur = c;
+                    *p_start = c - 1;
+                    *p_end = c;
+                    return NEWLINE;
+                }
+                tok->atbol = 1;
+                continue;
+        }
+        break;
+    }
+
+    if (tok->atbol) {
+        tok->atbol = 0;
+        if (spec->flags & LEX_INDENTS) {
+            int col = 0;
+            for (const char *i = tok->line_start; i < c; i++) {
+                col = *i == '\t' ? (col / tok->tabsize + 1) * tok->tabsize
+                                 : *i == '\014' ? 0 : col + 1;
+            }
+            tok->cur = c;
+            if (col > tok->indstack[tok->indent]) {
+                if (tok->indent + 1 >= MAXINDENT) {
+                    return lexer_error(tok, PyExc_IndentationError,
+                                       "too many levels of indentation", c);
+                }
+                tok->indstack[++tok->indent] = col;
+                return INDENT;
+            }
+            while (tok->indent > 0 && col < tok->indstack[tok->indent]) {
+                tok->indent--;
+                tok->pendin--;
+            }
+            if (col != tok->indstack[tok->indent]) {
+                return lexer_error(tok, PyExc_IndentationError,
+                                   "unindent does not match any outer indentation level", c);
+            }
+            if (tok->pendin < 0) {
+                tok->pendin++;
+                return DEDENT;
+            }
+        }
+    }
+
+    const char *end;
+    int type;
+    int prefix = spec->flags & LEX_STRINGS ? string_prefix_length(c) : -1;
+    if (prefix >= 0) {
+        type = STRING;
+        tok->first_lineno = tok->lineno;
+        tok->multi_line_start = tok->line_start;
+        end = lexer_string(tok, c + prefix);
+        if (end == NULL) {
+            return ERRORTOKEN;
+        }
+    }
+    else if ((spec->flags & LEX_NAMES) && is_name_start(*c)) {
+        type = NAME;
+        for (end = c + 1; is_name_char(*end); end++) {
+        }
+        if ((spec->flags & LEX_ASYNC) && end - c == 5) {
+            if (memcmp(c, "async", 5) == 0) {
+                type = ASYNC;
+            }
+            else if (memcmp(c, "await", 5) == 0) {
+                type = AWAIT;
+            }
+        }
+    }
+    else if ((spec->flags & LEX_NUMBERS) && (Py_ISDIGIT(*c) || (*c == '.' && Py_ISDIGIT(c[1])))) {
+        type = NUMBER;
+        end = lexer_number(c);
+    }
+    else {
+        int n = spec->match_literal(c, &type);
+        if (n == 0) {
+            type = OP;
+            // One whole character, for the error message.
+            for (n = 1; (c[n] & 0xC0) == 0x80; n++) {
+            }
+        }
+        else if (type == LPAR || type == LSQB || type == LBRACE) {
+            tok->level++;
+        }
+        else if ((type == RPAR || type == RSQB || type == RBRACE) && tok->level > 0) {
+            tok->level--;
+        }
+        end = c + n;
+    }
+    tok->cur = (char *)end;
+    *p_start = c;
+    *p_end = (char *)end;
+    return type;
+}
+
 int
 fill_token(Parser *p)
 {
     char *start, *end;
-    int type = PyTokenizer_Get(p->tok, &start, &end);
+    int type = lexer_spec != NULL ? run_lexer(p->tok, lexer_spec, &start, &end)
+                                  : PyTokenizer_Get(p->tok, &start, &end);
     if (type == ERRORTOKEN) {
         if (!PyErr_Occurred()) {
             PyErr_Format(PyExc_SyntaxError, "Tokenizer returned error token");
@@ -173,11 +605,12 @@ fill_token(Parser *p)
 
     Token *t = p->tokens[p->fill];
     t->type = type;
+    // The token owns its bytes (rather than the arena) so commit() can
+    // release them early.
     t->bytes = PyBytes_FromStringAndSize(start, end - start);
     if (t->bytes == NULL) {
         return -1;
     }
-    PyArena_AddPyObject(p->arena, t->bytes);
 
     int lineno = type == STRING ? p->tok->first_lineno : p->tok->lineno;
     const char *line_start = type == STRING ? p->tok->multi_line_start : p->tok->line_start;
@@ -207,6 +640,12 @@ is_memoized(Parser *p, int type, void *pres)
         }
     }
 
+    if (p->mark < p->evicted) {
+        // Behind a commit point everything is a (memoized) failure.
+        *(void **)(pres) = NULL;
+        return 1;
+    }
+
     Token *t = p->tokens[p->mark];
 
     for (Memo *m = t->memo; m != NULL; m = m->next) {
@@ -257,7 +696,7 @@ expect_token(Parser *p, int type)
         }
     }
     Token *t = p->tokens[p->mark];
-    if (t->type != type) {
+    if (t->type != type || p->mark < p->evicted) {
         // fprintf(stderr, "No %s at %d\n", token_name(type), p->mark);
         return NULL;
     }
@@ -416,31 +855,171 @@ keyword_token(Parser *p, const char *val)
     return NULL;
 }
 
-PyObject *
-run_parser(struct tok_state* tok, void *(start_rule_func)(Parser *), int mode)
+// A Parser is set up for one input at a time by parser_start(), and
+// parser_finish() releases what belongs to that input: the arena, the token
+// bytes and the memo entries.  The token array and the memo blocks stay
+// allocated, so a Parser reused for many inputs stops allocating once it has
+// grown to fit the largest of them.
+static Parser *
+parser_alloc(void)
 {
-    PyObject* result = NULL;
     Parser *p = PyMem_Malloc(sizeof(Parser));
     if (p == NULL) {
         PyErr_Format(PyExc_MemoryError, "Out of memory for Parser");
-        goto exit;
+        return NULL;
     }
-    assert(tok != NULL);
-    p->tok = tok;
+    p->tok = NULL;
     p->tokens = PyMem_Malloc(sizeof(Token *));
     if (!p->tokens) {
+        PyMem_Free(p);
         PyErr_Format(PyExc_MemoryError, "Out of memory for tokens");
-        goto exit;
+        return NULL;
     }
     p->tokens[0] = PyMem_Malloc(sizeof(Token));
     memset(p->tokens[0], '\0', sizeof(Token));
     p->mark = 0;
     p->fill = 0;
     p->size = 1;
+    p->evict = 0;
+    p->evicted = 0;
+    p->free_memo = NULL;
+    p->memo_blocks = NULL;
+    p->memo_block = NULL;
+    p->memo_used = 0;
+    p->arena = NULL;
+    return p;
+}
 
+static int
+parser_start(Parser *p, struct tok_state *tok, int evict)
+{
+    assert(tok != NULL);
+    assert(p->arena == NULL);
     p->arena = PyArena_New();
     if (!p->arena) {
-        goto exit;
+        return -1;
+    }
+    p->tok = tok;
+    p->mark = 0;
+    p->fill = 0;
+    p->evict = evict;
+    p->evicted = 0;
+    return 0;
+}
+
+static void
+parser_finish(Parser *p)
+{
+    for (int i = 0; i < p->fill; i++) {
+        p->tokens[i]->memo = NULL;
+        Py_CLEAR(p->tokens[i]->bytes);
+    }
+    p->fill = 0;
+    p->tok = NULL;
+    // Start handing out memo entries from the first block again.
+    p->free_memo = NULL;
+    p->memo_block = NULL;
+    p->memo_used = 0;
+    if (p->arena != NULL) {
+        PyArena_Free(p->arena);
+        p->arena = NULL;
+    }
+}
+
+static void
+parser_free(Parser *p)
+{
+    parser_finish(p);
+    for (int i = 0; i < p->size; i++) {
+        PyMem_Free(p->tokens[i]);
+    }
+    PyMem_Free(p->tokens);
+    while (p->memo_blocks != NULL) {
+        MemoBlock *next = p->memo_blocks->next;
+        PyMem_Free(p->memo_blocks);
+        p->memo_blocks = next;
+    }
+    PyMem_Free(p);
+}
+
+static Parser *
+parser_new(struct tok_state *tok, int evict)
+{
+    Parser *p = parser_alloc();
+    if (p == NULL) {
+        return NULL;
+    }
+    if (parser_start(p, tok, evict) < 0) {
+        parser_free(p);
+        return NULL;
+    }
+    return p;
+}
+
+#define PARSER_CAPSULE_NAME "pegen.Parser"
+
+static void
+parser_capsule_destructor(PyObject *capsule)
+{
+    Parser *p = PyCapsule_GetPointer(capsule, PARSER_CAPSULE_NAME);
+    if (p != NULL) {
+        parser_free(p);
+    }
+}
+
+PyObject *
+new_parser_capsule(void)
+{
+    Parser *p = parser_alloc();
+    if (p == NULL) {
+        return NULL;
+    }
+    PyObject *capsule = PyCapsule_New(p, PARSER_CAPSULE_NAME, parser_capsule_destructor);
+    if (capsule == NULL) {
+        parser_free(p);
+    }
+    return capsule;
+}
+
+// Get the Parser out of a capsule from new_parser_capsule().  None (or NULL)
+// means a fresh Parser for every input, and returns NULL without an error.
+static int
+parser_from_capsule(PyObject *parser, Parser **p)
+{
+    *p = NULL;
+    if (parser == NULL || parser == Py_None) {
+        return 0;
+    }
+    if (!PyCapsule_IsValid(parser, PARSER_CAPSULE_NAME)) {
+        PyErr_SetString(PyExc_TypeError, "parser must be None or a result of new_parser()");
+        return -1;
+    }
+    *p = PyCapsule_GetPointer(parser, PARSER_CAPSULE_NAME);
+    if ((*p)->tok != NULL) {
+        *p = NULL;
+        PyErr_SetString(PyExc_RuntimeError, "parser is already in use");
+        return -1;
+    }
+    return 0;
+}
+
+// Unless report is set, a plain parse failure returns NULL without setting an
+// exception, and the caller is expected to parse again to report the error.
+// If reused is not NULL, the input is parsed with it rather than a new Parser.
+PyObject *
+run_parser(struct tok_state* tok, void *(start_rule_func)(Parser *), int mode, int evict,
+           int report, Parser *reused)
+{
+    PyObject* result = NULL;
+    Parser *p = reused;
+    if (p == NULL) {
+        p = parser_new(tok, evict);
+        if (p == NULL) {
+            return NULL;
+        }
+    }
+    else if (parser_start(p, tok, evict) < 0) {
+        return NULL;
     }
 
     if (fill_token(p) < 0) {
@@ -451,7 +1030,7 @@ run_parser(struct tok_state* tok, void *(start_rule_func)(Parser *), int mode)
 
     void *res = (*start_rule_func)(p);
     if (res == NULL) {
-        if (PyErr_Occurred()) {
+        if (PyErr_Occurred() || !report) {
             goto exit;
         }
         if (p->fill == 0) {
@@ -471,61 +1050,440 @@ run_parser(struct tok_state* tok, void *(start_rule_func)(Parser *), int mode)
     }
 
 exit:
-
-    for (int i = 0; i < p->size; i++) {
-        PyMem_Free(p->tokens[i]);
+    if (reused != NULL) {
+        parser_finish(p);
     }
-    PyMem_Free(p->tokens);
-    if (p->arena != NULL) {
-        PyArena_Free(p->arena);
+    else {
+        parser_free(p);
     }
-    PyMem_Free(p);
     return result;
 }
 
+// Pass the statements in res, a result of the stream rule, to callback.
+static int
+call_stream_callback(Parser *p, void *res, int kind, PyObject *callback)
+{
+    if (kind == STREAM_NONE) {
+        PyObject *r = PyObject_CallFunctionObjArgs(callback, Py_None, NULL);
+        Py_XDECREF(r);
+        return r == NULL ? -1 : 0;
+    }
+    mod_ty module;
+    if (kind == STREAM_MOD) {
+        module = res;
+    }
+    else {
+        asdl_seq *seq = kind == STREAM_SEQ ? res : singleton_seq(p, res);
+        if (seq == NULL) {
+            return -1;
+        }
+        module = Module(seq, NULL, p->arena);
+        if (module == NULL) {
+            return -1;
+        }
+    }
+    PyObject *obj = PyAST_mod2obj(module);
+    if (obj == NULL) {
+        return -1;
+    }
+    PyObject *body = PyObject_GetAttrString(obj, "body");
+    Py_DECREF(obj);
+    if (body == NULL) {
+        return -1;
+    }
+    for (Py_ssize_t i = 0; i < PyList_GET_SIZE(body); i++) {
+        PyObject *r = PyObject_CallFunctionObjArgs(callback, PyList_GET_ITEM(body, i), NULL);
+        if (r == NULL) {
+            Py_DECREF(body);
+            return -1;
+        }
+        Py_DECREF(r);
+    }
+    Py_DECREF(body);
+    return 0;
+}
+
+// Parse one match of the stream rule at a time until ENDMARKER, passing each
+// statement to callback as soon as it is complete.  Tokens and memo entries
+// behind it are released (see commit()) before the callback runs.  A match that
+// consumes no input is a syntax error, or the loop would never end.
 PyObject *
-run_parser_from_file(const char *filename, void *(start_rule_func)(Parser *), int mode)
+run_parser_iter(struct tok_state *tok, void *(stream_rule_func)(Parser *), int kind,
+                PyObject *callback)
 {
-    FILE *fp = fopen(filename, "rb");
-    if (fp == NULL) {
-        PyErr_SetFromErrnoWithFilename(PyExc_OSError, filename);
+    PyObject *result = NULL;
+    Parser *p = parser_new(tok, 0);
+    if (p == NULL) {
         return NULL;
     }
 
-    PyObject *filename_ob = NULL;
-    if ((filename_ob = PyUnicode_FromString(filename)) == NULL)
+    while (1) {
+        if (p->mark == p->fill && fill_token(p) < 0) {
+            goto exit;
+        }
+        if (p->tokens[p->mark]->type == ENDMARKER) {
+            break;
+        }
+        int mark = p->mark;
+        void *res = (*stream_rule_func)(p);
+        if (res == NULL || p->mark == mark) {
+            if (!PyErr_Occurred()) {
+                raise_syntax_error(p, "invalid syntax");
+            }
+            goto exit;
+        }
+        commit(p);
+        if (call_stream_callback(p, res, kind, callback) < 0) {
+            goto exit;
+        }
+    }
+    result = Py_None;
+    Py_INCREF(result);
+
+exit:
+    parser_free(p);
+    return result;
+}
+
+static struct tok_state *
+tokenizer_from_file(const char *filename, FILE **fp)
+{
+    *fp = fopen(filename, "rb");
+    if (*fp == NULL) {
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError, filename);
         return NULL;
+    }
 
-    // From here on we need to clean up even if there's an error
-    PyObject *result = NULL;
+    PyObject *filename_ob = PyUnicode_FromString(filename);
+    if (filename_ob == NULL) {
+        fclose(*fp);
+        return NULL;
+    }
 
-    struct tok_state* tok = PyTokenizer_FromFile(fp, NULL, NULL, NULL);
-    if (tok == NULL)
-        goto error;
+    struct tok_state* tok = PyTokenizer_FromFile(*fp, NULL, NULL, NULL);
+    if (tok == NULL) {
+        Py_DECREF(filename_ob);
+        fclose(*fp);
+        return NULL;
+    }
 
     // Transfers ownership
     tok->filename = filename_ob;
-    filename_ob = NULL;
+    return tok;
+}
+
+// Whether size bytes of source code at data can be tokenized where they are,
+// instead of from the UTF-8 copy with \n line endings (and a newline at the
+// end) that PyTokenizer_FromString() makes.
+static int
+can_tokenize_in_place(const char *data, Py_ssize_t size)
+{
+    if (size == 0 || data[size - 1] != '\n' || memchr(data, '\r', size) != NULL) {
+        return 0;
+    }
+    if (size >= 3 && memcmp(data, "\xEF\xBB\xBF", 3) == 0) {
+        return 0;  // A BOM, which the tokenizer would skip
+    }
+    // A coding declaration can only be in the first two lines; anything that
+    // might be one, other than for UTF-8, needs decoding.
+    const char *end = (const char *)memchr(data, '\n', size) + 1;
+    if (end < data + size) {
+        end = (const char *)memchr(end, '\n', data + size - end) + 1;
+    }
+    for (const char *c = data; c + 6 <= end; c++) {
+        if (memcmp(c, "coding", 6) != 0) {
+            continue;
+        }
+        c += 6;
+        if (*c != ':' && *c != '=') {
+            return 0;
+        }
+        do {
+            c++;
+        } while (*c == ' ' || *c == '\t');
+        if (PyOS_strnicmp(c, "utf", 3) != 0) {
+            return 0;
+        }
+        c += 3;
+        if (*c == '-' || *c == '_') {
+            c++;
+        }
+        if (*c != '8' || Py_ISALNUM(c[1])) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+// A tokenizer for size bytes of source code at data, which must be followed
+// by a NUL byte, be writable and stay put until the tokenizer is freed (the
+// tokenizer writes back bytes it has read, but never changes them).  The data
+// is only copied if it has to be decoded or have its line endings translated.
+static struct tok_state *
+tokenizer_from_memory(const char *data, Py_ssize_t size, PyObject *filename)
+{
+    if (memchr(data, '\0', size) != NULL) {
+        PyErr_SetString(PyExc_ValueError, "source code cannot contain null bytes");
+        return NULL;
+    }
+    struct tok_state *tok;
+    if (can_tokenize_in_place(data, size)) {
+        // Set up for an empty string, then point the tokenizer at the data
+        // instead; it reads a string one line at a time, up to the NUL byte.
+        tok = PyTokenizer_FromUTF8("", 1);
+        if (tok == NULL) {
+            return NULL;
+        }
+        tok->buf = tok->cur = tok->inp = tok->end = (char *)data;
+        tok->str = data;
+    }
+    else {
+        tok = PyTokenizer_FromString(data, 1);
+        if (tok == NULL) {
+            return NULL;
+        }
+    }
+    Py_XINCREF(filename);
+    tok->filename = filename;
+    return tok;
+}
+
+// The parser argument of these is None, or a capsule from new_parser_capsule()
+// to parse with instead of a new Parser.
+PyObject *
+run_parser_from_file(const char *filename, void *(start_rule_func)(Parser *), int mode, int evict,
+                     PyObject *parser)
+{
+    Parser *p;
+    if (parser_from_capsule(parser, &p) < 0) {
+        return NULL;
+    }
+    FILE *fp;
+    struct tok_state* tok = tokenizer_from_file(filename, &fp);
+    if (tok == NULL) {
+        return NULL;
+    }
+
+    PyObject *result = run_parser(tok, start_rule_func, mode, evict, 1, p);
+
+    PyTokenizer_Free(tok);
+    fclose(fp);
+    return result;
+}
+
+PyObject *
+run_parser_from_string(const char* str, void *(start_rule_func)(Parser *), int mode, int evict,
+                       PyObject *parser)
+{
+    Parser *p;
+    if (parser_from_capsule(parser, &p) < 0) {
+        return NULL;
+    }
+    struct tok_state* tok = PyTokenizer_FromString(str, 1);
+
+    if (tok == NULL)
+        return NULL;
+
+    PyObject* result = run_parser(tok, start_rule_func, mode, evict, 1, p);
+    PyTokenizer_Free(tok);
+    return result;
+}
+
+// The two-phase variants first parse evicting at every commit point, and
+// without building a SyntaxError.  Only if that fails do they parse again
+// from the start, keeping every token, to report the error; this also
+// rescues inputs that only failed because the first pass backtracked
+// behind a commit point.
+PyObject *
+run_parser_two_phase_from_file(const char *filename, void *(start_rule_func)(Parser *), int mode,
+                               PyObject *parser)
+{
+    Parser *p;
+    if (parser_from_capsule(parser, &p) < 0) {
+        return NULL;
+    }
+    FILE *fp;
+    struct tok_state* tok = tokenizer_from_file(filename, &fp);
+    if (tok == NULL) {
+        return NULL;
+    }
+
+    PyObject *result = run_parser(tok, start_rule_func, mode, 1, 0, p);
+
+    PyTokenizer_Free(tok);
+    fclose(fp);
+    if (result != NULL || PyErr_Occurred()) {
+        return result;
+    }
+    return run_parser_from_file(filename, start_rule_func, mode, 0, parser);
+}
+
+PyObject *
+run_parser_two_phase_from_string(const char *str, void *(start_rule_func)(Parser *), int mode,
+                                 PyObject *parser)
+{
+    Parser *p;
+    if (parser_from_capsule(parser, &p) < 0) {
+        return NULL;
+    }
+    struct tok_state* tok = PyTokenizer_FromString(str, 1);
 
-    result = run_parser(tok, start_rule_func, mode);
+    if (tok == NULL)
+        return NULL;
 
+    PyObject* result = run_parser(tok, start_rule_func, mode, 1, 0, p);
     PyTokenizer_Free(tok);
+    if (result != NULL || PyErr_Occurred()) {
+        return result;
+    }
+    return run_parser_from_string(str, start_rule_func, mode, 0, parser);
+}
+
+// Parse source code in memory, followed by a NUL byte; two_phase is as for
+// run_parser_two_phase_from_string().
+static PyObject *
+run_parser_from_memory(const char *data, Py_ssize_t size, PyObject *filename,
+                       void *(start_rule_func)(Parser *), int mode, int evict, int two_phase,
+                       PyObject *parser)
+{
+    Parser *p;
+    if (parser_from_capsule(parser, &p) < 0) {
+        return NULL;
+    }
+    struct tok_state *tok = tokenizer_from_memory(data, size, filename);
+    if (tok == NULL) {
+        return NULL;
+    }
 
- error:
+    PyObject *result = run_parser(tok, start_rule_func, mode, evict || two_phase, !two_phase, p);
+    PyTokenizer_Free(tok);
+    if (!two_phase || result != NULL || PyErr_Occurred()) {
+        return result;
+    }
+    return run_parser_from_memory(data, size, filename, start_rule_func, mode, 0, 0, parser);
+}
+
+// Parse the contents of an object supporting the buffer protocol.  A bytes
+// object is tokenized in place when it can be; anything else is first copied
+// once, to put a NUL byte after it.
+PyObject *
+run_parser_from_buffer(PyObject *buffer, void *(start_rule_func)(Parser *), int mode, int evict,
+                       int two_phase, PyObject *parser)
+{
+    Py_buffer view;
+    if (PyObject_GetBuffer(buffer, &view, PyBUF_SIMPLE) < 0) {
+        return NULL;
+    }
+    const char *data = view.buf;
+    char *copy = NULL;
+    if (!PyBytes_Check(buffer)) {
+        copy = PyMem_Malloc(view.len + 1);
+        if (copy == NULL) {
+            PyBuffer_Release(&view);
+            return PyErr_NoMemory();
+        }
+        memcpy(copy, view.buf, view.len);
+        copy[view.len] = '\0';
+        data = copy;
+    }
+
+    PyObject *result = run_parser_from_memory(data, view.len, NULL, start_rule_func, mode, evict,
+                                              two_phase, parser);
+    PyMem_Free(copy);
+    PyBuffer_Release(&view);
+    return result;
+}
+
+// Parse a file by mapping it into memory, instead of reading it a line at a
+// time.  It falls back to that for anything but a regular file, or where there
+// is no mmap().  The file must not be truncated while it is parsed.
+PyObject *
+run_parser_from_mapped_file(const char *filename, void *(start_rule_func)(Parser *), int mode,
+                            int evict, int two_phase, PyObject *parser)
+{
+#if defined(HAVE_MMAP) && defined(MAP_ANONYMOUS)
+    int fd = open(filename, O_RDONLY | O_CLOEXEC);
+    if (fd < 0) {
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError, filename);
+        return NULL;
+    }
+    struct stat st;
+    if (fstat(fd, &st) < 0) {
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError, filename);
+        close(fd);
+        return NULL;
+    }
+    if (!S_ISREG(st.st_mode) || st.st_size == 0) {
+        close(fd);
+        goto read_lines;
+    }
+
+    // Reserve zeroed pages for at least one byte more than the file, and map
+    // the file over the start of them; the rest of its last page reads as
+    // zeros too.  This gives the tokenizer its NUL byte at the end.  The file
+    // is mapped writable but private, as tok_backup() stores the bytes it
+    // backs up over (always unchanged) back into the buffer.
+    size_t page_size = (size_t)sysconf(_SC_PAGESIZE);
+    size_t length = ((size_t)st.st_size / page_size + 1) * page_size;
+    char *data = mmap(NULL, length, PROT_READ, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (data == MAP_FAILED) {
+        close(fd);
+        goto read_lines;
+    }
+    if (mmap(data, st.st_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_FIXED, fd, 0)
+            == MAP_FAILED) {
+        munmap(data, length);
+        close(fd);
+        goto read_lines;
+    }
+    close(fd);
+
+    PyObject *filename_ob = PyUnicode_FromString(filename);
+    if (filename_ob == NULL) {
+        munmap(data, length);
+        return NULL;
+    }
+    PyObject *result = run_parser_from_memory(data, st.st_size, filename_ob, start_rule_func, mode,
+                                              evict, two_phase, parser);
+    Py_DECREF(filename_ob);
+    munmap(data, length);
+    return result;
+
+read_lines:
+#endif
+    if (two_phase) {
+        return run_parser_two_phase_from_file(filename, start_rule_func, mode, parser);
+    }
+    return run_parser_from_file(filename, start_rule_func, mode, evict, parser);
+}
+
+PyObject *
+run_parser_iter_from_file(const char *filename, void *(stream_rule_func)(Parser *), int kind,
+                          PyObject *callback)
+{
+    FILE *fp;
+    struct tok_state* tok = tokenizer_from_file(filename, &fp);
+    if (tok == NULL) {
+        return NULL;
+    }
+
+    PyObject *result = run_parser_iter(tok, stream_rule_func, kind, callback);
+
+    PyTokenizer_Free(tok);
     fclose(fp);
-    Py_XDECREF(filename_ob);
     return result;
 }
 
 PyObject *
-run_parser_from_string(const char* str, void *(start_rule_func)(Parser *), int mode)
+run_parser_iter_from_string(const char *str, void *(stream_rule_func)(Parser *), int kind,
+                            PyObject *callback)
 {
     struct tok_state* tok = PyTokenizer_FromString(str, 1);
 
     if (tok == NULL)
         return NULL;
 
-    PyObject* result = run_parser(tok, start_rule_func, mode);
+    PyObject* result = run_parser_iter(tok, stream_rule_func, kind, callback);
     PyTokenizer_Free(tok);
     return result;
 }
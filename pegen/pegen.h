@@ -18,12 +18,27 @@ typedef struct {
     Memo *memo;
 } Token;
 
+// Memo entries are allocated this many at a time, and outlive the arena so
+// that a reused Parser keeps them.
+#define MEMO_BLOCK_SIZE 256
+
+typedef struct _memo_block {
+    struct _memo_block *next;
+    Memo memo[MEMO_BLOCK_SIZE];
+} MemoBlock;
+
 typedef struct {
     struct tok_state *tok;
     Token **tokens;
     int mark;
     int fill, size;
     PyArena *arena;
+    int evict;  // Discard memo entries and token bytes at commit points
+    int evicted;  // Tokens before this one have been evicted
+    Memo *free_memo;  // Evicted memo entries, reused by insert_memo()
+    MemoBlock *memo_blocks;  // Where all memo entries live
+    MemoBlock *memo_block;  // The block new memo entries come from
+    int memo_used;  // Number of entries of memo_block handed out
 } Parser;
 
 typedef struct {
@@ -64,6 +79,8 @@ typedef struct {
 int insert_memo(Parser *p, int mark, int type, void *node);
 int update_memo(Parser *p, int mark, int type, void *node);
 int is_memoized(Parser *p, int type, void *pres);
+void commit(Parser *p);
+int cut(Parser *p);
 
 int lookahead_with_string(int, void *(func)(Parser *, const char *), Parser *, const char *);
 int lookahead_with_int(int, Token *(func)(Parser *, int), Parser *, int);
@@ -84,14 +101,60 @@ expr_ty string_token(Parser *p);
 void *keyword_token(Parser *p, const char *val);
 int raise_syntax_error(Parser *p, const char *errmsg, ...);
 
+// The tokens a lexer generated from the grammar (see pegen.lexer_generator)
+// looks for, besides the literals.
+#define LEX_NAMES 1
+#define LEX_NUMBERS 2
+#define LEX_STRINGS 4
+#define LEX_NEWLINES 8
+#define LEX_INDENTS 16
+#define LEX_ASYNC 32  // async and await are ASYNC and AWAIT tokens, not names
+
+typedef struct {
+    int flags;  // LEX_* flags
+    // The length of the literal at c, setting *type to its token type; 0 if
+    // there is none.
+    int (*match_literal)(const char *c, int *type);
+} LexerSpec;
+
+// Get the next token like PyTokenizer_Get(), but using spec rather than
+// CPython's tokenizer.
+int run_lexer(struct tok_state *tok, const LexerSpec *spec, char **p_start, char **p_end);
+// The lexer fill_token() uses, if not NULL; set by parsers built with one.
+extern const LexerSpec *lexer_spec;
+
 void *CONSTRUCTOR(Parser *p, ...);
 
 #define UNUSED(expr) do { (void)(expr); } while (0)
 #define EXTRA_EXPR(head, tail) head->lineno, head->col_offset, tail->end_lineno, tail->end_col_offset, p->arena
 #define EXTRA start_lineno, start_col_offset, end_lineno, end_col_offset, p->arena
 
-PyObject *run_parser_from_file(const char *filename, void *(start_rule_func)(Parser *), int mode);
-PyObject *run_parser_from_string(const char *str, void *(start_rule_func)(Parser *), int mode);
+// A Parser wrapped in a capsule, to pass as the parser argument below (or None).
+PyObject *new_parser_capsule(void);
+
+PyObject *run_parser_from_file(const char *filename, void *(start_rule_func)(Parser *), int mode,
+                               int evict, PyObject *parser);
+PyObject *run_parser_from_string(const char *str, void *(start_rule_func)(Parser *), int mode,
+                                 int evict, PyObject *parser);
+PyObject *run_parser_two_phase_from_file(const char *filename, void *(start_rule_func)(Parser *),
+                                        int mode, PyObject *parser);
+PyObject *run_parser_two_phase_from_string(const char *str, void *(start_rule_func)(Parser *),
+                                          int mode, PyObject *parser);
+PyObject *run_parser_from_buffer(PyObject *buffer, void *(start_rule_func)(Parser *), int mode,
+                                 int evict, int two_phase, PyObject *parser);
+PyObject *run_parser_from_mapped_file(const char *filename, void *(start_rule_func)(Parser *),
+                                      int mode, int evict, int two_phase, PyObject *parser);
+
+// What the stream rule returns, for run_parser_iter_*().
+#define STREAM_NONE 0  // No AST; the callback gets None for each match
+#define STREAM_STMT 1  // A stmt_ty
+#define STREAM_SEQ 2  // An asdl_seq * of stmt_ty
+#define STREAM_MOD 3  // A mod_ty whose body holds the statements
+
+PyObject *run_parser_iter_from_file(const char *filename, void *(stream_rule_func)(Parser *),
+                                    int kind, PyObject *callback);
+PyObject *run_parser_iter_from_string(const char *str, void *(stream_rule_func)(Parser *),
+                                      int kind, PyObject *callback);
 asdl_seq *singleton_seq(Parser *, void *);
 asdl_seq *seq_insert_in_front(Parser *, void *, asdl_seq *);
 asdl_seq *seq_flatten(Parser *, asdl_seq *);
@@ -1,4 +1,11 @@
-from typing import Any, Dict, List, Optional, IO, Text, Tuple
+import ast
+import io
+import keyword
+import token
+
+from typing import Any, Dict, List, Optional, IO, Set, Text, Tuple
+
+from pegen.tokenizer import exact_token_types
 
 from pegen.grammar import (
     Cut,
@@ -19,7 +26,8 @@ from pegen.grammar import (
     Alt,
 )
 from pegen import grammar
-from pegen.parser_generator import dedupe, ParserGenerator
+from pegen.lexer_generator import python_lexer
+from pegen.parser_generator import dedupe, LeftRecLoop, ParserGenerator, ANY, EMPTY
 
 MODULE_PREFIX = """\
 #!/usr/bin/env python3.8
@@ -29,10 +37,67 @@ import ast
 import sys
 import tokenize
 
+from inspect import unwrap
 from typing import Any, Optional
 
 from pegen.parser import memoize, memoize_left_rec, logger, Parser
+from pegen.parser import memoize_rule, memoize_left_rec_rule, sync_rule
+from pegen.parser import untraced_memoize_rule, untraced_memoize_left_rec_rule
+from pegen.parser import UntracedParser, TracedParserMixin
+
+"""
+
+# With mypyc=True, rules have no decorators.
+MYPYC_MODULE_PREFIX = """\
+#!/usr/bin/env python3.8
+# @generated by pegen from {filename}
+
+import ast
+import sys
+import tokenize
+
+from typing import Any, Callable, Iterator, Optional, final
+
+from pegen.parser import UntracedParser
+from pegen.tokenizer import EVICTED_MEMO
+
+"""
+
+# Token matchers for mypyc=True, compiled with the rules that call them.  Like
+# the rules, they set the tokenizer's index directly.
+MYPYC_TOKEN_METHODS = f"""
+def name(self) -> Optional[tokenize.TokenInfo]:
+    tokenizer = self._tokenizer
+    tok = tokenizer.peek()
+    if tok.type == {token.NAME} and tok.string not in self._reserved:  # token.NAME
+        tokenizer._index += 1
+        return tok
+    return None
+
+def number(self) -> Optional[tokenize.TokenInfo]:
+    return self.expect_type({token.NUMBER})  # token.NUMBER
+
+def string(self) -> Optional[tokenize.TokenInfo]:
+    return self.expect_type({token.STRING})  # token.STRING
+
+def op(self) -> Optional[tokenize.TokenInfo]:
+    return self.expect_type({token.OP})  # token.OP
 
+def expect_type(self, type: int) -> Optional[tokenize.TokenInfo]:
+    tokenizer = self._tokenizer
+    tok = tokenizer.peek()
+    if tok.type == type:
+        tokenizer._index += 1
+        return tok
+    return None
+
+def expect_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+    tokenizer = self._tokenizer
+    tok = tokenizer.peek()
+    if tok.string == string:
+        tokenizer._index += 1
+        return tok
+    return None
 """
 MODULE_SUFFIX = """
 
@@ -40,6 +105,48 @@ if __name__ == '__main__':
     from pegen.parser import simple_parser_main
     simple_parser_main(GeneratedParser)
 """
+UNTRACED_MODULE_SUFFIX = """
+
+if __name__ == '__main__':
+    from pegen.parser import simple_parser_main
+    simple_parser_main(GeneratedParser, TracedGeneratedParser)
+"""
+
+
+# Tokens matched by a Parser method of the same name, lowercased.
+TOKEN_METHODS = ("NAME", "NUMBER", "STRING", "OP")
+# Tokens matched by Parser.expect_type().
+TOKEN_TYPES = ("NEWLINE", "DEDENT", "INDENT", "ENDMARKER", "ASYNC", "AWAIT", "TYPE_COMMENT")
+
+
+def first_tokens(
+    first: Set[str], reserved_keywords: bool = False
+) -> Optional[Tuple[Set[int], List[str]]]:
+    """Return the token types and strings that an alternative can start with.
+
+    *first* is the FIRST set of the alternative.  There are none if it can
+    match without consuming a token, or if it can start with a token that
+    is not matched by type or string.  The strings are string literals.
+    If keywords are reserved, NAME does not include them, so the keywords
+    are kept with the strings.
+    """
+    if EMPTY in first or ANY in first:
+        return None
+    types = set()
+    strings = []
+    for terminal in sorted(first):
+        if terminal in TOKEN_METHODS or terminal in TOKEN_TYPES:
+            types.add(getattr(token, terminal))
+        elif terminal[0] in "'\"":
+            strings.append(terminal)
+        else:
+            return None
+    # Keywords are NAME tokens, and operators are OP tokens.
+    if token.NAME in types and not reserved_keywords:
+        strings = [s for s in strings if not ast.literal_eval(s).isidentifier()]
+    if token.OP in types:
+        strings = [s for s in strings if ast.literal_eval(s) not in exact_token_types]
+    return types, strings
 
 
 class PythonCallMakerVisitor(GrammarVisitor):
@@ -49,15 +156,19 @@ class PythonCallMakerVisitor(GrammarVisitor):
 
     def visit_NameLeaf(self, node: NameLeaf) -> Tuple[Optional[str], str]:
         name = node.value
-        if name in ("NAME", "NUMBER", "STRING", "OP"):
+        if name in TOKEN_METHODS:
             name = name.lower()
             return name, f"self.{name}()"
-        if name in ("NEWLINE", "DEDENT", "INDENT", "ENDMARKER", "ASYNC", "AWAIT"):
-            return name.lower(), f"self.expect({name!r})"
+        if name in TOKEN_TYPES:
+            call = f"self.expect_type({getattr(token, name)})"
+            name = name.lower()
+            if keyword.iskeyword(name):  # async and await
+                name += "_"
+            return name, call
         return name, f"self.{name}()"
 
     def visit_StringLeaf(self, node: StringLeaf) -> Tuple[str, str]:
-        return "literal", f"self.expect({node.value})"
+        return "literal", f"self.expect_string({node.value})"
 
     def visit_Rhs(self, node: Rhs) -> Tuple[Optional[str], str]:
         if node in self.cache:
@@ -119,92 +230,501 @@ class PythonCallMakerVisitor(GrammarVisitor):
         return self.visit(node.rhs)
 
     def visit_Cut(self, node: Cut) -> Tuple[str, str]:
-        return "cut", "True"
+        return "cut", "self.cut()"
 
 
 class PythonParserGenerator(ParserGenerator, GrammarVisitor):
-    def __init__(self, grammar: grammar.Grammar, file: Optional[IO[Text]]):
-        super().__init__(grammar, file)
+    def __init__(
+        self,
+        grammar: grammar.Grammar,
+        file: Optional[IO[Text]],
+        *,
+        dict_memo: bool = False,
+        selective_memo: bool = False,
+        untraced: bool = False,
+        lexer: bool = False,
+        nodes: str = "list",
+        inline_size: int = 3,
+        mypyc: bool = False,
+    ):
+        super().__init__(grammar, file, selective_memo=selective_memo, inline_size=inline_size)
+        if dict_memo and untraced:
+            raise ValueError("untraced parsers always use the memo table")
+        if mypyc and (dict_memo or untraced or nodes != "list"):
+            raise ValueError("mypyc parsers are untraced, use the memo table and return lists")
+        if nodes not in ("list", "slots", "tuple"):
+            raise ValueError(f"nodes must be 'list', 'slots' or 'tuple', not {nodes!r}")
         self.callmakervisitor = PythonCallMakerVisitor(self)
+        # By default rules are memoized in the per-position memo table under
+        # a dense integer id; dict_memo falls back to the flat Parser._cache.
+        self.dict_memo = dict_memo
+        self.rule_ids: Dict[str, int] = {}
+        # With untraced, GeneratedParser has no tracing support at all, and
+        # a TracedGeneratedParser subclass re-decorates its rules for -v.
+        self.untraced = untraced
+        self.generated_rules: List[Rule] = []
+        # With mypyc, the module is meant to be compiled by mypyc (see
+        # pegen.build.compile_mypyc_extension()).  GeneratedParser is a final
+        # untraced parser whose rules memoize themselves instead of being
+        # decorated, and whose variables are all declared, as Any: the
+        # names that the rule being generated binds are kept here.
+        self.mypyc = mypyc
+        self.local_names: Dict[str, None] = {}
+        # With lexer, the module has a lexer for the grammar's tokens (see
+        # pegen.lexer_generator), which GeneratedParser.generate_tokens() uses.
+        self.lexer = lexer
+        # Unless nodes is "list", alternatives without an action return
+        # instances of node classes (see pegen.nodes), named after their
+        # rule; those of the grammar's rules are named here, in case they
+        # end up in a helper rule.
+        self.nodes = nodes
+        if nodes != "list":
+            # A node needs the span of the group; keep its helper rule.
+            self.inline_groups = {rhs for rhs in self.inline_groups if rhs.alts[0].action}
+        self.node_names: Dict[Alt, str] = {}
+        self.node_fields: Dict[str, List[str]] = {}
+        for rule in self.rules.values():
+            self.name_nodes(rule)
+
+    def name_nodes(self, rule: Rule) -> None:
+        alts = rule.flatten().alts
+        for i, alt in enumerate(alts, 1):
+            self.node_names.setdefault(alt, f"{rule.name}_node{i if len(alts) > 1 else ''}")
+
+    def memoize_decorator(self, node: Rule, decorator: str, traced: bool) -> str:
+        if self.dict_memo:
+            return decorator
+        rule_id = self.rule_ids.setdefault(node.name, len(self.rule_ids))
+        if not traced:
+            decorator = "untraced_" + decorator
+        return f"{decorator}_rule({rule_id})"
+
+    def rule_decorators(self, node: Rule, traced: bool) -> List[str]:
+        decorators = []
+        if node.name in self.sync_rules:
+            decorators.append("sync_rule")
+        if self.grows_seed(node):
+            decorators.append(self.memoize_decorator(node, "memoize_left_rec", traced))
+        elif self.should_memoize(node):
+            decorators.append(self.memoize_decorator(node, "memoize", traced))
+        elif traced:
+            # Rules that are not memoized (including non-leader rules
+            # in a cycle) must still be logged.
+            decorators.append("logger")
+        return decorators
 
     def generate(self, filename: str) -> None:
-        header = self.grammar.metas.get("header", MODULE_PREFIX)
+        header = self.grammar.metas.get(
+            "header", MYPYC_MODULE_PREFIX if self.mypyc else MODULE_PREFIX
+        )
         if header is not None:
             self.print(header.rstrip("\n").format(filename=filename))
         subheader = self.grammar.metas.get("subheader", "")
         if subheader:
             self.print(subheader.format(filename=filename))
-        self.print("class GeneratedParser(Parser):")
+        if self.nodes == "slots":
+            self.print("from pegen.nodes import Node")
+        elif self.nodes == "tuple":
+            self.print("from pegen.nodes import field, TupleNode")
+        if self.lexer:
+            self.print()
+            self.printblock(python_lexer(self.grammar))
+            self.print()
+            self.print()
+        if self.mypyc:
+            self.print("@final")
+        if self.untraced or self.mypyc:
+            self.print("class GeneratedParser(UntracedParser):")
+        else:
+            self.print("class GeneratedParser(Parser):")
+        if self.lexer and not self.mypyc:
+            with self.indent():
+                self.print("generate_tokens = staticmethod(generate_tokens)")
+        if self.stream_rule != "start":
+            with self.indent():
+                self.print(f"_stream_rule = {self.stream_rule!r}")
+        if self.keywords:
+            with self.indent():
+                keywords = ", ".join(map(repr, sorted(self.keywords)))
+                self.print(f"KEYWORDS = frozenset({{{keywords}}})")
+                if self.reserved_keywords and self.mypyc:
+                    # A compiled class body cannot refer to its own names.
+                    self.print(f"_reserved = frozenset({{{keywords}}})")
+                elif self.reserved_keywords:
+                    self.print("_reserved = KEYWORDS")
+        if self.lexer and self.mypyc:
+            # mypyc only compiles staticmethod() as a decorator.
+            self.print()
+            with self.indent():
+                self.print("@staticmethod")
+                self.print(
+                    "def generate_tokens(readline: Callable[[], str])"
+                    " -> Iterator[tokenize.TokenInfo]:"
+                )
+                with self.indent():
+                    self.print("return lexer.generate_tokens(readline)")
+        if self.mypyc:
+            with self.indent():
+                self.printblock(MYPYC_TOKEN_METHODS)
         while self.todo:
             for rulename, rule in list(self.todo.items()):
                 del self.todo[rulename]
                 self.print()
                 with self.indent():
                     self.visit(rule)
-        trailer = self.grammar.metas.get("trailer", MODULE_SUFFIX)
+        if self.untraced:
+            self.generate_traced_subclass()
+        for name, fields in self.node_fields.items():
+            self.generate_node_class(name, fields)
+        if self.untraced:
+            trailer = self.grammar.metas.get("trailer", UNTRACED_MODULE_SUFFIX)
+        else:
+            trailer = self.grammar.metas.get("trailer", MODULE_SUFFIX)
         if trailer is not None:
             self.print(trailer.rstrip("\n"))
 
+    def generate_traced_subclass(self) -> None:
+        self.print()
+        self.print()
+        self.print("class TracedGeneratedParser(TracedParserMixin, GeneratedParser):")
+        with self.indent():
+            self.print('"""GeneratedParser with tracing support, for verbose runs."""')
+            self.print()
+            for rule in self.generated_rules:
+                call = f"unwrap(GeneratedParser.{rule.name})"
+                for decorator in reversed(self.rule_decorators(rule, traced=True)):
+                    call = f"{decorator}({call})"
+                self.print(f"{rule.name} = {call}")
+
+    def generate_node_class(self, name: str, fields: List[str]) -> None:
+        self.print()
+        self.print()
+        if self.nodes == "tuple":
+            self.print(f"class {name}(TupleNode):")
+            with self.indent():
+                self.print("__slots__ = ()")
+                self.print(f"_fields = {tuple(fields)!r}")
+                for i, field in enumerate(fields):
+                    self.print(f"{field} = field({i})")
+            return
+        self.print(f"class {name}(Node):")
+        with self.indent():
+            self.print(f"__slots__ = _fields = {tuple(fields)!r}")
+            self.print()
+            self.print(f"def __init__({', '.join(['self', *fields, 'start', 'end'])}):")
+            with self.indent():
+                for field in [*fields, "start", "end"]:
+                    self.print(f"self.{field} = {field}")
+
+    def alt_guard(self, node: Alt) -> Optional[str]:
+        """Return a test on _next_token that is false when *node* cannot match.
+
+        The test is built from the FIRST set of the alternative; there is
+        none if first_tokens() finds nothing to test.
+        """
+        first = first_tokens(self.first_set(node), self.reserved_keywords)
+        if first is None:
+            return None
+        types, strings = first
+        tests = []
+        if self.reserved_keywords and token.NAME in types:
+            types.remove(token.NAME)
+            tests.append(
+                f"(_next_token.type == {token.NAME} and _next_token.string not in self._reserved)"
+            )
+        if len(types) == 1:
+            tests.append(f"_next_token.type == {types.pop()}")
+        elif types:
+            tests.append(f"_next_token.type in {{{', '.join(map(str, sorted(types)))}}}")
+        if len(strings) == 1:
+            tests.append(f"_next_token.string == {strings[0]}")
+        elif strings:
+            tests.append(f"_next_token.string in {{{', '.join(strings)}}}")
+        if len(tests) == 1:
+            return tests[0]
+        return f"({' or '.join(tests)})"
+
     def visit_Rule(self, node: Rule) -> None:
         is_loop = node.is_loop()
         is_gather = node.is_gather()
         rhs = node.flatten()
-        if node.left_recursive:
-            if node.leader:
-                self.print("@memoize_left_rec")
-            else:
-                # Non-leader rules in a cycle are not memoized,
-                # but they must still be logged.
-                self.print("@logger")
-        else:
-            self.print("@memoize")
+        # Skip alternatives that cannot start with the next token.
+        guarded = (
+            not is_loop
+            and len(rhs.alts) > 1
+            and any(self.alt_guard(alt) is not None for alt in rhs.alts)
+        )
+        self.generated_rules.append(node)
+        self.name_nodes(node)
         node_type = node.type or "Any"
-        self.print(f"def {node.name}(self) -> Optional[{node_type}]:")
+        name = node.name
+        if not self.mypyc:
+            for decorator in self.rule_decorators(node, traced=not self.untraced):
+                self.print(f"@{decorator}")
+        elif self.print_memo_method(node, node_type):
+            name += "_unmemoized"
+        self.print(f"def {name}(self) -> Optional[{node_type}]:")
         with self.indent():
             self.print(f"# {node.name}: {rhs}")
             if node.nullable:
                 self.print(f"# nullable={node.nullable}")
-            self.print("mark = self.mark()")
-            if is_loop:
-                self.print("children = []")
-            self.visit(rhs, is_loop=is_loop, is_gather=is_gather)
-            if is_loop:
-                self.print("return children")
+            if not self.mypyc:
+                self.print_rule_body(node, rhs, is_loop, is_gather, guarded)
+                return
+            # Declare the variables up front, now that they are known.
+            body = io.StringIO()
+            file, self.file = self.file, body
+            self.local_names.clear()
+            self.print_rule_body(node, rhs, is_loop, is_gather, guarded)
+            self.file = file
+            for local_name in self.local_names:
+                self.print(f"{local_name}: Any")
+            print(body.getvalue(), end="", file=self.file)
+
+    def print_rule_body(
+        self, node: Rule, rhs: Rhs, is_loop: bool, is_gather: bool, guarded: bool
+    ) -> None:
+        # Read the position directly; self.mark() would be a call.
+        self.print("_tokenizer = self._tokenizer")
+        self.print("_mark = _tokenizer._index")
+        if node.name in self.left_rec_loops:
+            self.print_left_rec_loop(self.left_rec_loops[node.name])
+            return
+        if guarded:
+            self.print("_next_token = _tokenizer.peek()")
+        if is_loop:
+            self.local_names["_children"] = None
+            self.print("_children = []")
+            self.print("_append = _children.append")
+        self.visit(rhs, is_loop=is_loop, is_gather=is_gather, guarded=guarded)
+        if is_loop:
+            self.print("return _children")
+        else:
+            self.print("return None")
+
+    def print_memo_method(self, node: Rule, node_type: str) -> bool:
+        """Print a method that memoizes and syncs a rule, for mypyc.
+
+        It does what the decorators otherwise do, calling the rule's own
+        method, which has "_unmemoized" added to its name.  There is no such
+        method, and False is returned, if the rule is neither memoized nor
+        a sync rule.
+        """
+        grows_seed = self.grows_seed(node)
+        memoize = grows_seed or self.should_memoize(node)
+        sync = node.name in self.sync_rules
+        if not memoize and not sync:
+            return False
+        call = f"self.{node.name}_unmemoized()"
+        self.print(f"def {node.name}(self) -> Optional[{node_type}]:")
+        with self.indent():
+            if not memoize:
+                self.print(f"tree = {call}")
             else:
-                self.print("return None")
+                rule_id = self.rule_ids.setdefault(node.name, len(self.rule_ids))
+                self.print("tokenizer = self._tokenizer")
+                if grows_seed:
+                    self.print("mark = tokenizer._index")
+                    self.print("memo = tokenizer._memo[mark]")
+                else:
+                    self.print("memo = tokenizer._memo[tokenizer._index]")
+                self.print(f"if {rule_id} in memo:")
+                with self.indent():
+                    self.print(f"tree, tokenizer._index = memo[{rule_id}]")
+                if grows_seed:
+                    self.print("elif memo is EVICTED_MEMO:")
+                    with self.indent():
+                        self.print("tree = None")
+                self.print("else:")
+                with self.indent():
+                    if grows_seed:
+                        self.print_grow_seed(rule_id, call)
+                    else:
+                        self.print(f"tree = {call}")
+                        self.print(f"memo[{rule_id}] = tree, tokenizer._index")
+            if sync:
+                self.print("if tree is not None and self._evict:")
+                with self.indent():
+                    self.print("self.commit()")
+            self.print("return tree")
+        self.print()
+        return True
+
+    def print_grow_seed(self, rule_id: int, call: str) -> None:
+        # Like memoize_left_rec(), prime the memo with a failure and call
+        # the rule again for as long as it matches more.
+        self.print(f"memo[{rule_id}] = tree, lastmark = None, mark")
+        self.print("while True:")
+        with self.indent():
+            self.print("tokenizer._index = mark")
+            self.print(f"result = {call}")
+            self.print("endmark = tokenizer._index")
+            self.print("if not result or endmark <= lastmark:")
+            with self.indent():
+                self.print("break")
+            self.print(f"memo[{rule_id}] = tree, lastmark = result, endmark")
+        self.print("tokenizer._index = lastmark")
+
+    def print_left_rec_loop(self, loop: LeftRecLoop) -> None:
+        # Like memoize_left_rec(), stop at the first step that fails or
+        # returns a false value, and return the previous result.
+        guarded = len(loop.alts) > 1 and any(
+            self.alt_guard(Alt(alt.items[1:])) is not None for alt in loop.alts
+        )
+        if self.nodes != "list":
+            # The span of a node starts with the result so far.
+            self.print("_start_mark = _mark")
+        self.local_names.update(dict.fromkeys(["_lastresult", "_result"]))
+        self.print("_lastresult = None")
+        self.print(f"_result = self.{loop.seed}()")
+        self.print("while _result:")
+        with self.indent():
+            self.print("_lastresult, _mark = _result, _tokenizer._index")
+            if guarded:
+                self.print("_next_token = _tokenizer.peek()")
+            for alt in loop.alts:
+                self.visit(alt, is_loop=False, is_gather=False, guarded=guarded, left_rec=True)
+            self.print("break")
+        self.print_reset()
+        self.print("return _lastresult")
 
-    def visit_NamedItem(self, node: NamedItem, names: List[str]) -> None:
+    def print_reset(self) -> None:
+        # Untraced and mypyc parsers set the index directly, like the decorators;
+        # otherwise self.reset() lets a verbose tokenizer report it.
+        if self.untraced or self.mypyc:
+            self.print("_tokenizer._index = _mark")
+        else:
+            self.print("if _tokenizer._index != _mark: self.reset(_mark)")
+
+    def visit_NamedItem(
+        self,
+        node: NamedItem,
+        names: List[str],
+        value: Optional[str] = None,
+        is_loop_result: bool = False,
+        prefix: str = "",
+    ) -> None:
         name, call = self.callmakervisitor.visit(node.item)
+        group = None
+        if value is not None:
+            # Bind the name to an already matched value.
+            call = value
+        else:
+            group = self.inline_group(node.item)
         if node.name:
             name = node.name
         if not name:
             self.print(call)
         else:
             if name != "cut":
-                name = dedupe(name, names)
-            self.print(f"({name} := {call})")
+                name = prefix + dedupe(name, names)
+                self.local_names[name] = None
+            if group is not None:
+                self.print_inline_group(name, *group)
+            elif is_loop_result:
+                # A loop matches even when it returns no children.
+                self.print(f"({name} := {call}) is not None")
+            else:
+                self.print(f"({name} := {call})")
 
-    def visit_Rhs(self, node: Rhs, is_loop: bool = False, is_gather: bool = False) -> None:
+    def print_inline_group(self, name: str, helper: str, node: Alt, optional: bool) -> None:
+        # Match the items of the group's helper rule, binding them to names
+        # prefixed with the helper's, and bind name to what it would return.
+        prefix = f"{helper}_"
+        names: List[str] = []
+        for item in node.items:
+            item_name = item.name or self.callmakervisitor.visit(item.item)[0]
+            if item_name:
+                dedupe(item_name, names)
+        if node.action:
+            value = prefix + node.action.strip()
+        else:
+            value = f"[{', '.join(prefix + name for name in names)}]"
+        names = []
+        if not optional:
+            for item in node.items:
+                self.visit(item, names=names, prefix=prefix)
+                self.print("and")
+            self.print(f"({name} := {value})")
+            return
+        # Without a match, go back to where the group started.
+        mark = f"_mark{helper}"
+        self.print(f"({mark} := _tokenizer._index,)")
+        self.print("and")
+        self.print(f"({name} := {value} if (")
+        with self.indent():
+            for i, item in enumerate(node.items):
+                if i:
+                    self.print("and")
+                self.visit(item, names=names, prefix=prefix)
+        self.print(f") else None if _tokenizer._index == {mark} else self.reset({mark}),)")
+
+    def node_action(self, node: Alt, fields: List[str], left_rec: bool) -> str:
+        """The value of an alternative without an action, when making nodes.
+
+        An alternative of a single item returns the item's value, as in the
+        C generator, unless that may be false (when the item is optional).
+        """
+        if (
+            len(node.items) == 1
+            and len(fields) == 1
+            and not isinstance(node.items[0].item, (Opt, Repeat0))
+        ):
+            return fields[0]
+        name = self.node_names[node]
+        self.node_fields[name] = fields
+        values = [*fields, "_start_mark" if left_rec else "_mark", "_tokenizer._index"]
+        if self.nodes == "tuple":
+            return f"{name}(({', '.join(values)}))"
+        return f"{name}({', '.join(values)})"
+
+    def visit_Rhs(
+        self, node: Rhs, is_loop: bool = False, is_gather: bool = False, guarded: bool = False
+    ) -> None:
         if is_loop:
             assert len(node.alts) == 1
         for alt in node.alts:
-            self.visit(alt, is_loop=is_loop, is_gather=is_gather)
+            self.visit(alt, is_loop=is_loop, is_gather=is_gather, guarded=guarded)
 
-    def visit_Alt(self, node: Alt, is_loop: bool, is_gather: bool) -> None:
+    def visit_Alt(
+        self,
+        node: Alt,
+        is_loop: bool,
+        is_gather: bool,
+        guarded: bool = False,
+        left_rec: bool = False,
+    ) -> None:
         names: List[str] = []
-        self.print("cut = False")  # TODO: Only if needed.
+        make_node = self.nodes != "list" and not node.action and not is_gather
+        if make_node:
+            # Keep the span's names for the span.
+            names += ["start", "end"]
+        has_cut = any(isinstance(item.item, Cut) for item in node.items)
+        if has_cut:
+            self.print("cut = False")
         if is_loop:
             self.print("while (")
         else:
             self.print("if (")
         with self.indent():
             first = True
-            for item in node.items:
+            guard = None
+            if guarded:
+                # A step of a left-recursive loop starts after its first item.
+                guard = self.alt_guard(Alt(node.items[1:]) if left_rec else node)
+            if guard is not None:
+                self.print(guard)
+                first = False
+            for i, item in enumerate(node.items):
                 if first:
                     first = False
                 else:
                     self.print("and")
-                self.visit(item, names=names)
+                if left_rec and i == 0:
+                    self.visit(item, names=names, value="_lastresult")
+                else:
+                    # The second item of a gather is its _loop0_ rule.
+                    self.visit(item, names=names, is_loop_result=is_gather and i == 1)
         self.print("):")
         with self.indent():
             action = node.action
@@ -212,13 +732,19 @@ class PythonParserGenerator(ParserGenerator, GrammarVisitor):
                 if is_gather:
                     assert len(names) == 2
                     action = f"[{names[0]}] + {names[1]}"
+                elif make_node:
+                    action = self.node_action(node, names[2:], left_rec)
                 else:
                     action = f"[{', '.join(names)}]"
             if is_loop:
-                self.print(f"children.append({action})")
-                self.print(f"mark = self.mark()")
+                self.print(f"_append({action})")
+                self.print("_mark = _tokenizer._index")
+            elif left_rec:
+                self.print(f"_result = {action}")
+                self.print("continue")
             else:
                 self.print(f"return {action}")
-        self.print("self.reset(mark)")
-        # Skip remaining alternatives if a cut was reached.
-        self.print("if cut: return None")  # TODO: Only if needed.
+        self.print_reset()
+        if has_cut:
+            # Skip remaining alternatives if a cut was reached.
+            self.print("if cut: break" if left_rec else "if cut: return None")
@@ -0,0 +1,204 @@
+"""Keep generated Python parsers for reuse, in memory and on disk.
+
+Making a parser from a grammar means parsing the grammar, generating the
+parser and compiling it, in every process that needs it.  A ParserRegistry
+does that once per grammar: it keeps the parser classes it has made most
+recently, and writes the generated modules to a cache directory, where
+their bytecode is kept too (in __pycache__), so that later processes only
+have to import them.
+"""
+
+import collections
+import functools
+import hashlib
+import importlib.util
+import io
+import os
+import py_compile
+import sys
+import tempfile
+import tokenize
+
+from typing import Any, cast, Dict, Optional, Type, Union
+
+from pegen.parser import Parser
+from pegen.tokenizer import Tokenizer
+
+
+@functools.lru_cache(maxsize=None)
+def pegen_version() -> str:
+    """Return a hash of pegen's sources, which changes with what it generates."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as file:
+                digest.update(name.encode() + b"\0" + file.read())
+    return digest.hexdigest()
+
+
+def default_cache_dir() -> str:
+    """Return $PEGEN_CACHE_DIR, or the pegen directory in the user's cache."""
+    if "PEGEN_CACHE_DIR" in os.environ:
+        return os.environ["PEGEN_CACHE_DIR"]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "pegen")
+
+
+class ParserRegistry:
+    """Parser classes for grammars, made once and then looked up.
+
+    Parsers are keyed by a hash of the grammar's text, the options they are
+    generated with, the pegen version (see pegen_version()) and the Python
+    version, whose token numbers they use.  Up to *maxsize* classes are
+    kept in memory, the least recently used being dropped first; with a
+    *cache_dir*, generated modules are also kept there, for any process.
+    """
+
+    def __init__(
+        self, cache_dir: Union[str, "os.PathLike[str]", None] = None, *, maxsize: int = 32
+    ):
+        self.cache_dir = None if cache_dir is None else os.fspath(cache_dir)
+        self.maxsize = maxsize
+        self._classes: "collections.OrderedDict[str, Type[Parser]]" = collections.OrderedDict()
+
+    def get(
+        self,
+        source: str,
+        *,
+        vm: bool = False,
+        untraced: bool = False,
+        selective_memo: bool = False,
+        lexer: bool = False,
+        nodes: str = "list",
+        inline_size: int = 3,
+    ) -> Type[Parser]:
+        """Return the GeneratedParser class for the grammar in *source*.
+
+        The options are those of pegen.build.build_generator() for Python
+        parsers, except mypyc: such parsers have to be compiled.
+        """
+        options = (
+            f"vm={vm} untraced={untraced} selective_memo={selective_memo} lexer={lexer}"
+            f" nodes={nodes} inline_size={inline_size}"
+        )
+        python = str(sys.implementation.cache_tag)
+        key = hashlib.sha256(
+            "\0".join([pegen_version(), python, options, source]).encode()
+        ).hexdigest()[:32]
+        classes = self._classes
+        if key in classes:
+            classes.move_to_end(key)
+            return classes[key]
+        parser_class = self._load(key)
+        if parser_class is None:
+            text = self._generate(source, vm, untraced, selective_memo, lexer, nodes, inline_size)
+            parser_class = self._store(key, text)
+        classes[key] = parser_class
+        if len(classes) > self.maxsize:
+            classes.popitem(last=False)
+        return parser_class
+
+    def clear(self) -> None:
+        """Forget the parser classes in memory, but not those on disk."""
+        self._classes.clear()
+
+    def _path(self, key: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"parser_{key}.py")
+
+    def _load(self, key: str) -> Optional[Type[Parser]]:
+        path = self._path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        # Importing it uses the bytecode in __pycache__.
+        spec = cast(Any, importlib.util.spec_from_file_location(f"parser_{key}", path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return cast(Type[Parser], module.GeneratedParser)
+
+    def _generate(
+        self,
+        source: str,
+        vm: bool,
+        untraced: bool,
+        selective_memo: bool,
+        lexer: bool,
+        nodes: str,
+        inline_size: int,
+    ) -> str:
+        # Imported here, so that parsers found in the cache don't need them.
+        from pegen.grammar import Grammar
+        from pegen.grammar_parser import GeneratedParser as GrammarParser
+        from pegen.parser_generator import ParserGenerator
+        from pegen.python_generator import PythonParserGenerator
+        from pegen.vm_generator import VMParserGenerator
+
+        tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+        parser = GrammarParser(tokenizer)
+        grammar: Optional[Grammar] = parser.start()
+        if not grammar:
+            raise parser.make_syntax_error("<grammar>")
+        out = io.StringIO()
+        gen: ParserGenerator
+        if vm:
+            if nodes != "list":
+                raise ValueError("only Python parsers without vm can make nodes")
+            gen = VMParserGenerator(grammar, out, selective_memo=selective_memo, lexer=lexer)
+        else:
+            gen = PythonParserGenerator(
+                grammar,
+                out,
+                selective_memo=selective_memo,
+                untraced=untraced,
+                lexer=lexer,
+                nodes=nodes,
+                inline_size=inline_size,
+            )
+        gen.generate("<grammar>")
+        return out.getvalue()
+
+    def _store(self, key: str, text: str) -> Type[Parser]:
+        # Write the module under a temporary name first, so that other
+        # processes never see half of it.  If the cache directory can't be
+        # written, the parser is only kept in memory.
+        path = self._path(key)
+        if path is not None:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, temp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+                try:
+                    with os.fdopen(fd, "w") as file:
+                        file.write(text)
+                    os.replace(temp, path)
+                except BaseException:
+                    os.unlink(temp)
+                    raise
+                # Even if sys.dont_write_bytecode is set.
+                py_compile.compile(path, doraise=True)
+            except OSError:
+                pass
+            else:
+                parser_class = self._load(key)
+                assert parser_class is not None
+                return parser_class
+        ns: Dict[str, Any] = {}
+        exec(compile(text, f"<parser_{key}>", "exec"), ns)
+        return cast(Type[Parser], ns["GeneratedParser"])
+
+
+_registry: Optional[ParserRegistry] = None
+
+
+def get_parser(source: str, **options: Any) -> Type[Parser]:
+    """Return a parser class for a grammar from a registry in default_cache_dir().
+
+    See ParserRegistry.get() for the options.
+    """
+    global _registry
+    if _registry is None:
+        _registry = ParserRegistry(default_cache_dir())
+    return _registry.get(source, **options)
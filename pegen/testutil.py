@@ -14,14 +14,30 @@ from pegen.c_generator import CParserGenerator
 from pegen.grammar import Grammar
 from pegen.grammar_parser import GeneratedParser as GrammarParser
 from pegen.parser import Parser
+from pegen.parser_generator import ParserGenerator
 from pegen.python_generator import PythonParserGenerator
 from pegen.tokenizer import Tokenizer
-
-
-def generate_parser(grammar: Grammar) -> Type[Parser]:
-    # Generate a parser.
+from pegen.vm_generator import VMParserGenerator
+
+
+def generate_parser(
+    grammar: Grammar,
+    *,
+    vm: bool = False,
+    nodes: str = "list",
+    inline_size: int = 3,
+    mypyc: bool = False,
+    lexer: bool = False,
+) -> Type[Parser]:
+    # Generate a parser (one that runs on pegen.vm, with vm).
     out = io.StringIO()
-    genr = PythonParserGenerator(grammar, out)
+    genr: ParserGenerator
+    if vm:
+        genr = VMParserGenerator(grammar, out)
+    else:
+        genr = PythonParserGenerator(
+            grammar, out, nodes=nodes, inline_size=inline_size, mypyc=mypyc, lexer=lexer
+        )
     genr.generate("<string>")
 
     # Load the generated parser class.
@@ -31,8 +47,9 @@ def generate_parser(grammar: Grammar) -> Type[Parser]:
 
 
 def run_parser(file: IO[bytes], parser_class: Type[Parser], *, verbose: bool = False) -> Any:
-    # Run a parser on a file (stream).
-    tokenizer = Tokenizer(tokenize.generate_tokens(file.readline))  # type: ignore # typeshed issue #3515
+    # Run a parser on a file (stream), with its own lexer if it has one.
+    generate_tokens = getattr(parser_class, "generate_tokens", tokenize.generate_tokens)
+    tokenizer = Tokenizer(generate_tokens(file.readline))  # type: ignore # typeshed issue #3515
     parser = parser_class(tokenizer, verbose=verbose)
     result = parser.start()
     if result is None:
@@ -69,15 +86,20 @@ def import_file(full_name: str, path: str) -> Any:
     return mod
 
 
-def generate_c_parser_source(grammar: Grammar) -> str:
+def generate_c_parser_source(grammar: Grammar, *, selective_memo: bool = False) -> str:
     out = io.StringIO()
-    genr = CParserGenerator(grammar, out)
+    genr = CParserGenerator(grammar, out, selective_memo=selective_memo)
     genr.generate("<string>")
     return out.getvalue()
 
 
 def generate_parser_c_extension(
-    grammar: Grammar, path: pathlib.PurePath, debug: bool = False
+    grammar: Grammar,
+    path: pathlib.PurePath,
+    debug: bool = False,
+    *,
+    selective_memo: bool = False,
+    lexer: bool = False,
 ) -> Any:
     """Generate a parser c extension for the given grammar in the given path
 
@@ -91,7 +113,9 @@ def generate_parser_c_extension(
     assert not os.listdir(path)
     source = path / "parse.c"
     with open(source, "w") as file:
-        genr = CParserGenerator(grammar, file, debug=debug)
+        genr = CParserGenerator(
+            grammar, file, debug=debug, selective_memo=selective_memo, lexer=lexer
+        )
         genr.generate("parse.c")
     extension_path = compile_c_extension(str(source), build_dir=str(path / "build"))
     extension = import_file("parse", extension_path)
@@ -1,6 +1,26 @@
+import functools
+import io
+import itertools
 import token
 import tokenize
-from typing import List, Iterator
+from array import array
+from typing import (
+    Any,
+    cast,
+    Dict,
+    Iterable,
+    List,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+try:
+    from pegen import ctokenizer  # type: ignore
+except ImportError:
+    ctokenizer = None
 
 Mark = int  # NewType('Mark', int)
 
@@ -11,6 +31,47 @@ def shorttok(tok: tokenize.TokenInfo) -> str:
     return "%-25.25s" % f"{tok.start[0]}.{tok.start[1]}: {token.tok_name[tok.type]}:{tok.string!r}"
 
 
+def significant(tok: tokenize.TokenInfo) -> bool:
+    """Whether the parser gets to see *tok* (comments and NL are dropped)."""
+    if tok.type in (tokenize.NL, tokenize.COMMENT):
+        return False
+    return not (tok.type == token.ERRORTOKEN and tok.string.isspace())
+
+
+def generate_tokens_c(source: str, filename: str = "<string>") -> Iterator[tokenize.TokenInfo]:
+    """Tokenize *source* with CPython's own tokenizer, written in C.
+
+    This yields the same tokens as tokenize.generate_tokens(), except
+    those a parser never sees (NL and COMMENT), so a Tokenizer can be
+    made from either.  An error in the source is raised as a SyntaxError
+    once the tokens before it have been yielded, instead of as a
+    TokenError or an ERRORTOKEN.  It needs the pegen.ctokenizer extension
+    module; see pegen.build.compile_tokenizer_extension().
+    """
+    if ctokenizer is None:
+        raise ImportError(
+            "pegen.ctokenizer is not built; run pegen.build.compile_tokenizer_extension()"
+        )
+    tokens, error = ctokenizer.tokenize(source, tokenize.TokenInfo, filename)
+    yield from tokens
+    if error is not None:
+        raise error
+
+
+class EvictedMemo(Dict[int, Tuple[Any, Mark]]):
+    """Memo slot for positions behind a commit point; it drops all writes."""
+
+    def __setitem__(self, key: int, value: Tuple[Any, Mark]) -> None:
+        pass
+
+
+# Shared stand-ins for what Tokenizer.evict() throws away.  The placeholder
+# token matches nothing, so a parser that breaks its promise not to backtrack
+# behind a commit point just fails instead of crashing.
+EVICTED_MEMO = EvictedMemo()
+EVICTED_TOKEN = tokenize.TokenInfo(token.ERRORTOKEN, "", (0, 0), (0, 0), "")
+
+
 class Tokenizer:
     """Caching wrapper for the tokenize module.
 
@@ -18,15 +79,40 @@ class Tokenizer:
     """
 
     _tokens: List[tokenize.TokenInfo]
+    _memo: List[Dict[int, Tuple[Any, Mark]]]
+    # Only an IncrementalTokenizer records how far memoized calls looked.
+    _reaches: Optional[Dict[Any, Mark]] = None
+    _reach = 0
 
     def __init__(self, tokengen: Iterator[tokenize.TokenInfo], *, verbose: bool = False):
         self._tokengen = tokengen
         self._tokens = []
+        # Per-position memo slots for the parser, keyed by rule id.  There is
+        # always one more slot than there are tokens (for the position after
+        # the last token read so far).
+        self._memo = [{}]
+        # Positions before this one have been evicted.
+        self._evicted = 0
+        self._evicted_memo = 0
         self._index = 0
         self._verbose = verbose
         if verbose:
             self.report(False, False)
 
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        """Forget all input so far and continue with the tokens from *tokengen*."""
+        self._tokengen = tokengen
+        # This does not keep the lists' storage: CPython shrinks a list
+        # that is truncated to under half its allocation, as by del lst[n:].
+        self._tokens.clear()
+        self._memo.clear()
+        self._memo.append({})
+        self._evicted = 0
+        self._evicted_memo = 0
+        self._index = 0
+        if self._verbose:
+            self.report(False, False)
+
     def getnext(self) -> tokenize.TokenInfo:
         """Return the next token and updates the index."""
         cached = True
@@ -37,6 +123,7 @@ class Tokenizer:
             if tok.type == token.ERRORTOKEN and tok.string.isspace():
                 continue
             self._tokens.append(tok)
+            self._memo.append({})
             cached = False
         tok = self._tokens[self._index]
         self._index += 1
@@ -53,13 +140,33 @@ class Tokenizer:
             if tok.type == token.ERRORTOKEN and tok.string.isspace():
                 continue
             self._tokens.append(tok)
+            self._memo.append({})
         return self._tokens[self._index]
 
+    def at_end(self) -> bool:
+        """Return whether the next token is ENDMARKER, or it has been consumed."""
+        if self._index == len(self._tokens) and self._tokens:
+            if self._tokens[-1].type == token.ENDMARKER:
+                return True
+        return self.peek().type == token.ENDMARKER
+
     def diagnose(self) -> tokenize.TokenInfo:
         if not self._tokens:
             self.getnext()
         return self._tokens[-1]
 
+    def evict(self, mark: Mark) -> None:
+        """Discard tokens and memo entries before *mark*.
+
+        The last token read is always kept, for diagnose().
+        """
+        stop = min(mark, len(self._tokens) - 1)
+        for i in range(self._evicted, stop):
+            self._evicted_memo += len(self._memo[i])
+            self._memo[i] = EVICTED_MEMO
+            self._tokens[i] = EVICTED_TOKEN
+        self._evicted = max(self._evicted, stop)
+
     def mark(self) -> Mark:
         return self._index
 
@@ -84,3 +191,521 @@ class Tokenizer:
         else:
             tok = self._tokens[self._index - 1]
             print(f"{fill} {shorttok(tok)}")
+
+
+class TextEdit(NamedTuple):
+    """Replace the text from *start* up to *end* with *text*.
+
+    Positions are (line, column) pairs as in tokenize: lines count from 1,
+    columns from 0.
+    """
+
+    start: Tuple[int, int]
+    end: Tuple[int, int]
+    text: str
+
+
+def generate_tokens(lines: Iterable[str]) -> Iterator[tokenize.TokenInfo]:
+    return tokenize.generate_tokens(functools.partial(next, iter(lines), ""))
+
+
+def shift(tok: tokenize.TokenInfo, lines: int) -> tokenize.TokenInfo:
+    if not lines:
+        return tok
+    return tok._replace(
+        start=(tok.start[0] + lines, tok.start[1]), end=(tok.end[0] + lines, tok.end[1])
+    )
+
+
+BLOCK_ENDS = (token.NEWLINE, token.DEDENT)
+
+
+class IncrementalTokenizer(Tokenizer):
+    """Tokenizer for a source string that can be edited in place.
+
+    It keeps track of how far ahead each memoized rule looked (its reach),
+    which lets edit() keep every memo entry that never saw the edited
+    text.  See Parser.reparse().
+    """
+
+    def __init__(self, source: str, *, verbose: bool = False):
+        self._lines = io.StringIO(source).readlines()
+        super().__init__(generate_tokens(self._lines[:]), verbose=verbose)
+        # (mark, rule id) -> one past the last token looked at by that call.
+        self._reaches = {}
+        # The same, for the memoized call currently running.
+        self._reach = 0
+        # Whether no closing bracket is unmatched; tokenize stops tracking
+        # indentation after one, so edits can no longer be spliced in.
+        self._balanced: Optional[bool] = None
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        raise TypeError("an IncrementalTokenizer cannot restart; use edit() instead")
+
+    def getnext(self) -> tokenize.TokenInfo:
+        if self._index >= self._reach:
+            self._reach = self._index + 1
+        return super().getnext()
+
+    def peek(self) -> tokenize.TokenInfo:
+        if self._index >= self._reach:
+            self._reach = self._index + 1
+        return super().peek()
+
+    def source(self) -> str:
+        return "".join(self._lines)
+
+    def edit(self, edits: Sequence[TextEdit]) -> None:
+        """Apply *edits*, in order, and rewind to the start.
+
+        Only the logical lines around each edit are tokenized again.
+        Tokens after it are kept (with their line numbers shifted), and
+        memo entries are kept when the tokens they looked at are
+        unchanged.  Entries after an edit that adds or removes lines are
+        dropped all the same, since their trees hold token positions.
+        """
+        if self._evicted:
+            raise ValueError("Cannot edit a tokenizer that has evicted tokens")
+        incremental = True
+        try:
+            # Read the rest of the old text, so that everything after an
+            # edit can be shifted rather than tokenized again.
+            for tok in self._tokengen:
+                if significant(tok):
+                    self._tokens.append(tok)
+                    self._memo.append({})
+        except (tokenize.TokenError, SyntaxError):
+            incremental = False
+        # If tokenize failed before, its generator just stops early.
+        incremental = incremental and self._tokens[-1].type == token.ENDMARKER
+        if incremental and self._balanced is None:
+            self._balanced = balanced(self._tokens)
+        incremental = incremental and bool(self._balanced)
+        for edit in edits:
+            first, last, new_last = self._edit_lines(edit)
+            if incremental:
+                try:
+                    incremental = self._retokenize(first, last, new_last)
+                except (tokenize.TokenError, SyntaxError):
+                    incremental = False
+        if incremental:
+            self._tokengen = iter(())
+        else:
+            # Start over; any tokenize error will be raised while parsing.
+            self._tokengen = generate_tokens(self._lines[:])
+            self._tokens = []
+            self._memo = [{}]
+            self._reaches = {}
+            self._balanced = None
+        self._index = 0
+        self._reach = 0
+
+    def _edit_lines(self, edit: TextEdit) -> Tuple[int, int, int]:
+        """Apply *edit* to the text.
+
+        Return the first and last line it touched, and the new number of
+        the last line.
+        """
+        lines = self._lines
+        (first, start_col), (last, end_col) = edit.start, edit.end
+        if not 1 <= first <= last <= len(lines) + 1 or edit.start > edit.end:
+            raise ValueError(f"Bad edit {edit}")
+        head = lines[first - 1][:start_col] if first <= len(lines) else ""
+        tail = lines[last - 1][end_col:] if last <= len(lines) else ""
+        new_lines = io.StringIO(head + edit.text + tail).readlines()
+        lines[first - 1 : last] = new_lines
+        return first, last, first + len(new_lines) - 1
+
+    def _logical_line(self, line: int) -> int:
+        """Return the index of the first token of the logical line holding *line*."""
+        tokens = self._tokens
+        lo, hi = 0, len(tokens)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tokens[mid].start[0] < line:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo > 0:
+            tok = tokens[lo - 1]
+            if tok.type == token.NEWLINE and tok.end[0] < line:
+                break
+            lo -= 1
+        return lo
+
+    def _indents(self, index: int) -> List[str]:
+        """Return the indentation of the blocks open at token *index*.
+
+        This walks back only as far as the enclosing top-level statement.
+        """
+        tokens = self._tokens
+        indents = []
+        dedents = 0
+        for i in range(index - 1, -1, -1):
+            tok = tokens[i]
+            if tok.type == token.DEDENT:
+                dedents += 1
+            elif tok.type == token.INDENT:
+                if dedents:
+                    dedents -= 1
+                else:
+                    indents.append(tok.string)
+            elif tok.start[1] == 0 and (i == 0 or tokens[i - 1].type in BLOCK_ENDS):
+                # A top-level statement; no blocks are open before it.
+                break
+        indents.reverse()
+        return indents
+
+    def _retokenize(self, first: int, last: int, new_last: int) -> bool:
+        """Tokenize the lines changed by _edit_lines() and splice them in.
+
+        Return False, changing nothing, if that cannot be done.
+        """
+        old = self._tokens
+        lines = new_last - last
+        start = self._logical_line(first)
+        line = old[start - 1].end[0] + 1 if start else 1
+        indents = self._indents(start)
+        # Replay the open blocks so that tokenize starts with the same
+        # indentation stack it had at this point.
+        prefix = [indent + "pass\n" for indent in indents]
+        offset = line - 1 - len(prefix)
+        old_indents = indents[:]
+        new_indents = indents[:]
+        new: List[tokenize.TokenInfo] = []
+        prev_type = old[start - 1].type if start else token.NEWLINE
+        stop = start
+        text = itertools.chain(prefix, itertools.islice(self._lines, line - 1, None))
+        for tok in generate_tokens(text):
+            if tok.start[0] <= len(prefix) or not significant(tok):
+                continue
+            tok = shift(tok, offset)
+            while stop < len(old) and (
+                old[stop].start[0] <= last
+                or (old[stop].start[0] + lines, old[stop].start[1]) < tok.start
+            ):
+                update_indents(old_indents, old[stop])
+                stop += 1
+            # Past the edit, at the start of a logical line with the same
+            # blocks open, the old and new streams are in sync again.
+            if (
+                tok.start[0] > new_last
+                and prev_type == token.NEWLINE
+                and stop < len(old)
+                and (stop == 0 or old[stop - 1].type == token.NEWLINE)
+                and shift(old[stop], lines) == tok
+                and old_indents == new_indents
+            ):
+                break
+            update_indents(new_indents, tok)
+            new.append(tok)
+            prev_type = tok.type
+        else:
+            stop = len(old)
+        if not balanced(new):
+            return False
+
+        # Leave out the tokens that came out the same after all.
+        common = min(len(new), stop - start)
+        head = 0
+        while head < common and new[head] == old[start + head]:
+            head += 1
+        tail = 0
+        while tail < common - head and new[-1 - tail] == shift(old[stop - 1 - tail], lines):
+            tail += 1
+        damaged = start + head
+        stop -= tail
+        new = new[head : len(new) - tail]
+        delta = len(new) - (stop - damaged)
+
+        # A memo entry before the damage survives if it looked only at
+        # tokens before it.  Entries after it survive unless they moved
+        # to other lines, but their marks (and reaches) shift by delta.
+        memo = self._memo
+        reaches = self._reaches
+        assert reaches is not None
+        for mark in range(damaged):
+            entries = memo[mark]
+            for rule_id in list(entries):
+                reach = reaches.get((mark, rule_id))
+                if reach is None or reach > damaged:
+                    del entries[rule_id]
+                    reaches.pop((mark, rule_id), None)
+        for mark in range(damaged, stop):
+            for rule_id in memo[mark]:
+                reaches.pop((mark, rule_id), None)
+        tail_memo = memo[stop:]
+        if lines or delta:
+            moved = {}
+            for mark in range(stop, len(memo)):
+                entries = memo[mark]
+                for rule_id in entries:
+                    reach = reaches.pop((mark, rule_id), None)
+                    if reach is not None and not lines:
+                        moved[mark + delta, rule_id] = reach + delta
+            reaches.update(moved)
+            if lines:
+                tail_memo = [{} for _ in tail_memo]
+            else:
+                tail_memo = [
+                    {rule_id: (tree, end + delta) for rule_id, (tree, end) in entries.items()}
+                    for entries in tail_memo
+                ]
+
+        self._tokens = old[:damaged] + new + [shift(tok, lines) for tok in old[stop:]]
+        self._memo = memo[:damaged] + [{} for _ in new] + tail_memo
+        return True
+
+
+def balanced(tokens: Iterable[tokenize.TokenInfo]) -> bool:
+    """Whether every closing bracket in *tokens* has an opening one."""
+    depth = 0
+    for tok in tokens:
+        if tok.type == token.OP:
+            if tok.string in "([{":
+                depth += 1
+            elif tok.string in ")]}":
+                depth -= 1
+                if depth < 0:
+                    return False
+    return True
+
+
+def update_indents(indents: List[str], tok: tokenize.TokenInfo) -> None:
+    if tok.type == token.INDENT:
+        indents.append(tok.string)
+    elif tok.type == token.DEDENT:
+        indents.pop()
+
+
+# Like TokenInfo._make(), without going through the Python-level __new__.
+_new_token = functools.partial(tuple.__new__, tokenize.TokenInfo)
+
+
+class TokenColumns(Sequence[tokenize.TokenInfo]):
+    """The significant tokens of a source string, in parallel arrays.
+
+    This takes a fraction of the memory of a list of TokenInfo: each
+    token is its type, start and end positions, and the offsets of its
+    string in the source.  TokenInfo objects are made on access.
+    """
+
+    def __init__(self, source: str):
+        self._source = source
+        lines = io.StringIO(source).readlines()
+        # Offsets in the source of the start of each line, and of its end.
+        self._line_offsets = array("l", itertools.accumulate(map(len, lines), initial=0))
+        self.types = array("B")
+        self._start_lines, self._start_cols = array("i"), array("i")
+        self._end_lines, self._end_cols = array("i"), array("i")
+        self._string_starts, self._string_ends = array("l"), array("l")
+        # Tokens whose string or line is not just a slice of the source.
+        self._odd: Dict[int, tokenize.TokenInfo] = {}
+        # Raised by tokenize after the last token; the parser gets it when it
+        # reads that far, as with a Tokenizer.
+        self.error: Optional[Exception] = None
+        try:
+            self._fill(generate_tokens(lines))
+        except (tokenize.TokenError, SyntaxError) as err:
+            self.error = err
+
+    def _fill(self, tokens: Iterator[tokenize.TokenInfo]) -> None:
+        source, line_offsets = self._source, self._line_offsets
+        nlines = len(line_offsets) - 1
+        odd = self._odd
+        # The fields of every token, one after the other, which are cheaper
+        # to collect in a list and then split into the columns.
+        fields: List[int] = []
+        extend = fields.extend
+        index = 0
+        try:
+            for tok in tokens:
+                type, string, (start_line, start_col), (end_line, end_col), line = tok
+                if type == tokenize.NL or type == tokenize.COMMENT:
+                    continue
+                if type == token.ERRORTOKEN and string.isspace():
+                    continue
+                if end_line > nlines:
+                    odd[index] = tok
+                    start = end = len(source)
+                else:
+                    line_start = line_offsets[start_line - 1]
+                    start = line_start + start_col
+                    end = line_offsets[end_line - 1] + end_col
+                    # The line is a slice of the source as well, so its length
+                    # says whether it is the one we would make.
+                    if (
+                        len(line) != line_offsets[end_line] - line_start
+                        or len(string) != end - start
+                        or not source.startswith(string, start)
+                    ):
+                        odd[index] = tok
+                extend((type, start_line, start_col, end_line, end_col, start, end))
+                index += 1
+        finally:
+            columns = (
+                self.types,
+                self._start_lines,
+                self._start_cols,
+                self._end_lines,
+                self._end_cols,
+                self._string_starts,
+                self._string_ends,
+            )
+            for i, column in enumerate(columns):
+                column.fromlist(fields[i :: len(columns)])
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        tok = self._odd.get(index)
+        if tok is not None:
+            return tok
+        source, line_offsets = self._source, self._line_offsets
+        start_line, end_line = self._start_lines[index], self._end_lines[index]
+        return _new_token(
+            (
+                self.types[index],
+                source[self._string_starts[index] : self._string_ends[index]],
+                (start_line, self._start_cols[index]),
+                (end_line, self._end_cols[index]),
+                source[line_offsets[start_line - 1] : line_offsets[end_line]],
+            )
+        )
+
+
+class ColumnToken:
+    """A token of a TokenColumns, as CompactTokenizer hands it out.
+
+    Only the type and string, which is what the parser matches on, are
+    kept; the positions and line are read from the columns when asked
+    for, and token_info() makes the TokenInfo.  Otherwise it stands in
+    for that TokenInfo: it compares, hashes, unpacks and prints the same.
+    """
+
+    __slots__ = ("type", "string", "_columns", "_index")
+
+    def __init__(self, columns: "TokenColumns", index: int):
+        self.type = columns.types[index]
+        self.string = columns._source[columns._string_starts[index] : columns._string_ends[index]]
+        self._columns = columns
+        self._index = index
+
+    @property
+    def start(self) -> Tuple[int, int]:
+        return self._columns._start_lines[self._index], self._columns._start_cols[self._index]
+
+    @property
+    def end(self) -> Tuple[int, int]:
+        return self._columns._end_lines[self._index], self._columns._end_cols[self._index]
+
+    @property
+    def line(self) -> str:
+        columns, index = self._columns, self._index
+        line_offsets = columns._line_offsets
+        start = line_offsets[columns._start_lines[index] - 1]
+        return columns._source[start : line_offsets[columns._end_lines[index]]]
+
+    @property
+    def exact_type(self) -> int:
+        if self.type == token.OP:
+            return exact_token_types.get(self.string, token.OP)
+        return self.type
+
+    def token_info(self) -> tokenize.TokenInfo:
+        return self._columns[self._index]
+
+    def __eq__(self, other: object) -> bool:
+        return self.token_info() == other
+
+    def __hash__(self) -> int:
+        return hash(self.token_info())
+
+    def __len__(self) -> int:
+        return 5
+
+    def __getitem__(self, index: Any) -> Any:
+        return self.token_info()[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.token_info())
+
+    def __repr__(self) -> str:
+        return repr(self.token_info())
+
+
+class CompactTokenizer(Tokenizer):
+    """Tokenizer for a source string, keeping its tokens in a TokenColumns.
+
+    The source is tokenized up front, and the parser gets ColumnTokens,
+    which make a TokenInfo only when an action or error asks for one (or
+    the token is one that TokenColumns keeps as a TokenInfo).  The one at
+    the current position is kept, since most rules look at it.
+    """
+
+    def __init__(self, source: str, *, verbose: bool = False):
+        self._columns = TokenColumns(source)
+        super().__init__(iter(()), verbose=verbose)
+        self._tokens = cast(List[tokenize.TokenInfo], self._columns)
+        # How many tokens the parser has reached, which have a memo slot.
+        self._fill = 0
+        self._peeked_index = -1
+        self._peeked = EVICTED_TOKEN
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        raise TypeError("a CompactTokenizer cannot restart; make a new one instead")
+
+    def getnext(self) -> tokenize.TokenInfo:
+        """Return the next token and updates the index."""
+        cached = self._index < self._fill
+        tok = self.peek()
+        self._index += 1
+        if self._verbose:
+            self.report(cached, False)
+        return tok
+
+    def peek(self) -> tokenize.TokenInfo:
+        """Return the next token *without* updating the index."""
+        index = self._index
+        if index == self._peeked_index:
+            return self._peeked
+        if index == self._fill:
+            if index == len(self._columns):
+                raise self._columns.error or StopIteration
+            self._fill += 1
+            self._memo.append({})
+        self._peeked_index = index
+        if index < self._evicted:
+            self._peeked = EVICTED_TOKEN
+        else:
+            columns = self._columns
+            tok = columns._odd.get(index)
+            if tok is None:
+                tok = cast(tokenize.TokenInfo, ColumnToken(columns, index))
+            self._peeked = tok
+        return self._peeked
+
+    def at_end(self) -> bool:
+        """Return whether the next token is ENDMARKER, or it has been consumed."""
+        if self._index == len(self._columns) and not self._columns.error:
+            return True
+        return self.peek().type == token.ENDMARKER
+
+    def diagnose(self) -> tokenize.TokenInfo:
+        if not self._fill:
+            self.getnext()
+        return self._columns[self._fill - 1]
+
+    def evict(self, mark: Mark) -> None:
+        stop = min(mark, self._fill - 1)
+        for i in range(self._evicted, stop):
+            self._evicted_memo += len(self._memo[i])
+            self._memo[i] = EVICTED_MEMO
+        self._evicted = max(self._evicted, stop)
+        if self._peeked_index < self._evicted:
+            self._peeked_index = -1
@@ -0,0 +1,311 @@
+"""Run parsers compiled to tables (see pegen.vm_generator).
+
+A VM parser has no method per rule.  Its grammar is a table of rules made
+of instructions, which one interpreter loop here matches, and its actions
+are a table of functions.  This makes for much smaller modules than the
+Python generator's, which load faster, at some cost in parsing speed.
+"""
+
+import functools
+import token
+
+from typing import AbstractSet, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pegen.parser import Parser
+from pegen.tokenizer import EVICTED_MEMO
+
+# Instructions are (opcode, argument, bind) tuples; bind is true if the
+# value is passed to the action.  The argument of OPTIONAL, POSITIVE and
+# NEGATIVE is another instruction, as an (opcode, argument) pair.
+TOKEN = 0  # Match a token of the type in the argument
+STRING = 1  # Match a token with the string in the argument
+CALL = 2  # Match the rule with the number in the argument
+OPTIONAL = 3  # Always succeed, with the value of the argument or None
+POSITIVE = 4  # Succeed if the argument matches, without consuming it
+NEGATIVE = 5  # Succeed if the argument does not match
+CUT = 6  # Never try the rule's other alternatives
+LAST_RESULT = 7  # The result so far of a left-recursive loop
+NAME = 8  # Match a NAME token that is not a reserved keyword
+
+# Rule flags.
+MEMO = 1  # Memoize the rule
+GROW_SEED = 2  # Left-recursive; memoized with a growing seed
+LOOP = 4  # Match the one alternative as often as possible, into a list
+LEFT_REC_LOOP = 8  # Apply the alternatives to the result of the seed rule
+SYNC = 16  # A commit point (see the @sync meta)
+
+# A rule is (flags, alternatives, seed): the seed is the number of the rule
+# a LEFT_REC_LOOP starts with.  An alternative is (instructions, action,
+# guard), where the action is a number in the action table, or None to
+# return the list of values, and the guard is None or the set of token
+# types and strings that the alternative can start with.
+Instruction = Tuple[Any, ...]
+Alternative = Tuple[Tuple[Instruction, ...], Optional[int], Optional[AbstractSet[Any]]]
+Rule = Tuple[int, Tuple[Alternative, ...], Optional[int]]
+# A rule as VMParser runs it, with the actions of its alternatives looked up.
+RuleProgram = Tuple[int, Tuple[Tuple[Tuple[Instruction, ...], Any, Any], ...], Any]
+
+# The result of _alts() when no alternative matched, or a cut stopped it.
+_FAIL = object()
+_CUT = object()
+
+
+class VMParser(Parser):
+    """Base class for parsers generated by pegen.vm_generator.
+
+    Subclasses set rule_names, rules and actions.  Any rule can be matched
+    like a method of the parser, as in parser.expr(); start() is one.
+    """
+
+    rule_names: Tuple[str, ...] = ()
+    rules: Tuple[Rule, ...] = ()
+    # Called with the parser and the values bound by the alternative.
+    actions: Tuple[Callable[..., Any], ...] = ()
+
+    # The rules, with the actions of their alternatives looked up.
+    _program: Tuple[RuleProgram, ...] = ()
+    _rule_numbers: Dict[str, int] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        actions = cls.actions
+        cls._program = tuple(
+            (
+                flags,
+                tuple(
+                    (items, None if action is None else actions[action], guard)
+                    for items, action, guard in alts
+                ),
+                seed,
+            )
+            for flags, alts, seed in cls.rules
+        )
+        cls._rule_numbers = {name: number for number, name in enumerate(cls.rule_names)}
+
+    def __getattr__(self, name: str) -> Callable[[], Any]:
+        # Only called for names that are not attributes, such as rules.
+        number = self._rule_numbers.get(name)
+        if number is None:
+            raise AttributeError(name)
+        return functools.partial(self._call, number)
+
+    def start(self) -> Any:
+        return self._call(self._rule_numbers["start"])
+
+    def _call(self, number: int) -> Any:
+        """Match the rule with this number, like a generated method would."""
+        if self._tracing:
+            return self._traced_call(number)
+        rule = self._program[number]
+        flags = rule[0]
+        tokenizer = self._tokenizer
+        if flags & (MEMO | GROW_SEED):
+            mark = tokenizer._index
+            memo = tokenizer._memo[mark]
+            if number in memo:
+                tree, tokenizer._index = memo[number]
+                return tree
+            if flags & GROW_SEED:
+                tree = self._grow_seed(number, rule, mark, memo)
+            else:
+                tree = self._match(rule)
+                memo[number] = tree, tokenizer._index
+        elif flags & (LOOP | LEFT_REC_LOOP):
+            tree = self._match(rule)
+        else:
+            # _match() for most rules, without the call.
+            tree = self._alts(rule[1], tokenizer._index, None)
+            if tree is _FAIL or tree is _CUT:
+                tree = None
+        if flags & SYNC and tree is not None and self._evict:
+            self.commit()
+        return tree
+
+    def _grow_seed(self, number: int, rule: Any, mark: int, memo: Dict[int, Any]) -> Any:
+        # Like memoize_left_rec(): prime the memo with a failure, then match
+        # the rule again for as long as that gets further.
+        if memo is EVICTED_MEMO:
+            return None
+        tokenizer = self._tokenizer
+        memo[number] = lastresult, lastmark = None, mark
+        while True:
+            tokenizer._index = mark
+            result = self._match(rule)
+            endmark = tokenizer._index
+            if not result or endmark <= lastmark:
+                break
+            memo[number] = lastresult, lastmark = result, endmark
+        tokenizer._index = lastmark
+        return lastresult
+
+    def _match(self, rule: Any) -> Any:
+        flags, alts, seed = rule
+        tokenizer = self._tokenizer
+        mark = tokenizer._index
+        if flags & LOOP:
+            children: List[Any] = []
+            while True:
+                value = self._alts(alts, mark, None)
+                if value is _FAIL:
+                    return children
+                if value is _CUT:
+                    return None
+                children.append(value)
+                mark = tokenizer._index
+        if flags & LEFT_REC_LOOP:
+            lastresult = None
+            result = self._call(seed)
+            while result:
+                lastresult, mark = result, tokenizer._index
+                result = self._alts(alts, mark, lastresult)
+                if result is _FAIL or result is _CUT:
+                    break
+            tokenizer._index = mark
+            return lastresult
+        value = self._alts(alts, mark, None)
+        if value is _FAIL or value is _CUT:
+            return None
+        return value
+
+    def _alts(self, alts: Sequence[Any], mark: int, lastresult: Any) -> Any:
+        """Return the value of the first alternative that matches, or _FAIL.
+
+        This is the interpreter loop.  Like the code the Python generator
+        emits, an item fails if its value is false, and the tokenizer is
+        reset to *mark* after every alternative that fails.
+        """
+        tokenizer = self._tokenizer
+        peek = tokenizer.peek
+        getnext = tokenizer.getnext
+        call = self._call
+        reserved = self._reserved
+        next_token = None
+        for items, action, guard in alts:
+            if guard is not None:
+                # Every alternative starts at mark, so this is peeked once.
+                if next_token is None:
+                    next_token = peek()
+                # Reserved keywords are NAME tokens that only match as strings.
+                string = next_token.string
+                if string not in guard and (next_token.type not in guard or string in reserved):
+                    continue
+            values: List[Any] = []
+            value: Any
+            cut = False
+            for op, arg, bind in items:
+                if op == TOKEN:
+                    if peek().type != arg:
+                        break
+                    value = getnext()
+                elif op == STRING:
+                    if peek().string != arg:
+                        break
+                    value = getnext()
+                elif op == CALL:
+                    value = call(arg)
+                    if not value:
+                        break
+                elif op == OPTIONAL:
+                    value = self._single(arg)
+                elif op == POSITIVE or op == NEGATIVE:
+                    start = tokenizer._index
+                    value = self._single(arg)
+                    tokenizer._index = start
+                    if op == POSITIVE:
+                        if not value:
+                            break
+                    elif value:
+                        break
+                elif op == CUT:
+                    cut = value = self.cut()
+                elif op == LAST_RESULT:
+                    value = lastresult
+                else:  # NAME
+                    value = peek()
+                    if value.type != token.NAME or value.string in self._reserved:
+                        break
+                    value = getnext()
+                if bind:
+                    values.append(value)
+            else:
+                if action is None:
+                    return values
+                return action(self, *values)
+            tokenizer._index = mark
+            if cut:
+                return _CUT
+        return _FAIL
+
+    def _single(self, instruction: Tuple[int, Any]) -> Any:
+        # The value of an instruction inside another, or None if it fails.
+        op, arg = instruction
+        if op == CALL:
+            return self._call(arg)
+        if op == TOKEN or op == STRING:
+            tok = self._tokenizer.peek()
+            if (tok.type if op == TOKEN else tok.string) == arg:
+                return self._tokenizer.getnext()
+            return None
+        if op == OPTIONAL:
+            return self._single(arg)
+        if op == NAME:
+            tok = self._tokenizer.peek()
+            if tok.type == token.NAME and tok.string not in self._reserved:
+                return self._tokenizer.getnext()
+            return None
+        start = self._tokenizer._index
+        value = self._single(arg)
+        self._tokenizer._index = start
+        if op == POSITIVE:
+            return value
+        return not value
+
+    def _traced_call(self, number: int) -> Any:
+        # _call() for verbose, profiling or incremental parsers; see the slow
+        # paths of memoize_rule() and memoize_left_rec_rule().
+        rule = self._program[number]
+        flags = rule[0]
+        name = self.rule_names[number]
+        tokenizer = self._tokenizer
+        mark = tokenizer._index
+        memo = tokenizer._memo[mark]
+        memoized = bool(flags & (MEMO | GROW_SEED))
+        reaches = tokenizer._reaches
+        verbose = self._verbose
+        profile = self._profile
+        fill = "  " * self._level
+        if memoized and number in memo:
+            tree, endmark = memo[number]
+            if reaches is not None:
+                tokenizer._reach = max(tokenizer._reach, reaches.get((mark, number), endmark))
+            if profile is not None:
+                profile.hit(name, tree, endmark - mark)
+            if verbose:
+                print(f"{fill}{name}() -> {tree!s:.200}")
+            tokenizer._index = endmark
+            return tree
+        if verbose:
+            print(f"{fill}{name}() ... (looking at {self.showpeek()})")
+        if profile is not None:
+            profile.enter(name)
+        if memoized and reaches is not None:
+            outer_reach, tokenizer._reach = tokenizer._reach, mark
+        self._level += 1
+        if flags & GROW_SEED:
+            tree = self._grow_seed(number, rule, mark, memo)
+        else:
+            tree = self._match(rule)
+        self._level -= 1
+        endmark = tokenizer._index
+        if memoized:
+            if reaches is not None:
+                reaches[mark, number] = tokenizer._reach
+                tokenizer._reach = max(outer_reach, tokenizer._reach)
+            memo[number] = tree, endmark
+        if profile is not None:
+            profile.leave(tree, endmark - mark, memoized=memoized)
+        if verbose:
+            print(f"{fill}... {name}() -> {tree!s:.200}")
+        if flags & SYNC and tree is not None and self._evict:
+            self.commit()
+        return tree
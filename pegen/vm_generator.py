@@ -0,0 +1,281 @@
+"""Generate Python parsers that run on pegen.vm.
+
+Instead of a method per rule, the generated module has the grammar as
+tables of instructions for VMParser, and the actions as a tuple of
+functions, each compiled once when the module is loaded.
+"""
+
+import keyword
+import token
+
+from typing import Any, Dict, IO, List, Optional, Text, Tuple
+
+from pegen import grammar
+from pegen.grammar import (
+    Alt,
+    Cut,
+    Gather,
+    GrammarVisitor,
+    Group,
+    Lookahead,
+    NamedItem,
+    NameLeaf,
+    NegativeLookahead,
+    Opt,
+    PositiveLookahead,
+    Repeat0,
+    Repeat1,
+    Rhs,
+    Rule,
+    StringLeaf,
+)
+from pegen.lexer_generator import python_lexer
+from pegen.parser_generator import dedupe, ParserGenerator
+from pegen.python_generator import first_tokens, MODULE_SUFFIX, TOKEN_METHODS, TOKEN_TYPES
+
+MODULE_PREFIX = """\
+#!/usr/bin/env python3.8
+# @generated by pegen from {filename}
+
+import ast
+import sys
+import tokenize
+
+from pegen.vm import VMParser
+from pegen.vm import TOKEN, STRING, CALL, OPTIONAL, POSITIVE, NEGATIVE, CUT, LAST_RESULT, NAME
+from pegen.vm import MEMO, GROW_SEED, LOOP, LEFT_REC_LOOP, SYNC
+
+"""
+
+# An instruction without its bind flag, as source: (opcode, argument).
+Instruction = Tuple[str, str]
+
+
+class VMInstructionVisitor(GrammarVisitor):
+    """Make the instruction for an item, and the name its value is bound to.
+
+    The names are those the Python generator would bind, so actions work
+    the same with either.
+    """
+
+    def __init__(self, parser_generator: "VMParserGenerator"):
+        self.gen = parser_generator
+        self.cache: Dict[Any, Tuple[Optional[str], Instruction]] = {}
+
+    def visit_NameLeaf(self, node: NameLeaf) -> Tuple[Optional[str], Instruction]:
+        name = node.value
+        if name == "NAME" and self.gen.reserved_keywords:
+            return "name", ("NAME", "None")
+        if name in TOKEN_METHODS or name in TOKEN_TYPES:
+            instruction = "TOKEN", str(getattr(token, name))
+            name = name.lower()
+            if keyword.iskeyword(name):  # async and await
+                name += "_"
+            return name, instruction
+        return name, ("CALL", str(self.gen.rule_number(name)))
+
+    def visit_StringLeaf(self, node: StringLeaf) -> Tuple[str, Instruction]:
+        return "literal", ("STRING", node.value)
+
+    def visit_Rhs(self, node: Rhs) -> Tuple[Optional[str], Instruction]:
+        if node in self.cache:
+            return self.cache[node]
+        if len(node.alts) == 1 and len(node.alts[0].items) == 1:
+            self.cache[node] = self.visit(node.alts[0].items[0])
+        else:
+            name = self.gen.name_node(node)
+            self.cache[node] = name, ("CALL", str(self.gen.rule_number(name)))
+        return self.cache[node]
+
+    def visit_NamedItem(self, node: NamedItem) -> Tuple[Optional[str], Instruction]:
+        name, instruction = self.visit(node.item)
+        return node.name or name, instruction
+
+    def lookahead(self, node: Lookahead, opcode: str) -> Tuple[None, Instruction]:
+        name, instruction = self.visit(node.node)
+        return None, (opcode, f"({', '.join(instruction)})")
+
+    def visit_PositiveLookahead(self, node: PositiveLookahead) -> Tuple[None, Instruction]:
+        return self.lookahead(node, "POSITIVE")
+
+    def visit_NegativeLookahead(self, node: NegativeLookahead) -> Tuple[None, Instruction]:
+        return self.lookahead(node, "NEGATIVE")
+
+    def visit_Opt(self, node: Opt) -> Tuple[str, Instruction]:
+        name, instruction = self.visit(node.node)
+        return "opt", ("OPTIONAL", f"({', '.join(instruction)})")
+
+    def visit_Repeat0(self, node: Repeat0) -> Tuple[Optional[str], Instruction]:
+        if node in self.cache:
+            return self.cache[node]
+        name = self.gen.name_loop(node.node, False)
+        # A loop of none still matches.
+        self.cache[node] = name, ("OPTIONAL", f"(CALL, {self.gen.rule_number(name)})")
+        return self.cache[node]
+
+    def visit_Repeat1(self, node: Repeat1) -> Tuple[Optional[str], Instruction]:
+        if node in self.cache:
+            return self.cache[node]
+        name = self.gen.name_loop(node.node, True)
+        self.cache[node] = name, ("CALL", str(self.gen.rule_number(name)))
+        return self.cache[node]
+
+    def visit_Gather(self, node: Gather) -> Tuple[Optional[str], Instruction]:
+        if node in self.cache:
+            return self.cache[node]
+        name = self.gen.name_gather(node)
+        self.cache[node] = name, ("CALL", str(self.gen.rule_number(name)))
+        return self.cache[node]
+
+    def visit_Group(self, node: Group) -> Tuple[Optional[str], Instruction]:
+        return self.visit(node.rhs)
+
+    def visit_Cut(self, node: Cut) -> Tuple[str, Instruction]:
+        return "cut", ("CUT", "None")
+
+
+class VMParserGenerator(ParserGenerator, GrammarVisitor):
+    """Generate a VMParser subclass, with the grammar as tables."""
+
+    def __init__(
+        self,
+        grammar: grammar.Grammar,
+        file: Optional[IO[Text]],
+        *,
+        selective_memo: bool = False,
+        lexer: bool = False,
+    ):
+        super().__init__(grammar, file, selective_memo=selective_memo)
+        self.instructionvisitor = VMInstructionVisitor(self)
+        # Rules are numbered as they are first referred to, starting with
+        # the grammar's own; the tables hold them in that order.
+        self.rule_numbers: Dict[str, int] = {}
+        for name in ["start", *self.rules]:
+            self.rule_number(name)
+        self.rule_tables: Dict[str, List[str]] = {}
+        # The source of each action function, and its number.
+        self.actions: Dict[str, int] = {}
+        self.lexer = lexer
+
+    def rule_number(self, name: str) -> int:
+        return self.rule_numbers.setdefault(name, len(self.rule_numbers))
+
+    def action_number(self, names: List[str], action: str) -> int:
+        source = f"lambda {', '.join(['self', *names])}: {action}"
+        return self.actions.setdefault(source, len(self.actions))
+
+    def generate(self, filename: str) -> None:
+        while self.todo:
+            for rulename, rule in list(self.todo.items()):
+                del self.todo[rulename]
+                self.visit(rule)
+
+        header = self.grammar.metas.get("header", MODULE_PREFIX)
+        if header is not None:
+            self.print(header.rstrip("\n").format(filename=filename))
+        subheader = self.grammar.metas.get("subheader", "")
+        if subheader:
+            self.print(subheader.format(filename=filename))
+        if self.lexer:
+            self.print()
+            self.printblock(python_lexer(self.grammar))
+        self.print()
+        self.print()
+        self.print("class GeneratedParser(VMParser):")
+        with self.indent():
+            if self.lexer:
+                self.print("generate_tokens = staticmethod(generate_tokens)")
+            if self.stream_rule != "start":
+                self.print(f"_stream_rule = {self.stream_rule!r}")
+            if self.keywords:
+                keywords = ", ".join(map(repr, sorted(self.keywords)))
+                self.print(f"KEYWORDS = frozenset({{{keywords}}})")
+                if self.reserved_keywords:
+                    self.print("_reserved = KEYWORDS")
+            names = sorted(self.rule_numbers, key=self.rule_numbers.__getitem__)
+            self.print("rule_names = (")
+            with self.indent():
+                for name in names:
+                    self.print(f"{name!r},")
+            self.print(")")
+            self.print("rules = (")
+            with self.indent():
+                for name in names:
+                    self.printblock("\n".join(self.rule_tables[name]))
+            self.print(")")
+            self.print("actions = (")
+            with self.indent():
+                for source, number in self.actions.items():
+                    self.print(f"{source},  # {number}")
+            self.print(")")
+        trailer = self.grammar.metas.get("trailer", MODULE_SUFFIX)
+        if trailer is not None:
+            self.print(trailer.rstrip("\n"))
+
+    def visit_Rule(self, node: Rule) -> None:
+        self.rule_number(node.name)
+        rhs = node.flatten()
+        flags = []
+        if self.grows_seed(node):
+            flags.append("GROW_SEED")
+        elif self.should_memoize(node):
+            flags.append("MEMO")
+        seed = "None"
+        alts = rhs.alts
+        left_rec = node.name in self.left_rec_loops
+        if left_rec:
+            flags.append("LEFT_REC_LOOP")
+            loop = self.left_rec_loops[node.name]
+            seed = str(self.rule_number(loop.seed))
+            alts = loop.alts
+        elif node.is_loop():
+            flags.append("LOOP")
+        if node.name in self.sync_rules:
+            flags.append("SYNC")
+        # Like the Python generator, skip alternatives that cannot start
+        # with the next token; guards are the tokens that they can.
+        guards: List[Optional[str]] = [None] * len(alts)
+        if len(alts) > 1 and not node.is_loop():
+            guards = [self.alt_guard(Alt(alt.items[1:]) if left_rec else alt) for alt in alts]
+        lines = [f"# {node.name}: {rhs}", f"({' | '.join(flags) or '0'}, ("]
+        for alt, guard in zip(alts, guards):
+            lines.append(f"    {self.alt_table(alt, guard, node.is_gather(), left_rec)},")
+        lines.append(f"), {seed}),")
+        self.rule_tables[node.name] = lines
+
+    def alt_guard(self, node: Alt) -> Optional[str]:
+        """The set of token types and strings that *node* can start with.
+
+        With reserved keywords, a NAME token that is one only matches if
+        its string is in the set.
+        """
+        first = first_tokens(self.first_set(node), self.reserved_keywords)
+        if first is None:
+            return None
+        types, strings = first
+        return f"{{{', '.join([*map(str, sorted(types)), *strings])}}}"
+
+    def alt_table(self, node: Alt, guard: Optional[str], is_gather: bool, left_rec: bool) -> str:
+        """The (instructions, action, guard) table of an alternative, as source."""
+        names: List[str] = []
+        instructions = []
+        for i, item in enumerate(node.items):
+            name, (opcode, arg) = self.instructionvisitor.visit(item)
+            if left_rec and i == 0:
+                # A step of a left-recursive loop starts after its first item.
+                opcode, arg = "LAST_RESULT", "None"
+            elif is_gather and i == 1:
+                # The rest of a gather may be empty.
+                opcode, arg = "OPTIONAL", f"({opcode}, {arg})"
+            bind = bool(name) and name != "cut"
+            if bind:
+                dedupe(name, names)
+            instructions.append(f"({opcode}, {arg}, {bind})")
+        action = node.action
+        if not action and is_gather:
+            assert len(names) == 2
+            action = f"[{names[0]}] + {names[1]}"
+        number = "None" if not action else str(self.action_number(names, action))
+        if len(instructions) == 1:
+            return f"(({instructions[0]},), {number}, {guard})"
+        return f"(({', '.join(instructions)}), {number}, {guard})"
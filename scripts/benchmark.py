@@ -0,0 +1,120 @@
+#!/usr/bin/env python3.8
+
+"""Time a generated Python parser on an input file.
+
+Example:
+
+$ scripts/benchmark.py -g data/exprs.gram data/large.txt
+"""
+
+import argparse
+import io
+import sys
+import time
+import tokenize
+
+from typing import Any, Dict, Type
+
+sys.path.insert(0, ".")
+from pegen.build import build_parser
+from pegen.parser import Parser, parse_two_phase
+from pegen.python_generator import PythonParserGenerator
+from pegen.tokenizer import CompactTokenizer, generate_tokens_c, Tokenizer
+
+argparser = argparse.ArgumentParser(
+    prog="benchmark", description="Time a generated Python parser on an input file"
+)
+argparser.add_argument("-g", "--grammar-file", default="data/exprs.gram", help="Grammar file path")
+argparser.add_argument("-n", "--repeat", type=int, default=5, help="Number of timed runs")
+argparser.add_argument(
+    "--selective-memo",
+    action="store_true",
+    help="Only memoize left-recursive rules and rules marked (memo)",
+)
+argparser.add_argument(
+    "--untraced", action="store_true", help="Time the untraced variant of the parser"
+)
+argparser.add_argument(
+    "--two-phase",
+    action="store_true",
+    help="Time parse_two_phase() with the untraced variant of the parser",
+)
+argparser.add_argument("--compact", action="store_true", help="Tokenize with a CompactTokenizer")
+argparser.add_argument(
+    "--c-tokenizer",
+    action="store_true",
+    help="Tokenize with CPython's tokenizer (needs pegen.build.compile_tokenizer_extension())",
+)
+argparser.add_argument(
+    "--lexer", action="store_true", help="Tokenize with a lexer generated from the grammar"
+)
+argparser.add_argument(
+    "--inline-size",
+    type=int,
+    default=3,
+    metavar="N",
+    help="Match groups of up to N items in their caller (0 to keep every helper rule)",
+)
+argparser.add_argument("filename", help="Input file to parse")
+
+
+def generate_parser_class(grammar_file: str, **kwargs: Any) -> Type[Parser]:
+    grammar, parser, tokenizer = build_parser(grammar_file)
+    out = io.StringIO()
+    gen = PythonParserGenerator(grammar, out, **kwargs)
+    gen.generate(grammar_file)
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    return ns["GeneratedParser"]
+
+
+def time_parser(
+    parser_class: Type[Parser],
+    source: str,
+    repeat: int,
+    two_phase: bool = False,
+    compact: bool = False,
+    c_tokenizer: bool = False,
+) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        if two_phase:
+            parse_two_phase(parser_class, source)
+            best = min(best, time.perf_counter() - t0)
+            continue
+        if compact:
+            tokenizer: Tokenizer = CompactTokenizer(source)
+        elif c_tokenizer:
+            tokenizer = Tokenizer(generate_tokens_c(source))
+        elif hasattr(parser_class, "generate_tokens"):
+            tokenizer = Tokenizer(parser_class.generate_tokens(io.StringIO(source).readline))
+        else:
+            tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+        parser = parser_class(tokenizer)
+        if parser.start() is None:
+            raise parser.make_syntax_error()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    parser_class = generate_parser_class(
+        args.grammar_file,
+        selective_memo=args.selective_memo,
+        untraced=args.untraced or args.two_phase,
+        lexer=args.lexer,
+        inline_size=args.inline_size,
+    )
+    with open(args.filename) as file:
+        source = file.read()
+    nlines = source.count("\n")
+    dt = time_parser(
+        parser_class, source, args.repeat, args.two_phase, args.compact, args.c_tokenizer
+    )
+    print(f"{args.filename}: best of {args.repeat}: {dt:.3f} sec; {nlines / dt:.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
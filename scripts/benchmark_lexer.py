@@ -0,0 +1,86 @@
+#!/usr/bin/env python3.8
+
+"""Time a lexer generated from a grammar against Python's tokenizers.
+
+The input is the given file repeated; the Python lexer is timed against
+tokenize, and with --c, a C extension built with the generated lexer
+against one using CPython's tokenizer.
+
+Example:
+
+$ scripts/benchmark_lexer.py -g data/cprog.gram --c data/cprog.txt
+"""
+
+import argparse
+import io
+import pathlib
+import sys
+import tempfile
+import time
+import tokenize
+
+from typing import Any, Callable, Dict
+
+sys.path.insert(0, ".")
+from pegen.build import build_parser
+from pegen.lexer_generator import python_lexer
+from pegen.testutil import generate_parser_c_extension
+
+argparser = argparse.ArgumentParser(
+    prog="benchmark_lexer", description="Time a generated lexer against Python's tokenizers"
+)
+argparser.add_argument("-g", "--grammar-file", default="data/cprog.gram", help="Grammar file path")
+argparser.add_argument("-n", "--repeat", type=int, default=5, help="Number of timed runs")
+argparser.add_argument(
+    "--copies", type=int, default=2000, help="How many times to repeat the input (default 2000)"
+)
+argparser.add_argument(
+    "--c", action="store_true", help="Also time C extensions, with and without the lexer"
+)
+argparser.add_argument("filename", nargs="?", default="data/cprog.txt", help="Input file")
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    grammar, _, _ = build_parser(args.grammar_file)
+    with open(args.filename) as file:
+        source = file.read() * args.copies
+    nlines = source.count("\n")
+
+    ns: Dict[str, Any] = {}
+    exec(python_lexer(grammar), ns)
+    generate_tokens = ns["generate_tokens"]
+    timings = {
+        "tokenize": best_time(
+            lambda: list(tokenize.generate_tokens(io.StringIO(source).readline)), args.repeat
+        ),
+        "lexer": best_time(
+            lambda: list(generate_tokens(io.StringIO(source).readline)), args.repeat
+        ),
+    }
+
+    if args.c:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, lexer in [("C parser", False), ("C parser, lexer", True)]:
+                path = pathlib.Path(tmp_dir, name.replace(" ", "").replace(",", "_"))
+                path.mkdir()
+                sys.modules.pop("parse", None)
+                extension = generate_parser_c_extension(grammar, path, lexer=lexer)
+                timings[name] = best_time(lambda: extension.parse_string(source), args.repeat)
+
+    print(f"{args.filename} x {args.copies}: {nlines} lines, best of {args.repeat}")
+    for name, dt in timings.items():
+        print(f"  {name:16}: {dt:.3f} sec; {nlines / dt:.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
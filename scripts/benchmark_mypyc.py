@@ -0,0 +1,99 @@
+#!/usr/bin/env python3.8
+
+"""Time a generated Python parser against the same parser compiled with mypyc.
+
+The parser is generated as usual, untraced, and for mypyc (see
+pegen.build.compile_mypyc_extension()), which is timed both as plain Python
+and compiled.  The input is tokenized once up front, so only parsing is
+timed.  The grammar's actions must be Python, and type check.
+
+Example:
+
+$ scripts/benchmark_mypyc.py -g data/exprs.gram data/xl.txt
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tokenize
+
+from typing import Any, Dict, List, Type
+
+sys.path.insert(0, ".")
+from pegen.build import build_parser, compile_mypyc_extension
+from pegen.parser import Parser
+from pegen.python_generator import PythonParserGenerator
+from pegen.testutil import import_file
+from pegen.tokenizer import Tokenizer
+
+argparser = argparse.ArgumentParser(
+    prog="benchmark_mypyc", description="Time a Python parser, plain and compiled with mypyc"
+)
+argparser.add_argument("-g", "--grammar-file", default="data/exprs.gram", help="Grammar file path")
+argparser.add_argument("-n", "--repeat", type=int, default=5, help="Number of timed runs")
+argparser.add_argument("filename", nargs="?", default="data/xl.txt", help="Input file")
+
+
+def generate_parser_source(grammar_file: str, **kwargs: Any) -> str:
+    grammar, parser, tokenizer = build_parser(grammar_file)
+    out = io.StringIO()
+    gen = PythonParserGenerator(grammar, out, **kwargs)
+    gen.generate(grammar_file)
+    return out.getvalue()
+
+
+def load_parser_class(source: str) -> Type[Parser]:
+    ns: Dict[str, Any] = {}
+    exec(source, ns)
+    return ns["GeneratedParser"]
+
+
+def compile_parser_class(source: str, path: str) -> Type[Parser]:
+    source_path = os.path.join(path, "parse.py")
+    with open(source_path, "w") as file:
+        file.write(source)
+    extension_path = compile_mypyc_extension(source_path, build_dir=os.path.join(path, "build"))
+    return import_file("parse", extension_path).GeneratedParser
+
+
+def time_parser(
+    parser_class: Type[Parser], tokens: List[tokenize.TokenInfo], repeat: int
+) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        parser = parser_class(Tokenizer(iter(tokens)))
+        if parser.start() is None:
+            raise parser.make_syntax_error()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    with open(args.filename) as file:
+        source = file.read()
+    tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    mypyc_source = generate_parser_source(args.grammar_file, mypyc=True)
+    parser_classes = {
+        "python": load_parser_class(generate_parser_source(args.grammar_file)),
+        "untraced": load_parser_class(generate_parser_source(args.grammar_file, untraced=True)),
+        "mypyc, not compiled": load_parser_class(mypyc_source),
+    }
+    with tempfile.TemporaryDirectory() as path:
+        t0 = time.perf_counter()
+        parser_classes["mypyc, compiled"] = compile_parser_class(mypyc_source, path)
+        print(f"Compiled with mypyc in {time.perf_counter() - t0:.1f} sec")
+        print(f"{args.filename}: best of {args.repeat}")
+        baseline = None
+        for name, parser_class in parser_classes.items():
+            dt = time_parser(parser_class, tokens, args.repeat)
+            baseline = baseline or dt
+            print(f"{name:>19}: {dt:.3f} sec; {baseline / dt:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
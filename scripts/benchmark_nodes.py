@@ -0,0 +1,127 @@
+#!/usr/bin/env python3.8
+
+"""Compare the parse trees of generated Python parsers, as lists and as nodes.
+
+For each kind of tree (see pegen.nodes), the parser for a grammar whose
+alternatives have no actions is timed on the input, along with walking the
+tree it returns, and the memory the tree takes is measured.
+
+Example:
+
+$ scripts/benchmark_nodes.py -g data/exprs.gram data/xl.txt
+"""
+
+import argparse
+import gc
+import io
+import sys
+import time
+import tokenize
+import tracemalloc
+
+from typing import Any, Dict, Tuple, Type
+
+sys.path.insert(0, ".")
+from pegen.build import build_parser
+from pegen.nodes import Node, TupleNode
+from pegen.parser import Parser
+from pegen.python_generator import PythonParserGenerator
+from pegen.tokenizer import Tokenizer
+
+argparser = argparse.ArgumentParser(
+    prog="benchmark_nodes", description="Compare parse trees of lists and of nodes"
+)
+argparser.add_argument("-g", "--grammar-file", default="data/exprs.gram", help="Grammar file path")
+argparser.add_argument("-n", "--repeat", type=int, default=5, help="Number of timed runs")
+argparser.add_argument("filename", nargs="?", default="data/xl.txt", help="Input file")
+
+KINDS = ("list", "slots", "tuple")
+
+
+def generate_parser_class(grammar_file: str, nodes: str) -> Type[Parser]:
+    grammar, parser, tokenizer = build_parser(grammar_file)
+    out = io.StringIO()
+    gen = PythonParserGenerator(grammar, out, nodes=nodes)
+    gen.generate(grammar_file)
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    return ns["GeneratedParser"]
+
+
+def parse(parser_class: Type[Parser], source: str) -> Any:
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    parser = parser_class(tokenizer)
+    tree = parser.start()
+    if tree is None:
+        raise parser.make_syntax_error()
+    return tree
+
+
+def walk(tree: Any, sizes: bool = False) -> int:
+    """Return the number of lists and nodes in *tree*, visiting each value.
+
+    With sizes, return the memory that they take instead.
+    """
+    count = 0
+    stack = [tree]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        value = pop()
+        if isinstance(value, list):
+            extend(value)
+        elif isinstance(value, Node):
+            extend([getattr(value, name) for name in value._fields])
+        elif isinstance(value, TupleNode):
+            extend(value[:-2])
+        else:
+            continue
+        count += sys.getsizeof(value) if sizes else 1
+    return count
+
+
+def measure(
+    parser_class: Type[Parser], source: str, repeat: int
+) -> Tuple[float, float, int, int, int]:
+    """Return the best times to parse and to walk, the tree size and memory.
+
+    The memory is that of the lists or nodes, and that of the whole tree,
+    including its tokens and their positions.
+    """
+    best_parse = best_walk = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        tree = parse(parser_class, source)
+        t1 = time.perf_counter()
+        count = walk(tree)
+        t2 = time.perf_counter()
+        best_parse = min(best_parse, t1 - t0)
+        best_walk = min(best_walk, t2 - t1)
+        del tree
+    # Only the tree (and the tokens in it) is left after parsing.
+    gc.collect()
+    tracemalloc.start()
+    tree = parse(parser_class, source)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return best_parse, best_walk, count, walk(tree, sizes=True), size
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    with open(args.filename) as file:
+        source = file.read()
+    print(f"{args.filename}: best of {args.repeat}")
+    for kind in KINDS:
+        parser_class = generate_parser_class(args.grammar_file, kind)
+        dt_parse, dt_walk, count, nodes_size, size = measure(parser_class, source, args.repeat)
+        print(
+            f"{kind:>5}: parse {dt_parse:.3f} sec; walk {dt_walk:.3f} sec;"
+            f" {count} lists or nodes, {nodes_size / 2**20:.1f} MiB;"
+            f" {size / 2**20:.1f} MiB in all"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,10 @@ import traceback
 from glob import glob
 from pathlib import PurePath
 
-from typing import List, Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
 sys.path.insert(0, ".")
+from pegen.batch import parse_files
 from pegen.build import build_parser_and_generator
 from pegen.testutil import print_memstats
 from scripts import show_parse
@@ -37,6 +38,14 @@ argparser.add_argument(
     "-v", "--verbose", action="store_true", help="Display detailed errors for failures"
 )
 argparser.add_argument("-t", "--tree", action="count", help="Compare parse tree to official AST")
+argparser.add_argument(
+    "--two-phase",
+    action="store_true",
+    help="Parse with two_phase=True: evicting first, and again only on failure",
+)
+argparser.add_argument(
+    "-j", "--jobs", type=int, help="Parse in this many worker processes (0 means one per CPU)",
+)
 
 
 def report_status(
@@ -149,7 +158,6 @@ def main() -> None:
     files = []
     trees = {}  # Trees to compare (after everything else is done)
 
-    t0 = time.time()
     for file in sorted(glob(f"{directory}/**/*.py", recursive=True)):
         # Only attempt to parse Python files and files that are not excluded
         should_exclude_file = False
@@ -159,18 +167,41 @@ def main() -> None:
                 break
 
         if not should_exclude_file:
+            files.append(file)
+
+    def parse_serially() -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+        for file in files:
             try:
-                tree = parse.parse_file(file)
-                if args.tree:
-                    trees[file] = tree
-                if not args.short:
-                    report_status(succeeded=True, file=file, verbose=verbose)
+                yield file, parse.parse_file(file, two_phase=args.two_phase), None
             except Exception as error:
-                report_status(
-                    succeeded=False, file=file, verbose=verbose, error=error, short=args.short
-                )
-                errors += 1
-            files.append(file)
+                yield file, None, error
+
+    t0 = time.time()
+    if args.jobs is None:
+        results = parse_serially()
+    else:
+        results = (
+            (result.path, result.tree, result.error)
+            for result in parse_files(
+                parse,
+                files,
+                workers=args.jobs or None,
+                ordered=True,
+                keep_trees=bool(args.tree),
+                options={"two_phase": args.two_phase},
+            )
+        )
+    for file, tree, error in results:
+        if error is None:
+            if args.tree:
+                trees[file] = tree
+            if not args.short:
+                report_status(succeeded=True, file=file, verbose=verbose)
+        else:
+            report_status(
+                succeeded=False, file=file, verbose=verbose, error=error, short=args.short
+            )
+            errors += 1
     t1 = time.time()
 
     total_seconds = t1 - t0
@@ -1,13 +1,31 @@
 import ast
+import asyncio
+import importlib
+import io
+import itertools
+import mmap
 from pathlib import PurePath
 import textwrap
-from typing import Optional, Sequence
+import tokenize
+from typing import Any, List, Optional, Sequence
 import traceback
 
 import pytest  # type: ignore
 
+import pegen.tokenizer
+from pegen.aio import AsyncParser, parse_async
+from pegen.batch import parse_files
+from pegen.build import compile_mypyc_extension, compile_tokenizer_extension
 from pegen.grammar_parser import GeneratedParser as GrammarParser
-from pegen.testutil import parse_string, generate_parser_c_extension, generate_c_parser_source
+from pegen.python_generator import PythonParserGenerator
+from pegen.testutil import (
+    generate_c_parser_source,
+    generate_parser_c_extension,
+    import_file,
+    make_parser,
+    parse_string,
+)
+from pegen.tokenizer import generate_tokens_c, significant, Tokenizer
 
 
 def check_input_strings_for_grammar(
@@ -80,6 +98,302 @@ def test_c_parser(tmp_path: PurePath) -> None:
         assert ast.dump(the_ast) == ast.dump(expected_ast)
 
 
+def test_evict_at_commit_points(tmp_path: PurePath) -> None:
+    grammar_source = """
+    @sync stmt
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: ( 'pass' ~ NEWLINE { _Py_Pass(EXTRA) }
+                   | a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+                   )
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    source = "a + 1\npass\nb + c + 2\n" * 100
+    expected = extension.parse_string(source)
+    the_ast = extension.parse_string(source, evict=True)
+    assert ast.dump(the_ast) == ast.dump(ast.parse(source))
+    assert ast.dump(the_ast, include_attributes=True) == ast.dump(
+        expected, include_attributes=True
+    )
+    the_file = tmp_path / "evict.py"
+    with open(the_file, "w") as fd:
+        fd.write(source)
+    the_ast = extension.parse_file(str(the_file), evict=True)
+    assert ast.dump(the_ast) == ast.dump(ast.parse(source))
+    with pytest.raises(SyntaxError):
+        extension.parse_string("a + 1\n+\n", evict=True)
+
+
+def test_two_phase(tmp_path: PurePath) -> None:
+    grammar_source = """
+    @sync a
+    start: a NUMBER NEWLINE $ | a NAME NEWLINE $
+    a: NAME NAME
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    # Evicting breaks the promise of the sync rule; the second pass rescues it.
+    with pytest.raises(SyntaxError):
+        extension.parse_string("x y z\n", evict=True)
+    extension.parse_string("x y z\n", two_phase=True)
+    extension.parse_string("x y 1\n", two_phase=True)
+    with pytest.raises(SyntaxError) as excinfo:
+        extension.parse_string("x y z w\n", two_phase=True)
+    assert excinfo.value.offset == 7
+    the_file = tmp_path / "two_phase.py"
+    with open(the_file, "w") as fd:
+        fd.write("x y z w\n")
+    with pytest.raises(SyntaxError) as excinfo:
+        extension.parse_file(str(the_file), two_phase=True)
+    assert excinfo.value.filename == str(the_file)
+    assert excinfo.value.text == "x y z w\n"
+
+
+def test_reuse_parser(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    parser = extension.new_parser()
+    # Inputs larger than one memo block, and smaller than the previous ones.
+    for source in ["a + 1\nb + c + 2\n" * 100, "x\n", "a + 1\n" * 10]:
+        the_ast = extension.parse_string(source, parser=parser)
+        assert ast.dump(the_ast) == ast.dump(ast.parse(source))
+        with pytest.raises(SyntaxError) as excinfo:
+            extension.parse_string(source + "+\n", parser=parser)
+        assert excinfo.value.lineno == source.count("\n") + 1
+    the_file = tmp_path / "reuse.py"
+    with open(the_file, "w") as fd:
+        fd.write("a + b\n")
+    the_ast = extension.parse_file(str(the_file), two_phase=True, parser=parser)
+    assert ast.dump(the_ast) == ast.dump(ast.parse("a + b\n"))
+    with pytest.raises(TypeError):
+        extension.parse_string("x\n", parser=object())
+
+
+def test_parse_buffer_and_mapped_file(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   | a=STRING+ { concatenate_strings(p, a) }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    sources = [
+        b"a + 1\nb + 'c\xc3\xa9'\n",  # Tokenized in place
+        b"# coding: utf-8\na + 'c\xc3\xa9'\n",
+        b"a + 1\r\nb + 2",  # Copied by the tokenizer
+        b"# coding: latin-1\na + 'c\xe9'\n",
+        b"",
+    ]
+    for i, source in enumerate(sources):
+        expected = ast.dump(ast.parse(source))
+        for buffer in [source, bytearray(source), memoryview(source)]:
+            assert ast.dump(extension.parse_buffer(buffer)) == expected
+        assert ast.dump(extension.parse_buffer(source, two_phase=True)) == expected
+        the_file = tmp_path / f"input{i}.py"
+        with open(the_file, "wb") as fd:
+            fd.write(source)
+        assert ast.dump(extension.parse_file(str(the_file), mmap=True)) == expected
+        if source:  # An empty file cannot be mapped
+            with open(the_file, "rb") as fd:
+                with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    assert ast.dump(extension.parse_buffer(mapped)) == expected
+
+    with pytest.raises(ValueError):
+        extension.parse_buffer(b"a\0 + 1\n")
+    with pytest.raises(TypeError):
+        extension.parse_buffer("a + 1\n")
+    the_file = tmp_path / "error.py"
+    with open(the_file, "wb") as fd:
+        fd.write(b"a + 1\na +\n")
+    for two_phase in [False, True]:
+        with pytest.raises(SyntaxError) as excinfo:
+            extension.parse_file(str(the_file), mmap=True, two_phase=two_phase)
+        assert excinfo.value.filename == str(the_file)
+        assert excinfo.value.lineno == 2
+        assert excinfo.value.text == "a +\n"
+
+
+def test_parse_files(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    sources = ["a + 1\n" * 100, "b +\n", "c\n"]
+    paths = []
+    for i, source in enumerate(sources):
+        paths.append(str(tmp_path / f"input{i}.py"))
+        with open(paths[-1], "w") as fd:
+            fd.write(source)
+    for parser in [extension, extension.__file__]:
+        results = list(
+            parse_files(
+                parser,
+                paths,
+                workers=2,
+                ordered=True,
+                keep_trees=True,
+                options={"two_phase": True},
+            )
+        )
+        assert [result.path for result in results] == paths
+        assert ast.dump(results[0].tree) == ast.dump(ast.parse(sources[0]))
+        assert isinstance(results[1].error, SyntaxError)
+        assert results[1].error.filename == paths[1]
+        assert ast.dump(results[2].tree) == ast.dump(ast.parse(sources[2]))
+
+
+def test_parse_async(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    source = "a + 1\nb + c + 2\n" * 10000
+    path = str(tmp_path / "input.py")
+    with open(path, "w") as fd:
+        fd.write(source)
+
+    def stream(data: bytes, eof: bool = True) -> asyncio.StreamReader:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        if eof:
+            reader.feed_eof()
+        return reader
+
+    async def main() -> None:
+        parser = AsyncParser(extension, max_concurrency=1, options={"two_phase": True})
+        assert ast.dump(await parser.parse(path)) == ast.dump(ast.parse(source))
+        tree = await parser.parse(stream(source.encode()))
+        assert ast.dump(tree) == ast.dump(ast.parse(source))
+        with pytest.raises(SyntaxError) as excinfo:
+            await parse_async(extension, stream(b"a +\n" + source.encode()), "<test>")
+        assert excinfo.value.filename == "<test>"
+        assert excinfo.value.lineno == 1
+        # Waiting for more input; cancelling it frees the only slot.
+        task = asyncio.ensure_future(parser.parse(stream(b"a +", eof=False)))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        tree = await asyncio.wait_for(parser.parse(stream(b"b\n")), 10)
+        assert ast.dump(tree) == ast.dump(ast.parse("b\n"))
+
+    asyncio.run(main())
+
+
+def test_parse_iter(tmp_path: PurePath) -> None:
+    grammar_source = """
+    @stream stmt
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: ( 'pass' ~ NEWLINE { _Py_Pass(EXTRA) }
+                   | a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+                   )
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    source = "a + 1\npass\nb + c + 2\n" * 10
+    expected = [ast.dump(stmt) for stmt in ast.parse(source).body]
+    stmts: List[ast.AST] = []
+    assert extension.parse_string_iter(source, stmts.append) is None
+    assert [ast.dump(stmt) for stmt in stmts] == expected
+    the_file = tmp_path / "stream.py"
+    with open(the_file, "w") as fd:
+        fd.write(source)
+    stmts.clear()
+    extension.parse_file_iter(str(the_file), stmts.append)
+    assert [ast.dump(stmt) for stmt in stmts] == expected
+    with pytest.raises(TypeError):
+        extension.parse_string_iter(source, None)
+    stmts.clear()
+    with pytest.raises(SyntaxError):
+        extension.parse_string_iter("a + 1\n+\n", stmts.append)
+    assert len(stmts) == 1
+
+
+def test_parse_iter_empty_match(tmp_path: PurePath) -> None:
+    grammar_source = """
+    @stream stmts
+    start[mod_ty]: a=stmts $ { Module(a, NULL, p->arena) }
+    stmts[asdl_seq*]: a=stmt* { a }
+    stmt[stmt_ty]: a=NAME NEWLINE { _Py_Expr(a, EXTRA) }
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path)
+    stmts: List[ast.AST] = []
+    with pytest.raises(SyntaxError):
+        extension.parse_string_iter("a\nb\n+\n", stmts.append)
+    assert len(stmts) == 2
+
+
+def test_memo_flags(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty] (memo): a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty] (nomemo): ( n=NAME { n }
+                            | n=NUMBER { n }
+                            )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    parser_source = generate_c_parser_source(grammar)
+    assert "is_memoized(p, start_type, &res)" in parser_source
+    assert "is_memoized(p, term_type, &res)" not in parser_source
+    parser_source = generate_c_parser_source(grammar, selective_memo=True)
+    assert "is_memoized(p, start_type, &res)" not in parser_source
+    assert "is_memoized(p, stmt_type, &res)" in parser_source
+    assert "is_memoized(p, expression_type, &res)" in parser_source
+    assert "insert_memo(p, mark, _loop0_1_type, seq)" not in parser_source
+
+    extension = generate_parser_c_extension(grammar, tmp_path, selective_memo=True)
+    source = "a + 1\nb + c + 2\n"
+    assert ast.dump(extension.parse_string(source)) == ast.dump(ast.parse(source))
+
+
 def test_lookahead(tmp_path: PurePath) -> None:
     grammar = """
     start: NAME &NAME expr NEWLINE? ENDMARKER
@@ -134,6 +448,20 @@ def test_left_recursion(tmp_path: PurePath) -> None:
     check_input_strings_for_grammar(grammar, tmp_path, valid_cases)
 
 
+def test_left_recursive_loop(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: a=expr NEWLINE { _Py_Expr(a, EXTRA) }
+    expr[expr_ty]:
+        | l=expr '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+        | l=expr '-' ~ r=term { _Py_BinOp(l, Sub, r, EXTRA) }
+        | term
+    term[expr_ty]: l=term '*' r=atom { _Py_BinOp(l, Mult, r, EXTRA) } | atom
+    atom[expr_ty]: NAME | NUMBER | '(' e=expr ')' { e }
+    """
+    verify_ast_generation(grammar_source, "a - 1 + b * 2 * (c - 3) - 4\n", tmp_path)
+
+
 def test_advanced_left_recursive(tmp_path: PurePath) -> None:
     grammar = """
     start: NUMBER | sign start
@@ -271,6 +599,45 @@ def test_ternary_operator(tmp_path: PurePath) -> None:
     verify_ast_generation(grammar_source, stmt, tmp_path)
 
 
+def test_inline_groups(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start: NAME ['.' NAME] ('.' '.')* [',' NUMBER] NEWLINE? ENDMARKER
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    parser_source = generate_c_parser_source(grammar)
+    # No helper rules for the groups are declared.
+    assert "_tmp_" not in parser_source[: parser_source.index("// start:")]
+    # An optional group that fails part way goes back to where it started.
+    valid_cases = ["a", "a.b", "a . .", "a.b.. . . , 1"]
+    invalid_cases = ["a.", "a . . .", "a ,", "a, 1.b"]
+    check_input_strings_for_grammar(grammar_source, tmp_path, valid_cases, invalid_cases)
+
+
+def test_mypyc_extension(tmp_path: PurePath) -> None:
+    pytest.importorskip("mypyc")
+    grammar_source = """
+    @keywords reserved
+    start: a=stmt+ $ { a }
+    stmt: 'del' ~ a=','.NAME+ NEWLINE { ('del', [n.string for n in a]) }
+        | a=NAME b=['as' c=NAME { c.string }] '=' e=expr NEWLINE { ('=', a.string, b, e) }
+    expr: l=expr '+' r=term { ('+', l, r) } | term
+    term: NUMBER { int(number.string) } | '(' expr ')' { expr } | NAME { name.string }
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    source_path = tmp_path / "parse.py"
+    with open(source_path, "w") as file:
+        PythonParserGenerator(grammar, file, mypyc=True).generate("parse.py")
+    extension_path = compile_mypyc_extension(str(source_path), build_dir=str(tmp_path / "build"))
+    extension = import_file("parse", extension_path)
+    assert not extension.__file__.endswith(".py")
+    source = "del x, y\nz as w = 1 + (2 + x)\n"
+    parser_class = make_parser(grammar_source)
+    assert parse_string(source, extension.GeneratedParser) == parse_string(source, parser_class)
+    for source in "del 1\n", "z as = 1\n", "del = 1\n":
+        with pytest.raises(SyntaxError):
+            parse_string(source, extension.GeneratedParser)
+
+
 @pytest.mark.parametrize("text", ["a b 42 b a", "名 名 42 名 名"])
 def test_syntax_error_for_string(text: str, tmp_path: PurePath) -> None:
     grammar_source = """
@@ -333,3 +700,89 @@ def test_extension_name(tmp_path: PurePath) -> None:
 
     assert "PyInit_alternative_name" in parser_source
     assert '.m_name = "alternative_name"' in parser_source
+
+
+def test_c_tokenizer(tmp_path: PurePath, monkeypatch: Any) -> None:
+    compile_tokenizer_extension(str(tmp_path))
+    monkeypatch.setattr(pegen.tokenizer, "ctokenizer", importlib.import_module("pegen.ctokenizer"))
+    source = textwrap.dedent(
+        """\
+        async def f(x):  # comment
+            '''doc
+            string'''
+            return (x +
+                    'é' + \\
+                    y)
+
+        z = f(1)
+        """
+    )
+    expected = [
+        tok for tok in tokenize.generate_tokens(io.StringIO(source).readline) if significant(tok)
+    ]
+    assert list(generate_tokens_c(source)) == expected
+
+    parser_class = make_parser(
+        """
+        start: stmt* $
+        stmt: NAME '=' NAME '(' NUMBER ')' NEWLINE
+        """
+    )
+    parser = parser_class(Tokenizer(generate_tokens_c("a = b(1)\nc = d(2)\n")))
+    assert parser.start() is not None
+
+    tokens = generate_tokens_c("x = 1\ny = '\n", "file.py")
+    assert [tok.string for tok in itertools.islice(tokens, 5)] == ["x", "=", "1", "\n", "y"]
+    with pytest.raises(SyntaxError) as excinfo:
+        list(tokens)
+    assert excinfo.value.filename == "file.py"
+    assert excinfo.value.lineno == 2
+
+
+def test_c_lexer(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start[mod_ty]: a=stmt* $ { Module(a, NULL, p->arena) }
+    stmt[stmt_ty]: if_stmt | a=expression NEWLINE { _Py_Expr(a, EXTRA) }
+    if_stmt[stmt_ty]: 'if' c=expression ':' b=block { _Py_If(c, b, NULL, EXTRA) }
+    block[asdl_seq*]: NEWLINE INDENT a=stmt+ DEDENT { a } | a=stmt { singleton_seq(p, a) }
+    expression[expr_ty]: ( l=expression '+' r=term { _Py_BinOp(l, Add, r, EXTRA) }
+                         | l=expression '**' r=term { _Py_BinOp(l, Pow, r, EXTRA) }
+                         | t=term { t }
+                         )
+    term[expr_ty]: ( n=NAME { n }
+                   | n=NUMBER { n }
+                   | a=STRING+ { concatenate_strings(p, a) }
+                   | '(' e=expression ')' { e }
+                   )
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    extension = generate_parser_c_extension(grammar, tmp_path, lexer=True)
+    source = textwrap.dedent(
+        """\
+        if a:  # comment
+            x + 1.5e3 + 'é' + '''b
+        c'''
+
+            if (b +
+          0x1f): y ** \\
+                z
+        w + rb"x" b"y"
+        """
+    )
+    expected = ast.dump(ast.parse(source), include_attributes=True)
+    assert ast.dump(extension.parse_string(source), include_attributes=True) == expected
+    assert ast.dump(extension.parse_buffer(source.encode()), include_attributes=True) == expected
+    the_file = tmp_path / "input.py"
+    with open(the_file, "w") as fd:
+        fd.write(source)
+    for mmap in [False, True]:
+        tree = extension.parse_file(str(the_file), mmap=mmap)
+        assert ast.dump(tree, include_attributes=True) == expected
+
+    with pytest.raises(SyntaxError) as excinfo:
+        extension.parse_string("a + b\nc $ d\n")
+    assert (excinfo.value.lineno, excinfo.value.offset) == (2, 3)
+    with pytest.raises(IndentationError):
+        extension.parse_string("if a:\n    b\n  c\n")
+    with pytest.raises(SyntaxError, match="EOL while scanning"):
+        extension.parse_string("a + 'b\n")
@@ -1,17 +1,38 @@
+import asyncio
 import io
+import pathlib
 import textwrap
+import token
+import tokenize
 
+from pathlib import PurePath
 from tokenize import TokenInfo, NAME, NEWLINE, NUMBER, OP
 
-from typing import Any, Dict, List, Type
+from typing import Any, Dict, Iterator, List, Type
 
 import pytest  # type: ignore
 
+from pegen.aio import AsyncParser, parse_async
+from pegen.batch import parse_files
 from pegen.grammar_parser import GeneratedParser as GrammarParser
 from pegen.grammar import GrammarVisitor, GrammarError, Grammar
 from pegen.grammar_visualizer import ASTGrammarPrinter
-from pegen.parser import Parser
+from pegen.lexer_generator import python_lexer
+from pegen.parser import Parser, parse_two_phase
 from pegen.python_generator import PythonParserGenerator
+from pegen.registry import ParserRegistry
+from pegen.tokenizer import (
+    ColumnToken,
+    CompactTokenizer,
+    EVICTED_MEMO,
+    EVICTED_TOKEN,
+    IncrementalTokenizer,
+    significant,
+    TextEdit,
+    TokenColumns,
+    Tokenizer,
+)
+from pegen.vm import VMParser
 
 from pegen.testutil import generate_parser, parse_string, make_parser
 
@@ -320,6 +341,31 @@ def test_left_recursive() -> None:
     ]
 
 
+def test_left_recursive_loop() -> None:
+    grammar_source = """
+    start: expr NEWLINE { expr }
+    expr: l=expr '+' r=term { ('+', l, r) } | expr '-' ~ term { ('-', expr, term) } | t=term { t }
+    term: NUMBER { int(number.string) } | '(' expr ')' { expr }
+    sum: sum '+' term | term | sum '-' term
+    a: b '+' term | term
+    b: a
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    # Indirect recursion, or a recursive alternative after another one, grows the seed.
+    assert set(genr.left_rec_loops) == {"expr"}
+    genr.generate("<string>")
+    assert out.getvalue().count("@memoize_left_rec_rule(") == 2
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    node = parse_string("1 - 2 + 3 - (4 + 5)\n", parser_class)
+    assert node == ("-", ("+", ("-", 1, 2), 3), ("+", 4, 5))
+    with pytest.raises(SyntaxError):
+        parse_string("1 - )\n", parser_class)
+
+
 def test_python_expr() -> None:
     grammar = """
     start: expr NEWLINE? $ { ast.Expression(expr, lineno=1, col_offset=0) }
@@ -537,6 +583,228 @@ def test_cut() -> None:
     ]
 
 
+def test_cut_code_only_where_needed() -> None:
+    grammar_source = """
+    start: '(' ~ expr ')' | '(' NAME ')' | NAME
+    expr: NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    PythonParserGenerator(grammar, out).generate("<string>")
+    assert out.getvalue().count("cut = False") == 1
+    assert out.getvalue().count("if cut: return None") == 1
+    parser_class = make_parser(grammar_source)
+    assert parse_string("x\n", parser_class)
+    with pytest.raises(SyntaxError):
+        parse_string("(x)", parser_class)
+
+
+def test_generated_locals_rule_names() -> None:
+    # Rules and items may have the names of the locals of generated rules.
+    grammar_source = """
+    start: tokenizer NEWLINE $ | NAME '+' NAME NEWLINE $
+    tokenizer: NAME
+    """
+    parser_class = make_parser(grammar_source)
+    assert parse_string("a + b\n", parser_class)
+    grammar_source = """
+    start: children=append+ NEWLINE $ { children }
+    append: tokenizer=NAME value=['=' mark=sum { mark }] { (tokenizer.string, value) }
+    sum: sum '+' result=NUMBER { sum + int(result.string) } | NUMBER { int(number.string) }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    for parser_class in [
+        generate_parser(grammar),
+        generate_parser(grammar, mypyc=True),
+        generate_parser(grammar, vm=True),
+    ]:
+        assert parse_string("a = 1 + 2 b\n", parser_class) == [[("a", 3)], [("b", None)]]
+
+
+def test_gather_of_one() -> None:
+    grammar_source = """
+    start: a=','.NAME+ NEWLINE ENDMARKER { [t.string for t in a] }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    for untraced in False, True:
+        out = io.StringIO()
+        PythonParserGenerator(grammar, out, untraced=untraced).generate("<string>")
+        ns: Dict[str, Any] = {}
+        exec(out.getvalue(), ns)
+        parser_class = ns["GeneratedParser"]
+        assert parse_string("x\n", parser_class) == ["x"]
+        assert parse_string("x, y\n", parser_class) == ["x", "y"]
+
+
+def test_keyword_token_names() -> None:
+    grammar = """
+    start: ASYNC? AWAIT? TYPE_COMMENT? NAME NEWLINE ENDMARKER
+    """
+    parser_class = make_parser(grammar)
+    assert parse_string("x\n", parser_class)
+
+
+def test_reserved_keywords() -> None:
+    grammar_source = """
+    @keywords reserved
+    start: a=stmt+ $ { a }
+    stmt: a=NAME '=' b=NAME NEWLINE { (a.string, b.string) } | 'pass' NEWLINE { 'pass' }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    PythonParserGenerator(grammar, out).generate("<string>")
+    assert "_next_token.string not in self._reserved" in out.getvalue()
+    for vm in False, True:
+        parser_class = generate_parser(grammar, vm=vm)
+        assert parser_class.KEYWORDS == {"pass"}
+        assert parse_string("x = y\npass\n", parser_class) == [[("x", "y")], ["pass"]]
+        with pytest.raises(SyntaxError):
+            parse_string("x = pass\n", parser_class)
+    # Keywords are still collected when NAME matches them.
+    parser_class = make_parser(grammar_source.replace("@keywords reserved", ""))
+    assert parser_class.KEYWORDS == {"pass"}
+    assert parse_string("pass = x\n", parser_class) == [[("pass", "x")]]
+    with pytest.raises(GrammarError):
+        make_parser(grammar_source.replace("reserved", "soft"))
+
+
+def test_parser_nodes() -> None:
+    grammar_source = """
+    start: s=stmt+ $
+    stmt: a=NAME '=' expr NEWLINE | expr [';'] NEWLINE
+    expr: expr '+' NUMBER | NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    source = "x = 1 + 2\n3\n"
+    for nodes in "slots", "tuple":
+        parser_class = generate_parser(grammar, nodes=nodes)
+        tree = parse_string(source, parser_class)
+        assert type(tree).__name__ == "start_node"
+        assert tree._fields == ("s", "endmarker")
+        first, second = tree.s
+        assert type(first).__name__ == "stmt_node1"
+        assert first._fields == ("a", "literal", "expr", "newline")
+        assert (first.a.string, first.start, first.end) == ("x", 0, 6)
+        expr = first.expr
+        assert type(expr).__name__ == "expr_node1"
+        assert [expr.expr.string, expr.literal.string, expr.number.string] == ["1", "+", "2"]
+        assert (expr.start, expr.end) == (2, 5)
+        # A single item is not wrapped, unless it is optional.
+        assert type(second).__name__ == "stmt_node2"
+        assert (second.expr.string, second.opt, second.start, second.end) == ("3", None, 6, 8)
+        assert repr(second).startswith("stmt_node2(expr=TokenInfo(")
+    assert tree == (tree.s, tree.endmarker, 0, 9)
+    with pytest.raises(ValueError):
+        generate_parser(grammar, nodes="dict")
+
+
+def test_inline_groups() -> None:
+    grammar_source = """
+    start: a=stmt+ $ { a }
+    stmt: n=NAME b=['as' z=NAME { z }] c=(',' NUMBER)* [';' ';'] NEWLINE { (n.string, b, c) }
+        | ('del' NAME) NEWLINE { 'del' }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    PythonParserGenerator(grammar, out).generate("<string>")
+    assert "def _tmp_" not in out.getvalue()
+    parser_class = generate_parser(grammar)
+    helpers_class = generate_parser(grammar, inline_size=0)
+    source = "x as y, 1, 2 ;;\nz ;;\ndel w\n"
+    assert parse_string(source, parser_class) == parse_string(source, helpers_class)
+    # An optional group that fails part way goes back to where it started.
+    for source in "x as , 1\n", "x ; y\n", "x, 1 as y\n":
+        with pytest.raises(SyntaxError) as inlined:
+            parse_string(source, parser_class)
+        with pytest.raises(SyntaxError) as helpers:
+            parse_string(source, helpers_class)
+        assert inlined.value.args == helpers.value.args
+    grammar_source = textwrap.dedent(grammar_source)
+    grammar = parse_string("@noinline 'stmt'\n" + grammar_source, GrammarParser)
+    out = io.StringIO()
+    PythonParserGenerator(grammar, out).generate("<string>")
+    assert "def _tmp_" in out.getvalue()
+    with pytest.raises(GrammarError):
+        make_parser("@noinline 'stmts'\n" + grammar_source)
+
+
+def test_mypyc_parser() -> None:
+    grammar_source = """
+    @sync stmt
+    @keywords reserved
+    start: a=stmt+ $ { a }
+    stmt: 'del' ~ a=','.NAME+ NEWLINE { ('del', [n.string for n in a]) }
+        | a=NAME b=['as' c=NAME { c.string }] '=' e=expr NEWLINE { ('=', a.string, b, e) }
+        | e=expr NEWLINE { e }
+    expr: l=expr '+' r=term { ('+', l, r) } | l=diff '-' r=term { ('-', l, r) } | term
+    diff: expr
+    term: l=term '*' r=factor { ('*', l, r) } | factor
+    factor: NUMBER { int(number.string) } | '(' expr ')' { expr } | NAME { name.string }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    PythonParserGenerator(grammar, out, mypyc=True).generate("<string>")
+    assert "@final" in out.getvalue()
+    assert "@memoize" not in out.getvalue()
+    mypyc_class = generate_parser(grammar, mypyc=True)
+    parser_class = generate_parser(grammar)
+    source = "del x, y\nz as w = 1 - 2 * (3 + x) - 4 * 5\n6\n"
+    assert parse_string(source, mypyc_class) == parse_string(source, parser_class)
+    for source in "del 1\n", "z as = 1\n", "del = 1\n":
+        with pytest.raises(SyntaxError):
+            parse_string(source, mypyc_class)
+    source = "x = 1\ny = 2\n"
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    assert mypyc_class(tokenizer, evict=True).start() == parse_string(source, parser_class)
+    assert tokenizer._evicted
+    with pytest.raises(ValueError):
+        generate_parser(grammar, mypyc=True, nodes="slots")
+
+
+def test_vm_parser() -> None:
+    grammar_source = """
+    start: a=stmt+ $ { a }
+    stmt: 'del' ~ a=','.NAME+ NEWLINE { ('del', [n.string for n in a]) }
+        | &NAME a=NAME '=' !'=' e=expr NEWLINE { ('=', a.string, e) }
+        | e=expr ['!'] NEWLINE { e }
+    expr: l=expr '+' r=term { ('+', l, r) } | l=diff '-' r=term { ('-', l, r) } | term { term }
+    diff: expr
+    term: l=term '*' r=factor { ('*', l, r) } | factor { factor }
+    factor: NUMBER { int(number.string) } | '(' expr ')' { expr } | NAME { name.string }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    vm_class = generate_parser(grammar, vm=True)
+    parser_class = generate_parser(grammar)
+    source = "del x, y\nz = 1 - 2 * (3 + x) - 4 * 5\n6 !\n"
+    assert parse_string(source, vm_class) == parse_string(source, parser_class)
+    assert parse_string(source, vm_class, verbose=True) == parse_string(source, parser_class)
+    for source in "del 1\n", "z == 1\n", "1 +\n":
+        with pytest.raises(SyntaxError):
+            parse_string(source, vm_class)
+    # Any rule can be matched, as with generated methods.
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("2 * 3 + 1\n").readline))
+    vm_parser = vm_class(tokenizer)
+    assert isinstance(vm_parser, VMParser)
+    assert vm_parser.expr() == ("+", ("*", 2, 3), 1)
+
+
+def test_vm_parser_evict() -> None:
+    grammar_source = """
+    @sync stmt
+    start: stmt* $
+    stmt: 'print' ~ expr NEWLINE | expr NEWLINE
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    parser_class = generate_parser(grammar, vm=True)
+    source = "1 + 2\nprint 3\n4\n"
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    parser = parser_class(tokenizer, evict=True)
+    assert parser.start() == parse_string(source, generate_parser(grammar))
+    assert tokenizer._evicted == len(tokenizer._tokens) - 2
+
+
 def test_dangling_reference() -> None:
     grammar = """
     start: foo ENDMARKER
@@ -563,6 +831,660 @@ def test_missing_start() -> None:
         parser_class = make_parser(grammar)
 
 
+def test_memo_table() -> None:
+    grammar_source = """
+    start: expr NEWLINE
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    genr.generate("<string>")
+    assert "@memoize_rule(" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1 + 2\n").readline))
+    parser = ns["GeneratedParser"](tokenizer)
+    assert parser.start()
+    assert not parser._cache
+    # One slot per token position, plus one past the last token.
+    assert len(tokenizer._memo) == len(tokenizer._tokens) + 1
+    tree, endmark = tokenizer._memo[0][genr.rule_ids["expr"]]
+    assert endmark == 3
+    tree, endmark = tokenizer._memo[2][genr.rule_ids["term"]]
+    assert endmark == 3
+
+
+def test_dict_memo_fallback() -> None:
+    grammar_source = """
+    start: expr NEWLINE
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, dict_memo=True)
+    genr.generate("<string>")
+    assert "_rule(" not in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1 + 2\n").readline))
+    parser = ns["GeneratedParser"](tokenizer)
+    assert parser.start() == parse_string("1 + 2\n", make_parser(grammar_source))
+    assert (0, "expr", ()) in parser._cache
+
+
+def test_evict_at_commit_points() -> None:
+    grammar_source = """
+    @sync stmt
+    start: stmt* $
+    stmt: 'print' ~ expr NEWLINE | expr NEWLINE
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    source = "1 + 2\nprint 3\n4\n"
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    parser = parser_class(tokenizer, evict=True)
+    assert parser.start() == parse_string(source, parser_class)
+    # Everything but the last token read at the final commit (the NEWLINE)
+    # and the ENDMARKER is gone.
+    assert tokenizer._evicted == len(tokenizer._tokens) - 2
+    assert tokenizer._evicted_memo > 0
+    assert all(memo is EVICTED_MEMO for memo in tokenizer._memo[: tokenizer._evicted])
+    assert all(tok is EVICTED_TOKEN for tok in tokenizer._tokens[: tokenizer._evicted])
+
+
+def test_token_columns() -> None:
+    sources = [
+        'if x:\n    y = \'a\' \\\n  + """b\n c"""  # comment\n\nz = 1\n',
+        "def f():\n    return 1",  # No newline at the end
+        "x = 'caf\u00e9'\r\ny = 2\r\n",
+    ]
+    for source in sources:
+        tokengen = tokenize.generate_tokens(io.StringIO(source).readline)
+        expected = [tok for tok in tokengen if significant(tok)]
+        columns = TokenColumns(source)
+        assert list(columns) == expected
+        assert columns[-1] == expected[-1]
+        assert columns.error is None
+    columns = TokenColumns("x = (\n")
+    assert isinstance(columns.error, tokenize.TokenError)
+    assert [tok.string for tok in columns] == ["x", "=", "("]
+
+
+def test_compact_tokenizer() -> None:
+    grammar_source = """
+    @sync stmt
+    start: stmt* $
+    stmt: 'print' ~ expr NEWLINE | expr NEWLINE
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    source = "1 + 2\nprint 3\n4\n"
+    tokenizer = CompactTokenizer(source)
+    assert parser_class(tokenizer).start() == parse_string(source, parser_class)
+    tok = tokenizer._columns[2]
+    tokenizer.reset(2)
+    column_token = tokenizer.peek()
+    assert isinstance(column_token, ColumnToken)
+    assert column_token == tok and tok == column_token and hash(column_token) == hash(tok)
+    for field in tok._fields:
+        assert getattr(column_token, field) == getattr(tok, field)
+    assert tuple(column_token) == tok and repr(column_token) == repr(tok)
+    assert len(tokenizer._memo) == len(tokenizer._columns) + 1
+    tokenizer = CompactTokenizer(source)
+    parser = parser_class(tokenizer, evict=True)
+    assert parser.start() == parse_string(source, parser_class)
+    assert tokenizer._evicted == len(tokenizer._columns) - 2
+    assert all(memo is EVICTED_MEMO for memo in tokenizer._memo[: tokenizer._evicted])
+    parser = parser_class(CompactTokenizer("1 +\n"))
+    assert parser.start() is None
+    assert parser.make_syntax_error().offset == 4
+    with pytest.raises(tokenize.TokenError):
+        parser_class(CompactTokenizer('1\n2 """x\n')).start()
+
+
+def test_evict_broken_promise() -> None:
+    grammar_source = """
+    @sync a
+    start: a NUMBER | a NAME
+    a: NAME NAME
+    """
+    parser_class = make_parser(grammar_source)
+    assert parse_string("x y z", parser_class)
+    # The sync rule promised there would be no backtracking behind it.
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("x y z").readline))
+    parser = parser_class(tokenizer, evict=True)
+    assert parser.start() is None
+
+
+def test_parse_two_phase() -> None:
+    grammar_source = """
+    @sync a
+    start: a NUMBER NEWLINE $ | a NAME NEWLINE $
+    a: NAME NAME
+    """
+    parser_class = make_parser(grammar_source)
+    assert parse_two_phase(parser_class, "x y 1\n") == parse_string("x y 1\n", parser_class)
+    # The evicting first pass fails, as above; the second one rescues it.
+    assert parse_two_phase(parser_class, "x y z\n") == parse_string("x y z\n", parser_class)
+    with pytest.raises(SyntaxError) as excinfo:
+        parse_two_phase(parser_class, "x y z w\n", "<test>")
+    assert excinfo.value.filename == "<test>"
+    assert excinfo.value.offset == 7
+
+
+def test_restart() -> None:
+    grammar_source = """
+    start: expr NEWLINE $
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+
+    def tokens(source: str) -> Iterator[tokenize.TokenInfo]:
+        return tokenize.generate_tokens(io.StringIO(source).readline)
+
+    tokenizer = Tokenizer(tokens("1 + 2 + 3\n"))
+    parser = parser_class(tokenizer, evict=True)
+    assert parser.start() == parse_string("1 + 2 + 3\n", parser_class)
+    for source in ["4\n", "5 + 6 +\n", "7 + 8\n"]:
+        parser.restart(tokens(source))
+        if source == "5 + 6 +\n":
+            assert parser.start() is None
+            assert parser.make_syntax_error().offset == 8
+        else:
+            assert parser.start() == parse_string(source, parser_class)
+        assert tokenizer._evicted == 0
+        assert len(tokenizer._memo) == len(tokenizer._tokens) + 1
+    with pytest.raises(TypeError):
+        parser_class(IncrementalTokenizer("1\n")).restart(tokens("2\n"))
+
+
+def test_parse_files(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start: expr NEWLINE $
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    sources = ["1 + 2\n", "3 +\n", "4\n", "5" + " + 5" * 2000 + "\n"]
+    paths = []
+    for i, source in enumerate(sources):
+        paths.append(str(tmp_path / f"{i}.txt"))
+        with open(paths[-1], "w") as file:
+            file.write(source)
+    results = list(parse_files(parser_class, paths, workers=2, ordered=True, keep_trees=True))
+    assert [result.path for result in results] == paths
+    assert [result.ok for result in results] == [True, False, True, False]
+    assert results[0].tree == parse_string(sources[0], parser_class)
+    assert isinstance(results[1].error, SyntaxError)
+    assert results[1].error.filename == paths[1]
+    # Too deep to pickle.
+    assert isinstance(results[3].error, RuntimeError)
+    assert results[3].size == len(sources[3])
+    results = list(parse_files(parser_class, paths, workers=2, chunksize=3))
+    assert sorted(result.path for result in results) == paths
+    assert [result.ok for result in results if result.path == paths[3]] == [True]
+    assert all(result.tree is None for result in results)
+    results = list(parse_files(parser_class, paths[3:], timeout=0.001))
+    assert isinstance(results[0].error, TimeoutError)
+
+
+def test_parse_async(tmp_path: PurePath) -> None:
+    grammar_source = """
+    start: expr NEWLINE $
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    path = str(tmp_path / "input.txt")
+    with open(path, "w") as file:
+        file.write("1 + 2\n")
+
+    def stream(data: bytes, eof: bool = True) -> asyncio.StreamReader:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        if eof:
+            reader.feed_eof()
+        return reader
+
+    async def main() -> None:
+        parser = AsyncParser(parser_class, max_concurrency=1)
+        assert await parser.parse(path) == parse_string("1 + 2\n", parser_class)
+        tree = await parser.parse(stream(b"3 + 4\n"))
+        assert tree == parse_string("3 + 4\n", parser_class)
+        with pytest.raises(SyntaxError) as excinfo:
+            await parse_async(parser_class, stream(b"3 +\n"), "<test>")
+        assert excinfo.value.filename == "<test>"
+        # Waiting for more input; cancelling it frees the only slot.
+        task = asyncio.ensure_future(parser.parse(stream(b"5 +", eof=False)))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        tree = await asyncio.wait_for(parser.parse(stream(b"6\n")), 10)
+        assert tree == parse_string("6\n", parser_class)
+
+    asyncio.run(main())
+
+
+def test_parser_registry(tmp_path: PurePath, monkeypatch: Any) -> None:
+    grammar_source = textwrap.dedent(
+        """
+        start: expr NEWLINE $
+        expr: expr '+' term | term
+        term: NUMBER
+        """
+    )
+    registry = ParserRegistry(tmp_path, maxsize=1)
+    parser_class = registry.get(grammar_source)
+    assert registry.get(grammar_source) is parser_class
+    assert parse_string("1 + 2\n", parser_class) == parse_string(
+        "1 + 2\n", make_parser(grammar_source)
+    )
+    vm_class = registry.get(grammar_source, vm=True)
+    assert issubclass(vm_class, VMParser)
+    assert len(list(pathlib.Path(tmp_path).glob("*.py"))) == 2
+    assert len(list(pathlib.Path(tmp_path).glob("__pycache__/*.pyc"))) == 2
+    # Dropped from memory, but not from disk; parsers on disk are only loaded.
+    monkeypatch.setattr("pegen.python_generator.PythonParserGenerator", None)
+    for registry in registry, ParserRegistry(tmp_path):
+        cached_class = registry.get(grammar_source)
+        assert cached_class is not parser_class
+        assert parse_string("1 + 2\n", cached_class) == parse_string("1 + 2\n", parser_class)
+    with pytest.raises(TypeError):
+        registry.get(grammar_source + "foo: NAME\n")
+    # Without a cache directory, parsers are only kept in memory.
+    monkeypatch.undo()
+    assert ParserRegistry().get(grammar_source, vm=True) is not vm_class
+    # Inlining groups changes the parser, so it is part of the key.
+    grammar_source = "start: NAME (',' NAME)* NEWLINE $\n"
+    inlined_class = registry.get(grammar_source)
+    helper_class = registry.get(grammar_source, inline_size=0)
+    assert not any(name.startswith("_tmp_") for name in vars(inlined_class))
+    assert any(name.startswith("_tmp_") for name in vars(helper_class))
+    assert parse_string("a, b\n", helper_class) == parse_string("a, b\n", inlined_class)
+
+
+def test_sync_rule_errors() -> None:
+    with pytest.raises(GrammarError):
+        make_parser(
+            """
+        @sync stmt
+        start: NAME
+        """
+        )
+    with pytest.raises(GrammarError):
+        make_parser(
+            """
+        @sync start
+        start: start NAME | NAME
+        """
+        )
+
+
+def test_parse_iter() -> None:
+    grammar_source = """
+    @stream stmt
+    start: stmt* $
+    stmt: expr NEWLINE
+    expr: expr '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    source = "1 + 2\n3\n4 + 5 + 6\n"
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    parser = parser_class(tokenizer, evict=True)
+    trees = []
+    for tree in parser.parse_iter():
+        trees.append(tree)
+        # Everything behind the statement just yielded has been dropped.
+        assert tokenizer._evicted == tokenizer._index - 1
+    assert [[tree] for tree in trees] == parse_string(source, parser_class)[0]
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1 + 2\n+\n").readline))
+    parser = parser_class(tokenizer)
+    stream = parser.parse_iter()
+    assert next(stream)
+    with pytest.raises(SyntaxError):
+        next(stream)
+
+
+def test_parse_iter_empty_match() -> None:
+    grammar_source = """
+    @stream stmts
+    start: stmts $
+    stmts: a=stmt* { a }
+    stmt: NAME NEWLINE
+    """
+    parser_class = make_parser(grammar_source)
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("a\nb\n+\n").readline))
+    stream = parser_class(tokenizer).parse_iter()
+    assert len(next(stream)) == 2
+    # stmts matches nothing at the '+', which would otherwise repeat forever.
+    with pytest.raises(SyntaxError):
+        next(stream)
+
+
+def test_parse_iter_default_start() -> None:
+    parser_class = make_parser(
+        """
+    start: NUMBER+ NEWLINE $
+    """
+    )
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1 2\n").readline))
+    assert list(parser_class(tokenizer).parse_iter()) == [parse_string("1 2\n", parser_class)]
+    with pytest.raises(GrammarError):
+        make_parser(
+            """
+        @stream stmt
+        start: NAME
+        """
+        )
+
+
+def test_reparse() -> None:
+    parser_class = make_parser(
+        """
+    start: stmt* $
+    stmt: simple NEWLINE | 'if' expr ':' block
+    block: NEWLINE INDENT stmt+ DEDENT | simple NEWLINE
+    simple: NAME '=' expr | expr
+    expr: expr '+' term | term
+    term: NUMBER | NAME | '(' expr ')'
+    """
+    )
+    source = "a = 1\nif a:\n    b = (2 +\n         3)\n    c\nd = 4\n"
+    tokenizer = IncrementalTokenizer(source)
+    parser = parser_class(tokenizer)
+    tree = parser.start()
+    assert tree == parse_string(source, parser_class)
+
+    # An edit within a line reuses the statements around it.
+    new_tree = parser.reparse([TextEdit((3, 9), (3, 10), "20")])
+    source = tokenizer.source()
+    assert source == "a = 1\nif a:\n    b = (20 +\n         3)\n    c\nd = 4\n"
+    assert new_tree == parse_string(source, parser_class)
+    assert new_tree[0][0][0] is tree[0][0][0]
+    assert new_tree[0][2][0] is tree[0][2][0]
+
+    # Edits that add lines, remove them and change the indentation.
+    for edits in [
+        [TextEdit((5, 0), (5, 0), "    e = 5\n")],
+        [TextEdit((2, 0), (3, 0), ""), TextEdit((1, 5), (1, 5), " + x")],
+        [TextEdit((2, 0), (2, 4), "")],
+        [TextEdit((1, 0), (1, 0), "if z:\n    ")],
+        [TextEdit((1, 2), (1, 3), "(")],
+        [TextEdit((1, 2), (1, 3), "")],
+        [TextEdit((7, 0), (7, 0), "f\n")],
+    ]:
+        tree = parser.reparse(edits)
+        source = tokenizer.source()
+        if tree is None:
+            with pytest.raises(SyntaxError):
+                parse_string(source, parser_class)
+            continue
+        assert tree == parse_string(source, parser_class)
+        expected = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+        parser_class(expected).start()
+        assert tokenizer._tokens == expected._tokens
+
+    with pytest.raises(ValueError):
+        parser.reparse([TextEdit((2, 0), (1, 0), "")])
+    with pytest.raises(TypeError):
+        parser_class(Tokenizer(iter([]))).reparse([])
+
+
+def test_first_sets() -> None:
+    grammar_source = """
+    start: stmt* $
+    stmt: 'if' expr ':' stmt | 'pass' NEWLINE | expr NEWLINE | [NAME] ';' NEWLINE
+    expr: expr '+' term | term
+    term: b | NUMBER | NAME | '(' expr ')'
+    a: b 'x' | 'a'
+    b: a 'y' | 'b'
+    sign: '+' | ['-']
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    first_sets = genr.first_set_calculator.first_sets
+    # The FIRST sets of mutually left-recursive rules include each other's.
+    assert first_sets["a"] == first_sets["b"] == {"'a'", "'b'"}
+    assert first_sets["expr"] == {"'a'", "'b'", "NUMBER", "NAME", "'('"}
+    assert first_sets["stmt"] == first_sets["expr"] | {"'if'", "'pass'", "';'"}
+    assert first_sets["sign"] == {"'+'", "'-'", ""}
+    genr.generate("<string>")
+    code = out.getvalue()
+    assert "_next_token.string == 'if'" in code
+    assert "(_next_token.type in {1, 2} or _next_token.string == '(')" in code
+    assert "_next_token.string in {'a', 'b'}" in code
+    assert "(_next_token.type == 1 or _next_token.string == ';')" in code
+    # An alternative that can match without consuming anything is never skipped.
+    assert "_next_token.string == '+'" in code
+    assert "_next_token.string == '-'" not in code
+    ns: Dict[str, Any] = {}
+    exec(code, ns)
+    parser_class = ns["GeneratedParser"]
+    for source in ["if a y x y + 1: pass\n", "b + (1 + c)\n", "x ;\n", ";\n", "pass\n"]:
+        assert parse_string(source, parser_class)
+    with pytest.raises(SyntaxError):
+        parse_string("if pass\n", parser_class)
+
+
+def test_first_set_guard_rule_names() -> None:
+    # A rule may have the name of the token the guards test.
+    grammar_source = """
+    start: next_token '!' NEWLINE $ | NUMBER ';' NEWLINE $
+    next_token: NAME | NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    for parser_class in [
+        generate_parser(grammar),
+        generate_parser(grammar, mypyc=True),
+        generate_parser(grammar, vm=True),
+    ]:
+        assert parse_string("1 ;\n", parser_class)
+        assert parse_string("a !\n", parser_class)
+
+
+def test_token_matchers() -> None:
+    grammar_source = """
+    start: 'if' NAME &':' ':' NEWLINE? ENDMARKER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    genr.generate("<string>")
+    source = out.getvalue()
+    assert "self.expect(" not in source
+    assert "self.expect_string('if')" in source
+    assert "self.positive_lookahead(self.expect_string, ':')" in source
+    assert f"self.expect_type({token.NEWLINE})" in source
+    ns: Dict[str, Any] = {}
+    exec(source, ns)
+    parser_class = ns["GeneratedParser"]
+    assert parse_string("if x:\n", parser_class)
+    # A NAME spelled like a token type is not that token.
+    with pytest.raises(SyntaxError):
+        parse_string("if x: NEWLINE\n", parser_class)
+
+
+def test_untraced_parser(capsys: Any) -> None:
+    grammar_source = """
+    @sync stmt
+    start: stmt* ENDMARKER
+    stmt: expr NEWLINE
+    expr: expr '+' term | term
+    term (nomemo): NUMBER | '(' ~ expr ')'
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, untraced=True)
+    genr.generate("<string>")
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    traced_parser_class = ns["TracedGeneratedParser"]
+    assert "def term(self)" in out.getvalue()
+    assert "@logger" not in out.getvalue()
+    assert "self._verbose" not in out.getvalue()
+    assert issubclass(traced_parser_class, parser_class)
+
+    source = "1 + (2 + 3)\n4\n"
+    expected = parse_string(source, make_parser(grammar_source))
+    assert parse_string(source, parser_class) == expected
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    assert parser_class(tokenizer, evict=True).start() == expected
+    assert tokenizer._evicted > 0
+    capsys.readouterr()
+    assert parse_string(source, traced_parser_class, verbose=True) == expected
+    assert "term() ...." in capsys.readouterr().out
+    with pytest.raises(SyntaxError):
+        parse_string("1 +\n", parser_class)
+
+    with pytest.raises(ValueError):
+        PythonParserGenerator(grammar, out, untraced=True, dict_memo=True)
+
+
+def test_profile() -> None:
+    grammar_source = """
+    start: a b NAME NEWLINE | a b NUMBER NEWLINE
+    a: NAME
+    b (nomemo): NAME
+    """
+    parser_class = make_parser(grammar_source)
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("x y 1\n").readline))
+    parser = parser_class(tokenizer)
+    assert parser._profile is None
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("x y 1\n").readline))
+    parser = parser_class(tokenizer, profile=True)
+    assert parser.start()
+    profile = parser._profile
+    assert profile is not None
+    a = profile["a"]
+    assert (a.calls, a.memo_hits, a.memo_misses, a.successes, a.failures) == (2, 1, 1, 2, 0)
+    assert a.tokens == 2
+    b = profile["b"]
+    assert (b.calls, b.memo_hits, b.memo_misses, b.successes, b.failures) == (2, 0, 0, 2, 0)
+    start = profile["start"]
+    assert (start.calls, start.successes, start.tokens) == (1, 1, 4)
+    assert profile["name"].failures == 1
+    assert start.cumulative_time >= start.self_time + b.cumulative_time
+    out = io.StringIO()
+    profile.report(out)
+    assert len(out.getvalue().splitlines()) == len(profile.rules) + 1
+
+
+def test_memo_flags() -> None:
+    grammar_source = """
+    start: expr NEWLINE
+    expr (memo): expr '+' term | term
+    term (nomemo): atom
+    atom[int] (memo): NUMBER { int(number.string) }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    rules = grammar.rules
+    assert [rules[name].memo for name in ("start", "expr", "term", "atom")] == [
+        None,
+        True,
+        False,
+        True,
+    ]
+    assert str(rules["term"]) == "term (nomemo): atom"
+    assert repr(rules["term"]) == (
+        "Rule('term', None, Rhs([Alt([NamedItem(None, NameLeaf('atom'))])]), memo='nomemo')"
+    )
+
+    def memoized(selective_memo: bool) -> List[str]:
+        out = io.StringIO()
+        genr = PythonParserGenerator(grammar, out, selective_memo=selective_memo)
+        genr.generate("<string>")
+        ns: Dict[str, Any] = {}
+        exec(out.getvalue(), ns)
+        parser_class = ns["GeneratedParser"]
+        assert parse_string("1 + 2\n", parser_class)
+        return sorted(genr.rule_ids)
+
+    # The left-recursive leader is memoized regardless of its flag.
+    assert memoized(selective_memo=False) == ["atom", "expr", "start"]
+    assert memoized(selective_memo=True) == ["atom", "expr"]
+
+
+def test_lexer() -> None:
+    grammar_source = """
+    start: stmt* ENDMARKER
+    stmt: 'if' expr ':' block | expr NEWLINE
+    block: NEWLINE INDENT stmt+ DEDENT | expr NEWLINE
+    expr: expr '+' atom | expr '**' atom | atom
+    atom: NAME | NUMBER | STRING | '(' expr ')'
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    ns: Dict[str, Any] = {}
+    exec(python_lexer(grammar), ns)
+    generate_tokens = ns["generate_tokens"]
+    sources = [
+        textwrap.dedent(
+            '''\
+            if a:  # comment
+                x + 1.5e3 ** 'a' + """b
+            c"""
+
+                if (b +
+              2): y + \\
+                    z
+            \tx
+            w'''
+        ),
+        "x\n\n",
+        "",
+    ]
+    for source in sources:
+        expected = [
+            tok
+            for tok in tokenize.generate_tokens(io.StringIO(source).readline)
+            if tok.type not in (tokenize.NL, tokenize.COMMENT)
+        ]
+        assert list(generate_tokens(io.StringIO(source).readline)) == expected
+
+    out = io.StringIO()
+    PythonParserGenerator(grammar, out, lexer=True).generate("<string>")
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    source = "if a:\n    x + 'a'\n    if (b +\n  2): y\nz ** 2\n"
+    tokens = parser_class.generate_tokens(io.StringIO(source).readline)
+    assert parser_class(Tokenizer(tokens)).start() == parse_string(source, parser_class)
+    parser = parser_class(Tokenizer(parser_class.generate_tokens(io.StringIO("a $ b\n").readline)))
+    assert parser.start() is None
+    assert parser.make_syntax_error().offset == 3
+    with pytest.raises(IndentationError):
+        list(generate_tokens(io.StringIO("if a:\n    b\n  c\n").readline))
+
+
+def test_lexer_entry_points(tmp_path: PurePath) -> None:
+    # '|>' is a literal of the grammar, but not a token of Python.
+    grammar_source = """
+    start: e $
+    e: e '|>' NAME | NAME
+    """
+    grammar = parse_string(grammar_source, GrammarParser)
+    parser_class = generate_parser(grammar, lexer=True)
+    source = "x |> f |> g\n"
+    expected = parse_string(source, parser_class)
+    assert expected[0][1].string == "|>"
+    assert parse_two_phase(parser_class, source) == expected
+    path = str(tmp_path / "input.txt")
+    with open(path, "w") as file:
+        file.write(source)
+    [result] = parse_files(parser_class, [path], workers=1, keep_trees=True)
+    assert result.error is None
+    assert result.tree == expected
+    assert asyncio.run(parse_async(parser_class, path)) == expected
+
+
 class TestGrammarVisitor:
     class Visitor(GrammarVisitor):
         def __init__(self) -> None: